@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from metrics import Registry
+
+
+class AdmissionRejected(Exception):
+    """Raised when the ingestion wait queue is full"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A queued ingestion and the memory it is expected to need"""
+
+    def __init__(self, memory_bytes: int):
+        self.memory_bytes = memory_bytes
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """Bounds concurrent ingestions, the wait queue behind them and their memory
+
+    Uploads take a ticket when accepted; tickets beyond `max_queued` waiting
+    are rejected so callers can back off. A ticket runs once a slot is free and
+    its memory estimate fits in the budget; an ingestion that is larger than
+    the whole budget still runs, but only on an otherwise idle controller.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queued: int,
+        memory_budget_bytes: int,
+        registry: Registry
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.memory_budget_bytes = memory_budget_bytes
+        self.queued = 0
+        self.running = 0
+        self.memory_reserved = 0
+        self._condition = threading.Condition()
+        self._wait_time = registry.histogram("ingest_admission_wait_seconds")
+        self._run_time = registry.histogram("ingest_run_seconds")
+        self._rejected = registry.counter("ingest_rejected_total")
+        registry.gauge("ingest_queue_depth", lambda: self.queued)
+        registry.gauge("ingest_running", lambda: self.running)
+        registry.gauge("ingest_memory_reserved_bytes", lambda: self.memory_reserved)
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up, from recent run times"""
+        mean_run = self._run_time.mean or 1.0
+        return max(1, math.ceil(mean_run * (self.queued + 1) / self.max_concurrent))
+
+    def check(self):
+        """Fail fast before the caller spends effort on an upload that would be rejected"""
+        with self._condition:
+            if self.queued >= self.max_queued:
+                self._reject()
+
+    def enqueue(self, memory_bytes: int) -> Ticket:
+        with self._condition:
+            if self.queued >= self.max_queued:
+                self._reject()
+            self.queued += 1
+            return Ticket(memory_bytes)
+
+    @contextmanager
+    def admit(self, ticket: Ticket) -> Iterator[None]:
+        """Block until the ticket may run, then hold its slot and memory while it does"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(ticket))
+            self.queued -= 1
+            self.running += 1
+            self.memory_reserved += ticket.memory_bytes
+        started = time.monotonic()
+        self._wait_time.observe(started - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            self._run_time.observe(time.monotonic() - started)
+            with self._condition:
+                self.running -= 1
+                self.memory_reserved -= ticket.memory_bytes
+                self._condition.notify_all()
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "memory_reserved_bytes": self.memory_reserved,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "wait_seconds": self._wait_time.snapshot(),
+        }
+
+    def _fits(self, ticket: Ticket) -> bool:
+        if self.running >= self.max_concurrent:
+            return False
+        if self.running == 0:
+            return True
+        return self.memory_reserved + ticket.memory_bytes <= self.memory_budget_bytes
+
+    def _reject(self):
+        self._rejected.inc()
+        raise AdmissionRejected("Too many uploads in progress, please retry later", self.retry_after())
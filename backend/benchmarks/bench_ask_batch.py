@@ -0,0 +1,73 @@
+"""Questions per second through /ask/batch against one /ask call per question
+
+Sends the same synthetic questions to a running server once as a loop of
+/ask calls and once as /ask/batch calls of --batch questions, as an
+evaluation harness would, checks both give the same answers, and reports
+throughput for each retriever.
+
+Start the server with the query cache off, so both sides embed and search
+every question (QUERY_CACHE_SIZE=0 uvicorn main:app --port 8000), upload some
+papers, and run from the backend directory:
+    python -m benchmarks.bench_ask_batch --url http://localhost:8000 --questions 1000 --batch 250
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.bench_ask_under_load import request
+from benchmarks.synthetic_pdf import WORDS
+
+
+def ask_each(url: str, questions: list, retriever: str) -> list:
+    answers = []
+    for question in questions:
+        status, body = request(f"{url}/ask", json.dumps({"question": question, "retriever": retriever}).encode())
+        assert status == 200, body
+        answers.append(body)
+    return answers
+
+
+def ask_batched(url: str, questions: list, retriever: str, batch: int) -> list:
+    answers = []
+    for first in range(0, len(questions), batch):
+        status, body = request(
+            f"{url}/ask/batch",
+            json.dumps({"questions": questions[first:first + batch], "retriever": retriever}).encode()
+        )
+        assert status == 200, body
+        answers.extend(body)
+    return answers
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=250, help="questions per /ask/batch call")
+    parser.add_argument("--retrievers", nargs="+", default=["vector", "bm25", "hybrid"])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    questions = [" ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(args.questions)]
+    for retriever in args.retrievers:
+        timings = {}
+        for label, ask in (
+            ("loop", lambda questions: ask_each(args.url, questions, retriever)),
+            ("batch", lambda questions: ask_batched(args.url, questions, retriever, args.batch))
+        ):
+            started = time.perf_counter()
+            answers = ask(questions)
+            timings[label] = time.perf_counter() - started
+            contexts = [[(ctx["paper_id"], ctx["text"]) for ctx in answer["vector_context"]] for answer in answers]
+            if label == "loop":
+                expected = contexts
+        print(
+            f"{retriever:>7}: /ask loop {args.questions / timings['loop']:7.0f} questions/s  "
+            f"/ask/batch {args.questions / timings['batch']:7.0f} questions/s  "
+            f"x{timings['loop'] / timings['batch']:.1f}  same results: {contexts == expected}"
+        )
+
+
+if __name__ == "__main__":
+    main_benchmark()
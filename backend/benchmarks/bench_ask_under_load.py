@@ -0,0 +1,140 @@
+"""/ask latency percentiles on a running server, idle and while uploads run
+
+Seeds the server with one synthetic paper, then measures /ask latency from
+several concurrent clients twice: with nothing else going on, and while
+uploader threads post distinct synthetic PDFs, written before either phase,
+and poll their jobs until they finish. Rejected uploads (429/503) back off
+and retry. Compare the two p99s to see whether ingestion leaks into
+question answering.
+
+Start the server (uvicorn main:app --port 8000) and run from the backend directory:
+    python -m benchmarks.bench_ask_under_load --url http://localhost:8000 --seconds 20 --uploaders 4
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+from benchmarks.synthetic_pdf import WORDS, write_synthetic_pdf
+
+
+def request(url: str, body: bytes = None, content_type: str = "application/json", timeout: float = 120):
+    """(status, parsed JSON body) of a GET, or a POST when `body` is given"""
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type} if body is not None else {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def upload(url: str, path: str):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as pdf:
+        payload = pdf.read()
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(path)}\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return request(f"{url}/upload", body, f"multipart/form-data; boundary={boundary}")
+
+
+def wait_for_job(url: str, job_id: str, stop: threading.Event = None):
+    while stop is None or not stop.is_set():
+        _, job = request(f"{url}/jobs/{job_id}")
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.2)
+
+
+def upload_until(url: str, paths: list, stop: threading.Event, done: list):
+    while not stop.is_set():
+        try:
+            path = paths.pop()
+        except IndexError:
+            return
+        status, body = upload(url, path)
+        while status in (429, 503) and not stop.is_set():
+            time.sleep(1)
+            status, body = upload(url, path)
+        if status == 202 and wait_for_job(url, body["job_id"], stop):
+            done.append(path)
+
+
+def ask_until(url: str, stop: threading.Event, rng: random.Random, latencies: list, errors: list):
+    while not stop.is_set():
+        question = " ".join(rng.choice(WORDS) for _ in range(6))
+        started = time.perf_counter()
+        status, _ = request(f"{url}/ask", json.dumps({"question": question}).encode())
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+
+
+def measure(url: str, seconds: float, askers: int, uploaders: int, paths: list) -> dict:
+    stop = threading.Event()
+    latencies, errors, uploaded = [], [], []
+    threads = [
+        threading.Thread(target=ask_until, args=(url, stop, random.Random(i), latencies, errors))
+        for i in range(askers)
+    ] + [
+        threading.Thread(target=upload_until, args=(url, paths, stop, uploaded))
+        for _ in range(uploaders)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "uploads": len(uploaded),
+        **{f"p{q}": float(np.percentile(latencies, q)) for q in (50, 95, 99)},
+        "max": float(latencies.max())
+    }
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--askers", type=int, default=4, help="concurrent /ask clients")
+    parser.add_argument("--uploaders", type=int, default=4, help="concurrent upload clients in the loaded phase")
+    parser.add_argument("--pages", type=int, default=50, help="pages per uploaded PDF")
+    parser.add_argument("--files", type=int, default=100, help="distinct PDFs available to upload")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Distinct seeds give distinct content, so no upload is a duplicate;
+        # the PDFs are written up front to keep the client off the server's CPU
+        first_seed = int(time.time())
+        paths = []
+        for seed in range(first_seed, first_seed + args.files + 1):
+            paths.append(os.path.join(directory, f"load-{seed}.pdf"))
+            write_synthetic_pdf(paths[-1], args.pages, seed=seed, title=f"Load Test Paper {seed}")
+        status, body = upload(args.url, paths.pop())
+        if status == 202:
+            wait_for_job(args.url, body["job_id"])
+
+        for label, uploaders in (("idle", 0), ("uploading", args.uploaders)):
+            result = measure(args.url, args.seconds, args.askers, uploaders, paths)
+            print(
+                f"{label:>10}: /ask p50 {result['p50']:7.1f} ms  p95 {result['p95']:7.1f} ms  "
+                f"p99 {result['p99']:7.1f} ms  max {result['max']:7.1f} ms  "
+                f"({result['requests']} requests, {result['errors']} errors, {result['uploads']} uploads finished)"
+            )
+
+
+if __name__ == "__main__":
+    main_benchmark()
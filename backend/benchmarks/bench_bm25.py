@@ -0,0 +1,77 @@
+"""Build rate, postings size and query latency of the BM25 index at scale
+
+Indexes synthetic chunks (Zipf-distributed words, as bench_sparse) in
+ingestion-sized batches, then times questions of a few words: common-word
+questions drawn from the same distribution, and questions around one rare
+term. Every question runs once with MaxScore pruning and once scoring every
+posting, which must rank the same scores.
+
+Run from the backend directory:
+    python -m benchmarks.bench_bm25 --chunks 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_sparse import synthetic_chunks
+from bm25 import BM25Index
+
+
+def time_queries(index: BM25Index, questions, prune: bool):
+    latencies, distances = [], []
+    for question in questions:
+        started = time.perf_counter()
+        result = index.query([question], n_results=10, prune=prune)
+        latencies.append(time.perf_counter() - started)
+        distances.append(result["distances"][0])
+    return np.array(latencies) * 1000, distances
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per add call (EMBED_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    index = BM25Index()
+    started = time.perf_counter()
+    for first in range(0, args.chunks, 100000):
+        chunks = synthetic_chunks(min(100000, args.chunks - first), seed=first)
+        for start in range(0, len(chunks), args.batch_size):
+            batch = chunks[start:start + args.batch_size]
+            index.add(
+                [f"chunk_{first + start + i}" for i in range(len(batch))],
+                batch,
+                [{"paper_id": f"paper_{(first + start + i) // 100}"} for i in range(len(batch))]
+            )
+    seconds = time.perf_counter() - started
+    stats = index.stats()
+    print(
+        f"{args.chunks} chunks indexed in {seconds:.1f}s ({args.chunks / seconds:.0f} chunks/s): "
+        f"{stats['terms']} terms, {stats['postings']} postings in {stats['segments']} segments, "
+        f"{stats['bytes'] / args.chunks:.0f} bytes/chunk"
+    )
+
+    rng = np.random.default_rng(1)
+    common = [" ".join(chunk.split()[:4]) for chunk in synthetic_chunks(args.queries, words_per_chunk=4, seed=1)]
+    rare = [f"term{rank} " + " ".join(chunk.split()[:3]) for rank, chunk in zip(
+        rng.integers(2000, 20000, args.queries), synthetic_chunks(args.queries, words_per_chunk=3, seed=2)
+    )]
+    for label, questions in (("common words", common), ("one rare term", rare)):
+        for prune in (True, False):
+            latencies, distances = time_queries(index, questions, prune)
+            if prune:
+                pruned = distances
+            else:
+                assert all(np.allclose(a, b, atol=1e-6) for a, b in zip(pruned, distances)), "MaxScore changed the ranking"
+            print(
+                f"{label:>14} {'maxscore' if prune else 'exhaustive':>10}: "
+                f"p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms  "
+                f"p99 {np.percentile(latencies, 99):6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,54 @@
+"""CPU embedding throughput in chunks/sec for every embedder
+
+Embeds synthetic chunks of roughly the chunker's size in EMBED_BATCH_SIZE
+batches, the way the ingestion pipeline calls the embedder, and reports
+chunks/sec. TF-IDF, hashing and the fake embedder always run; pass
+--model-path to also time a local sentence-transformer at several thread
+counts and model batch sizes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_embedding --chunks 5000 --model-path /models/all-MiniLM-L6-v2
+"""
+import argparse
+import time
+
+from benchmarks.bench_sparse import synthetic_chunks
+from benchmarks.fake_embedder import FakeEmbedder
+from chunking import batched
+from embeddings import Embedder, HashingEmbedder, SentenceTransformerEmbedder, TfidfEmbedder
+
+
+def throughput(embedder: Embedder, chunks, batch_size: int) -> float:
+    # The first call fits TF-IDF or loads the model; time the steady state
+    embedder.embed(chunks[:batch_size])
+    started = time.perf_counter()
+    for batch in batched(chunks, batch_size):
+        embedder.embed(batch)
+    return len(chunks) / (time.perf_counter() - started)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per embed call (EMBED_BATCH_SIZE)")
+    parser.add_argument("--model-path", help="local sentence-transformer directory")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--model-batch-sizes", type=int, nargs="+", default=[16, 32, 64])
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    print(f"{args.chunks} chunks of ~{sum(map(len, chunks)) // len(chunks)} characters, {args.batch_size} per call")
+    for embedder in (TfidfEmbedder(), HashingEmbedder(), FakeEmbedder()):
+        print(f"{embedder.name:>22}: {throughput(embedder, chunks, args.batch_size):>9.0f} chunks/s")
+
+    if not args.model_path:
+        return
+    for threads in args.threads:
+        for model_batch_size in args.model_batch_sizes:
+            embedder = SentenceTransformerEmbedder(args.model_path, batch_size=model_batch_size, threads=threads)
+            rate = throughput(embedder, chunks, args.batch_size)
+            print(f"{embedder.name:>22}: {rate:>9.0f} chunks/s  threads {threads}  model batch {model_batch_size}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
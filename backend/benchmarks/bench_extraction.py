@@ -0,0 +1,47 @@
+"""Page extraction throughput (pages/sec) from 1 to N worker processes
+
+Run from the backend directory:
+    python -m benchmarks.bench_extraction --pages 400 --max-workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from extraction import PageExtractor
+from benchmarks.synthetic_pdf import write_synthetic_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB")
+        print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+        counts = sorted({min(2 ** i, args.max_workers) for i in range(args.max_workers.bit_length() + 1)})
+        baseline = None
+        for workers in counts:
+            extractor = PageExtractor(max_workers=workers, pages_per_task=args.pages_per_task)
+            extractor.extract(pdf_path, args.pages)  # warm up the pool
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                pages = extractor.extract(pdf_path, args.pages)
+                best = min(best, time.perf_counter() - start)
+            extractor.shutdown()
+            assert len(pages) == args.pages
+
+            baseline = baseline or best
+            print(f"{workers:>8} {best:>9.3f} {args.pages / best:>9.1f} {baseline / best:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Memory profile of streaming ingestion for a large synthetic PDF
+
+Streams a synthetic document through PdfDocument, the chunker and the
+embedder in EMBED_BATCH_SIZE batches and samples the process RSS after
+every batch. With --store, batches are also added to an in-memory vector
+store (whose own footprint grows with the corpus, by design).
+
+Run from the backend directory:
+    python -m benchmarks.bench_large_document --pages 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+# Keep main's index in memory, away from the server's DATA_DIR
+os.environ["DATA_DIR"] = ""
+
+import main
+from benchmarks.memory import rss_mb
+from benchmarks.synthetic_pdf import write_synthetic_pdf
+from chunking import batched
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--store", action="store_true", help="also add chunks to the vector store")
+    parser.add_argument("--report-every", type=int, default=20, help="batches between RSS samples")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "large.pdf")
+        write_synthetic_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB, batch size {main.EMBED_BATCH_SIZE}")
+
+        document = main.PdfDocument(pdf_path)
+        baseline = rss_mb()
+        samples = []
+        chunk_count = 0
+        start = time.perf_counter()
+        print(f"{'chunks':>8} {'pages':>6} {'rss MB':>8} {'delta':>7}")
+        for batch_number, chunks in enumerate(batched(document.chunks(), main.EMBED_BATCH_SIZE)):
+            embeddings = main.embed_chunks(chunks)
+            if args.store:
+                indices = range(chunk_count, chunk_count + len(chunks))
+                main.store_chunks(
+                    [f"bench_{i}" for i in indices],
+                    embeddings,
+                    chunks,
+                    [{"paper_id": "bench", "chunk_index": i} for i in indices]
+                )
+            chunk_count += len(chunks)
+            samples.append(rss_mb())
+            if batch_number % args.report_every == 0:
+                print(f"{chunk_count:>8} {document.successful_pages:>6} {samples[-1]:>8.1f} {samples[-1] - baseline:>+7.1f}")
+        elapsed = time.perf_counter() - start
+
+    print(f"\n{chunk_count} chunks from {document.successful_pages} pages in {elapsed:.1f}s "
+          f"({chunk_count / elapsed:.0f} chunks/s)")
+    print(f"RSS baseline {baseline:.1f} MB, peak {max(samples):.1f} MB, "
+          f"last {samples[-1]:.1f} MB")
+    half = len(samples) // 2
+    if half:
+        print(f"Peak growth over the second half of the document: "
+              f"{max(samples[half:]) - max(samples[:half]):+.1f} MB")
+    main.page_extractor.shutdown()
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,98 @@
+"""Size, latency and recall trade-off of LSA-reduced TF-IDF vectors
+
+Generates topic-structured synthetic chunks (each chunk mixes words from one
+topic with background words), embeds them with the 1000-feature TF-IDF
+embedder into SparseVectorStore, and with LSA at several dimensions into a
+float32 DenseVectorStore. Reports vector bytes per chunk (and what the TF-IDF
+rows take as dense float32, as Chroma stores them), query latency, fit time,
+recall@5 of the LSA results against exact TF-IDF cosine, and topic precision:
+the share of results drawn from the same topic as the question.
+
+Run from the backend directory:
+    python -m benchmarks.bench_lsa --chunks 100000 --components 64 128 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from embeddings import TfidfEmbedder
+from vector_store import DenseVectorStore, SparseVectorStore
+
+
+def topic_chunks(count: int, topics: int = 200, vocabulary: int = 20000, words_per_chunk: int = 80, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"term{i}" for i in range(vocabulary)])
+    topic_words = np.random.default_rng(0).integers(0, vocabulary, size=(topics, 300))
+    chunk_topics = rng.integers(0, topics, count)
+    from_topic = rng.random((count, words_per_chunk)) < 0.7
+    topic_ranks = np.minimum(rng.zipf(1.3, size=(count, words_per_chunk)), 300) - 1
+    background = np.minimum(rng.zipf(1.2, size=(count, words_per_chunk)), vocabulary) - 1
+    chosen = np.where(from_topic, topic_words[chunk_topics[:, None], topic_ranks], background)
+    return [" ".join(words[row]) for row in chosen], chunk_topics
+
+
+def fill(store, embedder: TfidfEmbedder, chunks, batch_size: int):
+    for start in range(0, len(chunks), batch_size):
+        end = min(start + batch_size, len(chunks))
+        store.add(
+            [str(i) for i in range(start, end)],
+            embedder.embed(chunks[start:end]),
+            chunks[start:end],
+            [{"paper_id": str(i // 100), "chunk_index": i % 100} for i in range(start, end)]
+        )
+
+
+def run_queries(store, embedder: TfidfEmbedder, questions, question_topics, chunk_topics):
+    latencies, results, on_topic = [], [], []
+    for question, topic in zip(questions, question_topics):
+        started = time.perf_counter()
+        result = store.query(embedder.embed_queries([question]), n_results=5)
+        latencies.append(time.perf_counter() - started)
+        results.append(set(result["ids"][0]))
+        on_topic.extend(chunk_topics[int(i)] == topic for i in result["ids"][0])
+    return np.array(latencies) * 1000, results, np.mean(on_topic)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--components", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--fit-sample", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    chunks, chunk_topics = topic_chunks(args.chunks)
+    sample = chunks[:args.fit_sample]
+    question_chunks, question_topics = topic_chunks(args.queries, seed=1)
+    questions = [" ".join(chunk.split()[:8]) for chunk in question_chunks]
+
+    embedder = TfidfEmbedder().refit(sample)
+    store = SparseVectorStore()
+    fill(store, embedder, chunks, args.batch_size)
+    latencies, exact, precision = run_queries(store, embedder, questions, question_topics, chunk_topics)
+    print(
+        f"{'tfidf ' + str(embedder.dimension):>12}: {store.memory_bytes() / args.chunks:6.0f} bytes/chunk "
+        f"({embedder.dimension * 4} as dense float32)  "
+        f"query p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms  "
+        f"topic precision {precision:.3f}"
+    )
+
+    for components in args.components:
+        started = time.perf_counter()
+        embedder = TfidfEmbedder(lsa_components=components).refit(sample)
+        fit_seconds = time.perf_counter() - started
+        store = DenseVectorStore(initial_capacity=args.chunks)
+        fill(store, embedder, chunks, args.batch_size)
+        latencies, results, precision = run_queries(store, embedder, questions, question_topics, chunk_topics)
+        recall = np.mean([len(found & expected) / max(len(expected), 1) for found, expected in zip(results, exact)])
+        print(
+            f"{'lsa ' + str(components):>12}: {store.memory_bytes() / args.chunks:6.0f} bytes/chunk  "
+            f"query p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms  "
+            f"fit {fit_seconds:.1f}s  recall@5 vs tfidf {recall:.3f}  topic precision {precision:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,86 @@
+"""Latency of maximal-marginal-relevance re-ranking over fetched candidates
+
+Times maximal_marginal_relevance on fetch_k candidates, as dense float32
+embeddings and as sparse TF-IDF rows, against a reference that computes
+every pairwise similarity in a Python loop, and checks both pick the same
+chunks. Candidates come in overlapping runs, as neighbouring chunks of one
+paper do.
+
+Run from the backend directory:
+    python -m benchmarks.bench_mmr --fetch-k 20 100 500 --top-k 5 20
+"""
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from fusion import maximal_marginal_relevance
+
+
+def overlapping_candidates(count: int, dim: int, sparse: bool, seed: int = 0):
+    """Unit rows in runs of 5 near-duplicates, and relevance decreasing with rank"""
+    rng = np.random.default_rng(seed)
+    if sparse:
+        base = sp.random(count // 5 + 1, dim, density=0.05, random_state=seed, dtype=np.float32, format="csr")
+        rows = sp.csr_matrix(base[np.arange(count) // 5] + sp.random(count, dim, density=0.01, random_state=seed + 1, dtype=np.float32))
+        rows = sp.csr_matrix(rows.multiply(1 / np.sqrt(rows.multiply(rows).sum(axis=1))))
+    else:
+        base = rng.standard_normal((count // 5 + 1, dim)).astype(np.float32)
+        rows = base[np.arange(count) // 5] + 0.3 * rng.standard_normal((count, dim)).astype(np.float32)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    relevance = np.sort(rng.uniform(0.3, 0.9, count))[::-1]
+    return relevance, rows
+
+
+def reference_mmr(relevance: np.ndarray, vectors, k: int, diversity: float) -> list:
+    dense = vectors.toarray() if sp.issparse(vectors) else vectors
+    picked = []
+    while len(picked) < min(k, len(relevance)):
+        best, best_score = None, -np.inf
+        for i in range(len(relevance)):
+            if i in picked:
+                continue
+            redundancy = max((float(np.dot(dense[i], dense[j])) for j in picked), default=0.0)
+            score = (1 - diversity) * relevance[i] - diversity * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+    return picked
+
+
+def time_calls(fn, repeats: int) -> np.ndarray:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return np.array(latencies) * 1000
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--diversity", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, dim, sparse in (("dense 384", 384, False), ("tfidf 1000", 1000, True)):
+        for fetch_k in args.fetch_k:
+            relevance, vectors = overlapping_candidates(fetch_k, dim, sparse)
+            for top_k in args.top_k:
+                picked = maximal_marginal_relevance(relevance, vectors, top_k, args.diversity)
+                assert picked.tolist() == reference_mmr(relevance, vectors, top_k, args.diversity), "picks differ"
+                latencies = time_calls(lambda: maximal_marginal_relevance(relevance, vectors, top_k, args.diversity), args.repeats)
+                loop = time_calls(lambda: reference_mmr(relevance, vectors, top_k, args.diversity), 3)
+                runs = len(set((picked // 5).tolist()))
+                print(
+                    f"{label:>10} fetch_k {fetch_k:4d} top_k {top_k:3d}: p50 {np.percentile(latencies, 50):6.3f} ms  "
+                    f"p99 {np.percentile(latencies, 99):6.3f} ms  (pairwise loop {np.median(loop):8.1f} ms)  "
+                    f"{runs} distinct runs in top_k"
+                )
+
+
+if __name__ == "__main__":
+    main_benchmark()
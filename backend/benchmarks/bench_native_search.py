@@ -0,0 +1,78 @@
+"""Exact in-process dense search against the Chroma collection, head to head
+
+Loads the same synthetic clustered, L2-normalized embeddings into a float32
+DenseVectorStore and into a ChromaVectorStore (the HNSW index main.py uses
+for VECTOR_BACKEND=chroma), then compares load time, RSS growth, single
+question latency, batched throughput (many questions per query call, as an
+evaluation run would send them) and recall@5 against exact search.
+
+Run from the backend directory:
+    python -m benchmarks.bench_native_search --chunks 100000 --dim 384 --batch 64
+"""
+import argparse
+import time
+import uuid
+
+import chromadb
+import numpy as np
+
+from benchmarks.bench_quantized import clustered_embeddings
+from benchmarks.bench_sparse import load
+from vector_store import ChromaVectorStore, DenseVectorStore
+
+
+def measure(store, queries: np.ndarray, batch: int, exact: np.ndarray) -> dict:
+    latencies, hits = [], 0
+    for q in range(len(queries)):
+        started = time.perf_counter()
+        result = store.query(queries[q:q + 1], n_results=5)
+        latencies.append(time.perf_counter() - started)
+        hits += len({int(i.split("_")[1]) for i in result["ids"][0]} & set(exact[q].tolist()))
+    started = time.perf_counter()
+    for first in range(0, len(queries), batch):
+        store.query(queries[first:first + batch], n_results=5)
+    batched_seconds = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": np.percentile(latencies, 50),
+        "p95_ms": np.percentile(latencies, 95),
+        "batched_qps": len(queries) / batched_seconds,
+        "recall": hits / (5 * len(queries))
+    }
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=64, help="questions per batched query call")
+    parser.add_argument("--batch-size", type=int, default=5000, help="chunks per add call")
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    embeddings = clustered_embeddings(args.chunks, args.dim, args.clusters, seed=1)
+    queries = clustered_embeddings(args.queries, args.dim, args.clusters, seed=2)
+    exact = np.argsort(-(queries.astype(np.float64) @ embeddings.T.astype(np.float64)), axis=1)[:, :5]
+    chunks = [""] * args.chunks
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} questions, batches of {args.batch}")
+
+    stores = [("native", lambda: DenseVectorStore(initial_capacity=args.chunks))]
+    if not args.skip_chroma:
+        stores.append(("chroma", lambda: ChromaVectorStore(
+            chromadb.Client(), f"bench_{uuid.uuid4().hex[:8]}", batch_size=args.batch_size
+        )))
+    for name, new_store in stores:
+        store = new_store()
+        loaded = load(store, embeddings, chunks, args.batch_size)
+        result = measure(store, queries, args.batch, exact)
+        print(
+            f"{name:>7}: load {loaded['seconds']:5.1f}s  rss +{loaded['rss_mb']:5.0f} MB  "
+            f"query p50 {result['p50_ms']:6.2f} ms  p95 {result['p95_ms']:6.2f} ms  "
+            f"batched {result['batched_qps']:7.0f} questions/s  recall@5 {result['recall']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main_benchmark()
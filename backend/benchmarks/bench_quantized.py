@@ -0,0 +1,90 @@
+"""Memory, latency and recall@5 of float32 and int8 dense vector storage
+
+Fills DenseVectorStore with synthetic clustered, L2-normalized embeddings of
+sentence-transformer size and compares float32 rows, int8 rows, and int8
+rows re-ranked in float32, against exact float64 search. Memory per chunk is
+the in-process vector storage, next to what the same vectors take as the
+Python float lists handed to Chroma.
+
+Run from the backend directory:
+    python -m benchmarks.bench_quantized --chunks 200000 --dim 384
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from persistence import SnapshotDirectory
+from vector_store import DenseVectorStore
+
+
+def clustered_embeddings(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def reload(store: DenseVectorStore, directory: str) -> DenseVectorStore:
+    """Save and reopen the store, as a restarted server would see it"""
+    snapshots = SnapshotDirectory(directory)
+    path = snapshots.create()
+    state = store.save(directory, path)
+    snapshots.commit(path)
+    return DenseVectorStore.load(directory, path, state)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument(
+        "--no-reload", dest="reload", action="store_false",
+        help="query the store as filled instead of after a save and load, which maps the rescoring rows"
+    )
+    args = parser.parse_args()
+
+    embeddings = clustered_embeddings(args.chunks, args.dim, args.clusters, seed=1)
+    queries = clustered_embeddings(args.queries, args.dim, args.clusters, seed=2)
+    exact = np.argsort(-(queries.astype(np.float64) @ embeddings.T.astype(np.float64)), axis=1)[:, :5]
+    # A Python float is a 24-byte object behind an 8-byte list slot
+    list_bytes = args.dim * (8 + 24)
+    print(f"{args.chunks} chunks x {args.dim} dims; float lists for Chroma: {list_bytes} bytes/chunk")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for precision, rescore in (("float32", 0), ("int8", 0), ("int8", args.rescore)):
+            store = DenseVectorStore(precision=precision, rescore=rescore, initial_capacity=args.chunks)
+            for start in range(0, args.chunks, args.batch_size):
+                end = min(start + args.batch_size, args.chunks)
+                store.add(
+                    [str(i) for i in range(start, end)],
+                    embeddings[start:end],
+                    [""] * (end - start),
+                    [{"paper_id": str(i // 100), "chunk_index": i % 100} for i in range(start, end)]
+                )
+
+            if args.reload:
+                store = reload(store, directory)
+
+            latencies, hits = [], 0
+            for q in range(args.queries):
+                started = time.perf_counter()
+                result = store.query(queries[q:q + 1], n_results=5)
+                latencies.append(time.perf_counter() - started)
+                hits += len({int(i) for i in result["ids"][0]} & set(exact[q].tolist()))
+            latencies = np.array(latencies) * 1000
+            label = f"{precision}" + (f" + rescore x{rescore}" if rescore else "")
+            print(
+                f"{label:>20}: {store.memory_bytes() / args.chunks:6.0f} bytes/chunk  "
+                f"query p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms  "
+                f"recall@5 {hits / (5 * args.queries):.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,93 @@
+"""Memory and query latency of the sparse CSR store against dense Chroma
+
+Builds a synthetic corpus of TF-IDF chunk vectors (Zipf-distributed words,
+the same vectorizer settings as main.py) and loads it into SparseVectorStore
+and into a ChromaVectorStore, then times single-question queries on both.
+Memory is the RSS growth while loading, plus the exact size of the CSR arrays.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sparse --chunks 100000
+"""
+import argparse
+import time
+import uuid
+
+import chromadb
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from benchmarks.memory import rss_mb
+from vector_store import ChromaVectorStore, SparseVectorStore
+
+
+def synthetic_chunks(count: int, words_per_chunk: int = 80, vocabulary: int = 20000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"term{i}" for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, size=(count, words_per_chunk)), vocabulary) - 1
+    return [" ".join(words[row]) for row in ranks]
+
+
+def load(store, embeddings, chunks, batch_size: int) -> dict:
+    before = rss_mb()
+    started = time.perf_counter()
+    for start in range(0, len(chunks), batch_size):
+        end = start + batch_size
+        store.add(
+            [f"chunk_{i}" for i in range(start, min(end, len(chunks)))],
+            embeddings[start:end],
+            chunks[start:end],
+            [{"paper_id": f"paper_{i // 100}", "chunk_index": i % 100} for i in range(start, min(end, len(chunks)))]
+        )
+    return {"seconds": time.perf_counter() - started, "rss_mb": rss_mb() - before}
+
+
+def time_queries(store, queries, n_results: int = 5) -> dict:
+    latencies = []
+    for q in range(queries.shape[0]):
+        started = time.perf_counter()
+        store.query(queries[q], n_results=n_results)
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    return {"p50_ms": np.percentile(latencies, 50), "p95_ms": np.percentile(latencies, 95)}
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Generating and vectorizing {args.chunks} chunks")
+    chunks = synthetic_chunks(args.chunks)
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+    embeddings = vectorizer.fit_transform(chunks)
+    queries = vectorizer.transform(synthetic_chunks(args.queries, words_per_chunk=6, seed=1))
+    density = embeddings.nnz / (embeddings.shape[0] * embeddings.shape[1])
+    print(f"{embeddings.shape[1]} features, {density:.1%} non-zero")
+
+    sparse_store = SparseVectorStore()
+    loaded = load(sparse_store, embeddings, chunks, args.batch_size)
+    latency = time_queries(sparse_store, queries)
+    print(
+        f"sparse: load {loaded['seconds']:.1f}s  rss +{loaded['rss_mb']:.0f} MB  "
+        f"vectors {sparse_store.memory_bytes() / 2**20:.1f} MB  "
+        f"query p50 {latency['p50_ms']:.2f} ms  p95 {latency['p95_ms']:.2f} ms"
+    )
+
+    if args.skip_chroma:
+        return
+    chroma_store = ChromaVectorStore(chromadb.Client(), f"bench_{uuid.uuid4().hex[:8]}", batch_size=args.batch_size)
+    loaded = load(chroma_store, embeddings, chunks, args.batch_size)
+    latency = time_queries(chroma_store, queries)
+    dense_mb = embeddings.shape[0] * embeddings.shape[1] * 4 / 2**20
+    print(
+        f"chroma: load {loaded['seconds']:.1f}s  rss +{loaded['rss_mb']:.0f} MB  "
+        f"vectors {dense_mb:.1f} MB as float32  "
+        f"query p50 {latency['p50_ms']:.2f} ms  p95 {latency['p95_ms']:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,85 @@
+"""Time to save a large sparse index and to load it back ready to serve
+
+Fills a SparseVectorStore with synthetic TF-IDF chunks, snapshots it the way
+main.save_index does, then loads it in a fresh process and times the load and
+the first query. Also times an incremental save after a small upload, which
+only appends the new rows.
+
+Run from the backend directory:
+    python -m benchmarks.bench_warm_restart --chunks 1000000
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from benchmarks.bench_sparse import synthetic_chunks
+from benchmarks.memory import rss_mb
+from persistence import SnapshotDirectory, read_json, write_json
+from vector_store import SparseVectorStore
+
+
+def save(store: SparseVectorStore, snapshots: SnapshotDirectory) -> float:
+    started = time.perf_counter()
+    path = snapshots.create()
+    write_json(f"{path}/state.json", {"store": store.save(snapshots.root, path)})
+    snapshots.commit(path)
+    return time.perf_counter() - started
+
+
+def load(directory: str):
+    before = rss_mb()
+    started = time.perf_counter()
+    snapshots = SnapshotDirectory(directory)
+    path = snapshots.latest()
+    store = SparseVectorStore.load(directory, path, read_json(f"{path}/state.json")["store"])
+    loaded = time.perf_counter() - started
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english').fit(synthetic_chunks(2000))
+    query = vectorizer.transform(["term1 term7 term42"])
+    started = time.perf_counter()
+    store.query(query, n_results=5)
+    first_query = time.perf_counter() - started
+    print(
+        f"load {loaded:.2f}s for {store.count()} chunks  first query {first_query * 1000:.1f} ms  "
+        f"rss +{rss_mb() - before:.0f} MB"
+    )
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--load", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.load:
+        load(args.load)
+        return
+
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english').fit(synthetic_chunks(20000))
+    store = SparseVectorStore()
+    print(f"Building {args.chunks} chunks")
+    for start in range(0, args.chunks, args.batch_size):
+        count = min(args.batch_size, args.chunks - start)
+        chunks = synthetic_chunks(count, seed=start)
+        store.add(
+            [f"chunk_{i}" for i in range(start, start + count)],
+            vectorizer.transform(chunks),
+            chunks,
+            [{"paper_id": f"paper_{i // 100}", "chunk_index": i % 100} for i in range(start, start + count)]
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshots = SnapshotDirectory(directory)
+        print(f"full save {save(store, snapshots):.2f}s")
+        chunks = synthetic_chunks(256, seed=args.chunks)
+        store.add([f"new_{i}" for i in range(256)], vectorizer.transform(chunks), chunks,
+                  [{"paper_id": "new", "chunk_index": i} for i in range(256)])
+        print(f"incremental save of 256 chunks {save(store, snapshots):.3f}s")
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_warm_restart", "--load", directory], check=True)
+
+
+if __name__ == "__main__":
+    main_benchmark()
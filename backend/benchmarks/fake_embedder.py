@@ -0,0 +1,45 @@
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embeddings import Embedder
+from vector_store import Vectors
+
+
+class FakeEmbedder(Embedder):
+    """Deterministic dense embeddings from hashed words, for tests and benchmarks
+
+    Each word adds a fixed pseudo-random vector seeded by its hash, so
+    texts sharing words get similar embeddings without any model.
+    """
+
+    name = "fake"
+
+    def __init__(self, dimension: int = 384):
+        self._dimension = dimension
+        self._word_vectors: Dict[str, np.ndarray] = {}
+
+    @property
+    def version(self) -> str:
+        return f"fake-{self._dimension}"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self._dimension).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    def embed(self, texts: List[str]) -> Vectors:
+        embeddings = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row] += self._word_vector(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
@@ -0,0 +1,68 @@
+"""Minimal PDF writer for generating large synthetic papers in benchmarks"""
+import random
+
+WORDS = (
+    "neural network attention transformer gradient descent optimization batch "
+    "normalization dataset evaluation benchmark convolution recurrent embedding "
+    "retrieval graph knowledge semantic vector index latency throughput memory "
+    "regularization dropout inference training loss accuracy precision recall "
+    "encoder decoder layer activation parameter hyperparameter baseline ablation"
+).split()
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(rng: random.Random, lines_per_page: int, words_per_line: int, header: str) -> bytes:
+    parts = ["BT /F1 10 Tf 12 TL 50 790 Td"]
+    if header:
+        parts.append(f"({_escape(header)}) Tj T*")
+    for _ in range(lines_per_page):
+        line = " ".join(rng.choice(WORDS) for _ in range(words_per_line))
+        parts.append(f"({_escape(line)}) Tj T*")
+    parts.append("ET")
+    return "\n".join(parts).encode("latin-1")
+
+
+def write_synthetic_pdf(
+    path: str,
+    pages: int,
+    lines_per_page: int = 50,
+    words_per_line: int = 12,
+    seed: int = 0,
+    title: str = "Synthetic Benchmark Paper"
+):
+    """Write a text-only PDF with `pages` pages of random research vocabulary"""
+    rng = random.Random(seed)
+    offsets = []
+
+    with open(path, "wb") as out:
+        def write_object(number: int, body: bytes):
+            offsets.append((number, out.tell()))
+            out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        out.write(b"%PDF-1.4\n")
+        # 1: catalog, 2: page tree, 3: font, then (page, content) pairs
+        page_numbers = [4 + 2 * i for i in range(pages)]
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{n} 0 R" for n in page_numbers)
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for i, number in enumerate(page_numbers):
+            header = f"{title} - Authors: John Smith and Jane Doe" if i == 0 else f"Page {i + 1}"
+            stream = _page_stream(rng, lines_per_page, words_per_line, header)
+            write_object(number, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {number + 1} 0 R >>"
+            ).encode())
+            write_object(number + 1, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        xref_offset = out.tell()
+        total = 3 + 2 * pages
+        out.write(f"xref\n0 {total + 1}\n".encode())
+        out.write(b"0000000000 65535 f \n")
+        for _, offset in sorted(offsets):
+            out.write(f"{offset:010d} 00000 n \n".encode())
+        out.write(f"trailer\n<< /Size {total + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
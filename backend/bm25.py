@@ -0,0 +1,508 @@
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from persistence import append_at, map_array, write_atomic
+from vector_store import ChunkRows, empty_result, grow, save_chunk_columns, top_k
+
+logger = logging.getLogger(__name__)
+
+# Words of two or more characters, as TfidfVectorizer splits them
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+
+class Segment:
+    """Immutable postings of a range of rows, sorted by term id and then row
+
+    Term `terms[i]` owns `rows[offsets[i]:offsets[i + 1]]` and the matching
+    term frequencies in `tfs`. Per term, `max_tf` and `min_length` (the
+    shortest row containing it) bound the BM25 score of any of its postings
+    in this segment. On disk a segment is one file holding the six arrays
+    back to back, each padded to 8 bytes, and is memory-mapped on load.
+    """
+
+    layout = (
+        ("terms", np.int32, "terms"),
+        ("offsets", np.int64, "offsets"),
+        ("max_tf", np.uint16, "terms"),
+        ("min_length", np.int32, "terms"),
+        ("rows", np.int32, "postings"),
+        ("tfs", np.uint16, "postings"),
+    )
+
+    def __init__(
+        self,
+        name: str,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        max_tf: np.ndarray,
+        min_length: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray
+    ):
+        self.name = name
+        self.terms = terms
+        self.offsets = offsets
+        self.max_tf = max_tf
+        self.min_length = min_length
+        self.rows = rows
+        self.tfs = tfs
+
+    @property
+    def postings(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field, _, _ in self.layout)
+
+    @classmethod
+    def build(cls, name: str, term_ids: np.ndarray, rows: np.ndarray, lengths: np.ndarray) -> "Segment":
+        """A segment from one (term id, row) pair per token, in any order"""
+        first = int(rows.min())
+        span = int(rows.max()) - first + 1
+        keys, counts = np.unique(term_ids.astype(np.int64) * span + (rows - first), return_counts=True)
+        return cls._from_sorted(
+            name,
+            keys // span,
+            (keys % span + first).astype(np.int32),
+            np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16),
+            lengths
+        )
+
+    @classmethod
+    def merge(
+        cls,
+        name: str,
+        segments: List["Segment"],
+        lengths: np.ndarray,
+        remap: Optional[np.ndarray] = None
+    ) -> "Segment":
+        """One segment with the postings of `segments`, which must be in row order
+
+        With `remap`, rows are renumbered through it and rows mapped to -1
+        are dropped.
+        """
+        terms = np.concatenate([np.repeat(segment.terms, np.diff(segment.offsets)) for segment in segments])
+        rows = np.concatenate([segment.rows for segment in segments])
+        tfs = np.concatenate([segment.tfs for segment in segments])
+        if remap is not None:
+            rows = remap[rows]
+            keep = rows >= 0
+            terms, rows, tfs = terms[keep], rows[keep].astype(np.int32), tfs[keep]
+        # Segments hold disjoint, ascending row ranges, so a stable sort by
+        # term keeps every term's rows in order
+        order = np.argsort(terms, kind="stable")
+        return cls._from_sorted(name, terms[order], rows[order], tfs[order], lengths)
+
+    @classmethod
+    def _from_sorted(cls, name: str, terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray, lengths: np.ndarray) -> "Segment":
+        unique_terms, starts = np.unique(terms, return_index=True)
+        if len(starts):
+            max_tf = np.maximum.reduceat(tfs, starts)
+            min_length = np.minimum.reduceat(lengths[rows], starts).astype(np.int32)
+        else:
+            max_tf, min_length = np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.int32)
+        return cls(
+            name,
+            unique_terms.astype(np.int32),
+            np.append(starts, len(rows)).astype(np.int64),
+            max_tf,
+            min_length,
+            rows,
+            tfs
+        )
+
+    def lookup(self, term_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Position in `terms` of each term id, and whether the segment has it"""
+        positions = np.searchsorted(self.terms, term_ids)
+        found = positions < len(self.terms)
+        found[found] = self.terms[positions[found]] == term_ids[found]
+        return positions, found
+
+    def write(self, path: str):
+        parts = []
+        for field, _, _ in self.layout:
+            payload = getattr(self, field).tobytes()
+            parts.append(payload + b"\0" * (-len(payload) % 8))
+        write_atomic(path, b"".join(parts))
+
+    @classmethod
+    def open(cls, path: str, name: str, terms: int, postings: int) -> "Segment":
+        sizes = {"terms": terms, "offsets": terms + 1, "postings": postings}
+        arrays, offset = {}, 0
+        for field, dtype, size in cls.layout:
+            length = sizes[size]
+            arrays[field] = (
+                np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(length,))
+                if length else np.empty(0, dtype=dtype)
+            )
+            offset += -(-length * np.dtype(dtype).itemsize // 8) * 8
+        return cls(name, **arrays)
+
+
+class BM25Index:
+    """Okapi BM25 keyword search over chunk texts with an inverted index
+
+    Every `add` tokenizes its chunks into a new immutable segment of
+    array-backed postings (int32 rows, uint16 term frequencies); once
+    `merge_factor` segments of the same size tier pile up at the tail they
+    are merged into one, so the number of segments grows logarithmically.
+    Term ids are assigned on first sight and never change.
+
+    Queries are scored term at a time with MaxScore: terms are visited in
+    decreasing order of the highest score they can contribute, and as soon
+    as the terms left could not lift an unseen row past the current k-th
+    best score, the remaining (usually long, common-term) posting lists are
+    only probed for the rows already in contention instead of scanned.
+
+    Like Lucene, deleted rows keep counting towards document frequencies
+    and the average length until the next compaction, which rewrites the
+    index without them. `save` writes only segments not on disk yet and
+    appends new rows and terms to column files; `load` memory-maps it all.
+    Results come in the vector stores' shape, with `distances` of 1 minus
+    the score over the highest score the query could reach.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_factor: int = 4, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.merge_factor = merge_factor
+        self.compact_ratio = compact_ratio
+        self._term_ids: Dict[str, int] = {}
+        self._term_names: List[str] = []
+        self._doc_freq = np.zeros(1024, dtype=np.int32)
+        self._lengths = np.zeros(1024, dtype=np.int32)
+        self._chunks = ChunkRows()
+        self._total_length = 0
+        self._segments: List[Segment] = []
+        self._next_segment = 0
+        # (chunk generation, k1 * (1 - b + b * length / average length) per row)
+        self._norm_cache: Optional[Tuple[int, np.ndarray]] = None
+        self._storage_id = uuid.uuid4().hex
+        # (rows, terms, document bytes, row-file bytes, term-file bytes) already in the column files
+        self._saved = (0, 0, 0, 0, 0)
+        self._saved_segments: set = set()
+        # Writers are serialized; queries only take `_lock` to read a consistent state
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        tokenized = [tokenize(document) for document in documents]
+        with self._write_lock:
+            term_ids = []
+            for tokens in tokenized:
+                for token in tokens:
+                    term_id = self._term_ids.get(token)
+                    if term_id is None:
+                        term_id = self._term_ids[token] = len(self._term_names)
+                        self._term_names.append(token)
+                    term_ids.append(term_id)
+            term_ids = np.array(term_ids, dtype=np.int32)
+            lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.int32)
+            start, end = self._chunks.rows, self._chunks.rows + len(documents)
+
+            with self._lock:
+                self._reserve(end, len(self._term_names))
+                self._lengths[start:end] = lengths
+            rows = np.repeat(np.arange(start, end, dtype=np.int32), lengths)
+            segment = Segment.build(self._segment_name(), term_ids, rows, self._lengths) if len(term_ids) else None
+
+            with self._lock:
+                if segment is not None:
+                    self._doc_freq[segment.terms] += np.diff(segment.offsets).astype(np.int32)
+                    self._segments = self._segments + [segment]
+                self._total_length += int(lengths.sum())
+                self._chunks.append(ids, documents, metadatas)
+            self._merge_tail()
+
+    def query(self, texts: List[str], n_results: int = 5, prune: bool = True, paper_ids: Optional[List[str]] = None) -> dict:
+        """Top `n_results` chunks for each text, only from `paper_ids` if given
+
+        `prune=False` scores every posting, for comparison.
+        """
+        queries = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            chunks = self._chunks
+            rows, available = chunks.rows, chunks.count()
+            segments, live, lengths = self._segments, chunks.live[:rows], self._lengths[:rows]
+            if paper_ids is not None:
+                # Rows of other papers are scored but never become candidates
+                allowed = np.array([row for paper_id in paper_ids for row in chunks.by_paper.get(paper_id, [])], dtype=np.int64)
+                live, allowed_live = np.zeros(rows, dtype=bool), live[allowed]
+                live[allowed] = allowed_live
+                available = int(allowed_live.sum())
+            ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+            average_length = self._total_length / rows if rows else 0.0
+            generation, norm_cache = chunks.generation, self._norm_cache
+            terms = [
+                {self._term_ids[token]: count for token, count in counts.items() if token in self._term_ids}
+                for counts in queries
+            ]
+            doc_freq = {term: int(self._doc_freq[term]) for query_terms in terms for term in query_terms}
+        if available <= 0:
+            return empty_result(len(texts))
+        if norm_cache is None or norm_cache[0] != generation:
+            norm_cache = (generation, (self.k1 * (1 - self.b + self.b * lengths / average_length)).astype(np.float32))
+            with self._lock:
+                if self._chunks.generation == generation:
+                    self._norm_cache = norm_cache
+        norms = norm_cache[1]
+
+        results = empty_result(len(texts))
+        k = min(n_results, available)
+        for q, query_terms in enumerate(terms):
+            if not query_terms or k <= 0:
+                continue
+            term_ids = np.array(list(query_terms), dtype=np.int32)
+            # Lucene's IDF, which stays positive for terms in most rows
+            weights = np.array([
+                math.log(1 + (rows - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5)) * count
+                for term, count in query_terms.items()
+            ])
+            best, scores = self._search(term_ids, weights, segments, live, norms, average_length, k, prune)
+            ceiling = weights.sum() * (self.k1 + 1)
+            results["ids"][q] = [ids[i] for i in best]
+            results["documents"][q] = [documents[i] for i in best]
+            results["metadatas"][q] = [metadatas[i] for i in best]
+            results["distances"][q] = (1.0 - scores / ceiling).tolist()
+        return results
+
+    def _search(
+        self,
+        term_ids: np.ndarray,
+        weights: np.ndarray,
+        segments: List[Segment],
+        live: np.ndarray,
+        norms: np.ndarray,
+        average_length: float,
+        k: int,
+        prune: bool
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Each term's posting slices across segments, and the highest score
+        # any of its postings can reach
+        postings = [[] for _ in term_ids]
+        bounds = np.zeros(len(term_ids))
+        for segment in segments:
+            positions, found = segment.lookup(term_ids)
+            for t in np.flatnonzero(found):
+                start, end = segment.offsets[positions[t]], segment.offsets[positions[t] + 1]
+                postings[t].append((segment.rows[start:end], segment.tfs[start:end]))
+                max_tf = float(segment.max_tf[positions[t]])
+                norm = self.k1 * (1 - self.b + self.b * segment.min_length[positions[t]] / average_length)
+                bounds[t] = max(bounds[t], weights[t] * max_tf * (self.k1 + 1) / (max_tf + norm))
+
+        # Terms without postings, as after a compaction, add nothing
+        order = np.argsort(-bounds, kind="stable")
+        order = order[[len(postings[t]) > 0 for t in order]]
+        # remaining[i]: the most the terms from order[i] on can still add
+        remaining = np.append(np.cumsum(bounds[order][::-1])[::-1], 0.0)
+        scores = np.zeros(len(live), dtype=np.float32)
+        seen = np.zeros(len(live), dtype=bool)
+        candidates = np.empty(0, dtype=np.int32)
+        threshold = 0.0
+
+        def kth_best() -> float:
+            return float(np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]) if len(candidates) >= k else 0.0
+
+        # Essential terms: every posting is scored and may add a candidate
+        position = 0
+        while position < len(order) and not (prune and len(candidates) >= k and remaining[position] <= threshold):
+            t = order[position]
+            added = [candidates]
+            for rows, tfs in postings[t]:
+                tfs = tfs.astype(np.float32)
+                scores[rows] += weights[t] * tfs * (self.k1 + 1) / (tfs + norms[rows])
+                new = rows[~seen[rows]]
+                seen[new] = True
+                added.append(new[live[new]])
+            candidates = np.concatenate(added)
+            threshold = kth_best()
+            position += 1
+
+        # The rest can no longer lift a new row into the top k: only rows
+        # that may still get there are looked up in their posting lists
+        for position in range(position, len(order)):
+            t = order[position]
+            candidates = candidates[scores[candidates] + remaining[position] >= threshold]
+            for rows, tfs in postings[t]:
+                if len(candidates) * 4 > len(rows):
+                    # Probing costs more than reading a list this short; rows
+                    # that are not candidates are scored but never ranked
+                    tfs = tfs.astype(np.float32)
+                    scores[rows] += weights[t] * tfs * (self.k1 + 1) / (tfs + norms[rows])
+                    continue
+                at = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+                hit = rows[at] == candidates
+                matched, matched_tfs = candidates[hit], tfs[at[hit]].astype(np.float32)
+                scores[matched] += weights[t] * matched_tfs * (self.k1 + 1) / (matched_tfs + norms[matched])
+            threshold = kth_best()
+
+        best = candidates[top_k(scores[candidates][None, :], k)[0]]
+        return best, scores[best]
+
+    def delete(self, paper_id: str):
+        with self._write_lock:
+            with self._lock:
+                if not self._chunks.delete(paper_id):
+                    return
+            if self._chunks.needs_compaction(self.compact_ratio):
+                self._compact()
+
+    def count(self) -> int:
+        return self._chunks.count()
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            segments = self._segments
+        return {
+            "chunks": self.count(),
+            "terms": len(self._term_names),
+            "segments": len(segments),
+            "postings": sum(segment.postings for segment in segments),
+            "bytes": self.memory_bytes()
+        }
+
+    def memory_bytes(self) -> int:
+        """Bytes of postings, document frequencies, lengths and the live mask"""
+        with self._lock:
+            segments = self._segments
+        return sum(segment.nbytes for segment in segments) + self._doc_freq.nbytes + self._lengths.nbytes + self._chunks.live.nbytes
+
+    def save(self, directory: str, snapshot_path: str) -> dict:
+        """Write new segments and append new rows and terms to the column files
+
+        Files shared between snapshots go to `directory`, the live mask and
+        document frequencies to `snapshot_path`. The returned state lists
+        every file in `directory` the snapshot needs.
+        """
+        with self._write_lock:
+            with self._lock:
+                chunks = self._chunks
+                rows, deleted, total_length = chunks.rows, chunks.deleted, self._total_length
+                ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+                lengths, segments = self._lengths, self._segments
+                live = chunks.live[:rows].copy()
+                doc_freq = self._doc_freq[:len(self._term_names)].copy()
+            term_names, next_segment = self._term_names, self._next_segment
+            storage_id = self._storage_id
+            saved_rows, saved_terms, saved_document_bytes, saved_row_bytes, saved_term_bytes = self._saved
+            terms = len(term_names)
+
+            prefix = os.path.join(directory, storage_id)
+            document_bytes, row_bytes = save_chunk_columns(
+                prefix, ids, documents, metadatas, saved_rows, rows, saved_document_bytes, saved_row_bytes
+            )
+            append_at(f"{prefix}.lengths", saved_rows * 4, lengths[saved_rows:rows].tobytes())
+            new_terms = "".join(term + "\n" for term in term_names[saved_terms:terms]).encode("utf-8")
+            append_at(f"{prefix}.terms", saved_term_bytes, new_terms)
+            for segment in segments:
+                if segment.name not in self._saved_segments:
+                    segment.write(os.path.join(directory, segment.name))
+            np.save(os.path.join(snapshot_path, "bm25_live.npy"), live)
+            np.save(os.path.join(snapshot_path, "bm25_doc_freq.npy"), doc_freq)
+
+            self._saved = (rows, terms, document_bytes, row_bytes, saved_term_bytes + len(new_terms))
+            self._saved_segments = {segment.name for segment in segments}
+        columns = ("documents", "offsets", "rows", "lengths", "terms")
+        return {
+            "storage_id": storage_id,
+            "rows": rows,
+            "deleted": deleted,
+            "total_length": total_length,
+            "terms": terms,
+            "term_bytes": self._saved[4],
+            "document_bytes": document_bytes,
+            "row_bytes": row_bytes,
+            "segments": [
+                {"name": segment.name, "terms": len(segment.terms), "postings": segment.postings}
+                for segment in segments
+            ],
+            "next_segment": next_segment,
+            "k1": self.k1,
+            "b": self.b,
+            "files": [f"{storage_id}.{column}" for column in columns] + [segment.name for segment in segments]
+        }
+
+    @classmethod
+    def load(cls, directory: str, snapshot_path: str, state: dict) -> "BM25Index":
+        """Open a saved index, memory-mapping its segments, lengths and documents"""
+        index = cls(k1=state["k1"], b=state["b"])
+        prefix = os.path.join(directory, state["storage_id"])
+        rows = state["rows"]
+        with open(f"{prefix}.terms", "rb") as terms_file:
+            index._term_names = terms_file.read(state["term_bytes"]).decode("utf-8").splitlines()
+        index._term_ids = {term: term_id for term_id, term in enumerate(index._term_names)}
+        index._doc_freq = np.load(os.path.join(snapshot_path, "bm25_doc_freq.npy"))
+        index._lengths = map_array(f"{prefix}.lengths", np.int32, rows)
+        live = np.load(os.path.join(snapshot_path, "bm25_live.npy"))
+        index._chunks = ChunkRows.load(prefix, rows, state["row_bytes"], live, state["deleted"])
+        index._segments = [
+            Segment.open(os.path.join(directory, saved["name"]), saved["name"], saved["terms"], saved["postings"])
+            for saved in state["segments"]
+        ]
+        index._total_length = state["total_length"]
+        index._next_segment = state["next_segment"]
+        index._storage_id = state["storage_id"]
+        index._saved = (rows, state["terms"], state["document_bytes"], state["row_bytes"], state["term_bytes"])
+        index._saved_segments = {saved["name"] for saved in state["segments"]}
+        return index
+
+    def _segment_name(self) -> str:
+        self._next_segment += 1
+        return f"{self._storage_id}.segment-{self._next_segment:06d}"
+
+    def _tier(self, segment: Segment) -> int:
+        return int(math.log(max(segment.postings, 1), self.merge_factor))
+
+    def _merge_tail(self):
+        """Merge the last `merge_factor` segments while they share a size tier"""
+        while True:
+            segments = self._segments
+            tail = segments[-self.merge_factor:]
+            if len(tail) < self.merge_factor or len({self._tier(segment) for segment in tail}) > 1:
+                return
+            merged = Segment.merge(self._segment_name(), tail, self._lengths)
+            with self._lock:
+                self._segments = segments[:-self.merge_factor] + [merged]
+
+    def _reserve(self, rows: int, terms: int):
+        if rows > len(self._lengths):
+            self._lengths = grow(self._lengths, max(rows, 2 * len(self._lengths)), self._chunks.rows)
+        if terms > len(self._doc_freq):
+            self._doc_freq = grow(self._doc_freq, max(terms, 2 * len(self._doc_freq)), len(self._doc_freq))
+
+    def _compact(self):
+        chunks, keep = self._chunks.compacted()
+        remap = np.full(self._chunks.rows, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        lengths = np.ascontiguousarray(self._lengths[keep])
+        storage_id = uuid.uuid4().hex
+        self._storage_id, self._next_segment = storage_id, 0
+        merged = Segment.merge(self._segment_name(), self._segments, lengths, remap) if self._segments else None
+        doc_freq = np.zeros(len(self._doc_freq), dtype=np.int32)
+        if merged is not None:
+            doc_freq[merged.terms] = np.diff(merged.offsets)
+        with self._lock:
+            self._segments = [merged] if merged is not None and merged.postings else []
+            self._doc_freq = doc_freq
+            self._lengths = lengths
+            self._chunks = chunks
+            self._total_length = int(lengths.sum())
+            self._saved = (0, 0, 0, 0, 0)
+            self._saved_segments = set()
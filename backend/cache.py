@@ -0,0 +1,270 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from embeddings import Embedder
+from metrics import Registry
+from persistence import write_atomic
+from vector_store import Vectors
+
+# (column indices or None for a dense row, float32 values, dimension)
+CachedRow = Tuple[Optional[np.ndarray], np.ndarray, int]
+
+
+class EmbeddingCache:
+    """LRU cache from chunk text and embedder version to the chunk's vector
+
+    Chunks that repeat across papers and re-ingestions (licence text, headers,
+    reference lists) are embedded once. Sparse rows keep only their non-zeros
+    as int32 indices and float32 values, dense rows are float32; the least
+    recently used rows are evicted once their bytes exceed `budget_bytes`.
+    The embedder version is part of the key, so a refit never serves vectors
+    from the previous vocabulary.
+    """
+
+    # Bookkeeping per row on top of its arrays: key, tuple, array headers, LRU node
+    entry_overhead = 320
+
+    def __init__(self, budget_bytes: int, registry: Registry):
+        self.budget_bytes = budget_bytes
+        self.bytes = 0
+        # Bumped on every insert, so callers can tell when to persist
+        self.version = 0
+        self._rows: "OrderedDict[bytes, CachedRow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = registry.counter("embedding_cache_hits_total")
+        self._misses = registry.counter("embedding_cache_misses_total")
+        registry.gauge("embedding_cache_bytes", lambda: self.bytes)
+
+    @staticmethod
+    def key(version: str, text: str) -> bytes:
+        digest = hashlib.blake2b(version.encode("utf-8"), digest_size=16)
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def embed(self, embedder: Embedder, texts: List[str]) -> Vectors:
+        """Embed `texts`, computing vectors only for chunks not already cached"""
+        if self.budget_bytes <= 0 or not texts:
+            return embedder.embed(texts)
+        if not embedder.fitted:
+            # The first TF-IDF fit sets the version; cache what it produced
+            embeddings = embedder.embed(texts)
+            self._misses.inc(len(texts))
+            self._put(embedder.version, texts, embeddings)
+            return embeddings
+
+        version = embedder.version
+        keys = [self.key(version, text) for text in texts]
+        rows: List[Optional[CachedRow]] = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._rows.get(key)
+                if row is not None:
+                    self._rows.move_to_end(key)
+                    rows[i] = row
+
+        # Chunks repeated within the batch are embedded once
+        missing = {}
+        for i, row in enumerate(rows):
+            if row is None:
+                missing.setdefault(keys[i], []).append(i)
+        self._hits.inc(len(texts) - sum(len(positions) for positions in missing.values()))
+        self._misses.inc(sum(len(positions) for positions in missing.values()))
+        if not missing:
+            return self._stack(rows)
+
+        miss_texts = [texts[positions[0]] for positions in missing.values()]
+        embeddings = embedder.embed(miss_texts)
+        computed = self._put(version, miss_texts, embeddings, list(missing))
+        if len(missing) == len(texts):
+            return embeddings
+        for row, positions in zip(computed, missing.values()):
+            for i in positions:
+                rows[i] = row
+        return self._stack(rows)
+
+    def stats(self) -> dict:
+        hits, misses = self._hits.value, self._misses.value
+        return {
+            "entries": len(self._rows),
+            "bytes": self.bytes,
+            "budget_bytes": self.budget_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0
+        }
+
+    def save(self, path: str):
+        """Write every row, least recently used first, to one .npz file"""
+        with self._lock:
+            entries = list(self._rows.items())
+        keys = np.frombuffer(b"".join(key for key, _ in entries), dtype=np.uint8).reshape(-1, 16)
+        sparse = np.array([indices is not None for _, (indices, _, _) in entries], dtype=bool)
+        lengths = np.array([len(data) for _, (_, data, _) in entries], dtype=np.int64)
+        dims = np.array([dim for _, (_, _, dim) in entries], dtype=np.int64)
+        empty_indices = np.empty(0, dtype=np.int32)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            keys=keys,
+            sparse=sparse,
+            lengths=lengths,
+            dims=dims,
+            indices=np.concatenate([indices for _, (indices, _, _) in entries if indices is not None] or [empty_indices]),
+            data=np.concatenate([data for _, (_, data, _) in entries] or [np.empty(0, dtype=np.float32)])
+        )
+        write_atomic(path, buffer.getvalue())
+
+    def load(self, path: str):
+        with np.load(path) as saved:
+            keys, sparse, lengths, dims = saved["keys"], saved["sparse"], saved["lengths"], saved["dims"]
+            indices, data = saved["indices"], saved["data"]
+        data_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        index_offsets = np.concatenate([[0], np.cumsum(np.where(sparse, lengths, 0))])
+        with self._lock:
+            for i in range(len(keys)):
+                row_data = data[data_offsets[i]:data_offsets[i + 1]]
+                row_indices = indices[index_offsets[i]:index_offsets[i + 1]] if sparse[i] else None
+                self._insert(keys[i].tobytes(), (row_indices, row_data, int(dims[i])))
+
+    def _put(self, version: str, texts: List[str], embeddings: Vectors, keys: Optional[List[bytes]] = None) -> List[CachedRow]:
+        if sp.issparse(embeddings):
+            embeddings = sp.csr_matrix(embeddings, dtype=np.float32)
+            rows = [
+                (
+                    embeddings.indices[start:end].astype(np.int32),
+                    embeddings.data[start:end].copy(),
+                    embeddings.shape[1]
+                )
+                for start, end in zip(embeddings.indptr[:-1], embeddings.indptr[1:])
+            ]
+        else:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            rows = [(None, row.copy(), embeddings.shape[1]) for row in embeddings]
+        keys = keys or [self.key(version, text) for text in texts]
+        with self._lock:
+            for key, row in zip(keys, rows):
+                self._insert(key, row)
+        return rows
+
+    def _insert(self, key: bytes, row: CachedRow):
+        previous = self._rows.pop(key, None)
+        if previous is not None:
+            self.bytes -= self._size(previous)
+        self._rows[key] = row
+        self.bytes += self._size(row)
+        self.version += 1
+        while self.bytes > self.budget_bytes and self._rows:
+            _, evicted = self._rows.popitem(last=False)
+            self.bytes -= self._size(evicted)
+
+    def _size(self, row: CachedRow) -> int:
+        indices, data, _ = row
+        return self.entry_overhead + data.nbytes + (indices.nbytes if indices is not None else 0)
+
+    @staticmethod
+    def _stack(rows: List[CachedRow]) -> Vectors:
+        dim = rows[0][2]
+        if rows[0][0] is None:
+            return np.vstack([data for _, data, _ in rows])
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(data) for _, data, _ in rows])
+        return sp.csr_matrix(
+            (
+                np.concatenate([data for _, data, _ in rows]),
+                np.concatenate([indices for indices, _, _ in rows]),
+                indptr
+            ),
+            shape=(len(rows), dim)
+        )
+
+
+class QueryCache:
+    """Bounded LRU of question embeddings and their search results
+
+    Entries are keyed by the whitespace- and case-normalized question, the
+    retriever and the number of results asked for; fused results are cached
+    under their own retriever name and carry no vector. The query vector stays
+    valid while the embedder version is unchanged; the search results only
+    while the corpus generation they were computed at is still current, so
+    every upload, deletion and refit invalidates them without touching the
+    cache. Entries older than `ttl_seconds` are dropped on lookup.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, registry: Registry):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (stored at, embedder version, query vector, corpus generation, results)
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[float, str, Optional[Vectors], int, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = registry.counter("query_cache_hits_total")
+        self._vector_hits = registry.counter("query_cache_vector_hits_total")
+        self._misses = registry.counter("query_cache_misses_total")
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def lookup(
+        self,
+        question: str,
+        n_results: int,
+        embedder_version: str,
+        generation: int,
+        retriever: str = "vector"
+    ) -> Tuple[Optional[Vectors], Optional[dict]]:
+        """The cached query vector and search results, each None if missing or stale"""
+        key = (self.normalize(question), retriever, n_results)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (time.monotonic() - entry[0] > self.ttl_seconds or entry[1] != embedder_version):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or (entry[3] != generation and entry[2] is None):
+            self._misses.inc()
+            return None, None
+        if entry[3] != generation:
+            self._vector_hits.inc()
+            return entry[2], None
+        self._hits.inc()
+        return entry[2], entry[4]
+
+    def store(
+        self,
+        question: str,
+        n_results: int,
+        embedder_version: str,
+        vector: Optional[Vectors],
+        generation: int,
+        results: dict,
+        retriever: str = "vector"
+    ):
+        if self.max_entries <= 0:
+            return
+        key = (self.normalize(question), retriever, n_results)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedder_version, vector, generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits, vector_hits, misses = self._hits.value, self._vector_hits.value, self._misses.value
+        lookups = hits + vector_hits + misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "vector_hits": vector_hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,102 @@
+import logging
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingChunker:
+    """Cuts a stream of text into overlapping fixed-size chunks
+
+    Text is fed incrementally (e.g. one page at a time) and chunks are emitted
+    as soon as they are complete, so chunks span page boundaries exactly as if
+    the pages had been joined first. Only the unemitted tail is buffered.
+
+    With `large_text_threshold` set, emission is deferred until that many
+    characters have been seen; longer documents then switch to
+    `large_chunk_size`/`large_overlap`, matching the non-streaming rule.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        overlap: int = 50,
+        large_text_threshold: Optional[int] = None,
+        large_chunk_size: int = 1000,
+        large_overlap: int = 100
+    ):
+        if overlap >= chunk_size or large_overlap >= large_chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.large_text_threshold = large_text_threshold
+        self.large_chunk_size = large_chunk_size
+        self.large_overlap = large_overlap
+        self.chars_seen = 0
+        self.chunks_emitted = 0
+        self._decided = large_text_threshold is None
+        self._buffer = ""
+        self._start = 0
+        # Characters in the buffer that are not yet part of any emitted chunk
+        self._fresh = 0
+
+    def _decide(self, large: bool):
+        if large:
+            self.chunk_size = self.large_chunk_size
+            self.overlap = self.large_overlap
+            logger.info(f"Using larger chunks for large text: {self.chunk_size}/{self.overlap}")
+        self._decided = True
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Add text and yield every chunk that is now complete"""
+        if text:
+            self.chars_seen += len(text)
+            self._buffer = self._buffer[self._start:] + text
+            self._start = 0
+            self._fresh += len(text)
+
+        if not self._decided:
+            if self.chars_seen <= self.large_text_threshold:
+                return
+            self._decide(large=True)
+        yield from self._drain()
+
+    def finish(self) -> Iterator[str]:
+        """Yield the remaining chunks, ending with a final partial chunk if it holds new text"""
+        if not self._decided:
+            self._decide(large=False)
+            yield from self._drain()
+        if self._fresh > 0:
+            yield self._emit(len(self._buffer))
+        self._buffer = ""
+        self._start = 0
+        self._fresh = 0
+
+    def _drain(self) -> Iterator[str]:
+        step = self.chunk_size - self.overlap
+        while len(self._buffer) - self._start >= self.chunk_size:
+            end = self._start + self.chunk_size
+            yield self._emit(end)
+            self._start += step
+            self._fresh = len(self._buffer) - end
+
+    def _emit(self, end: int) -> str:
+        self.chunks_emitted += 1
+        return self._buffer[self._start:end]
+
+    def chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """Chunk an iterable of text pieces end to end"""
+        for text in texts:
+            yield from self.feed(text)
+        yield from self.finish()
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class TextHasher:
+    """Incremental SHA-256 of whitespace- and case-normalized text
+
+    Feeding pages one at a time gives the same digest as `hash_text` on the
+    joined document, so callers never need the whole text in memory.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._empty = True
+
+    def update(self, text: str):
+        words = text.split()
+        if not words:
+            return
+        normalized = " ".join(words).lower()
+        if not self._empty:
+            normalized = " " + normalized
+        self._digest.update(normalized.encode("utf-8"))
+        self._empty = False
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 of whitespace- and case-normalized document text"""
+    hasher = TextHasher()
+    hasher.update(text)
+    return hasher.hexdigest()
+
+
+class ContentHashIndex:
+    """In-memory lookup of processed papers by content hash
+
+    Keys are SHA-256 digests of the uploaded bytes or of the normalized text;
+    values are the paper records returned to clients for duplicate uploads.
+    """
+
+    def __init__(self):
+        self._papers: Dict[str, dict] = {}
+        self._pending: Dict[str, threading.Event] = {}
+        # Bumped whenever a record is added, so callers can tell when to persist
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, *hashes: Optional[str]) -> Optional[dict]:
+        with self._lock:
+            for content_hash in hashes:
+                if content_hash and content_hash in self._papers:
+                    return self._papers[content_hash]
+        return None
+
+    def claim(self, content_hash: str) -> Optional[dict]:
+        """Return the paper already stored for this hash, or claim it for processing
+
+        If another worker is processing the same content, wait for it to finish
+        and return its paper. Returns None when the caller now owns the hash and
+        must call `add` or `release`.
+        """
+        while True:
+            with self._lock:
+                if content_hash in self._papers:
+                    return self._papers[content_hash]
+                event = self._pending.get(content_hash)
+                if event is None:
+                    self._pending[content_hash] = threading.Event()
+                    return None
+            event.wait()
+
+    def try_claim(self, content_hash: str) -> Tuple[Optional[dict], bool]:
+        """Like `claim`, but never waits: returns (None, False) while another worker holds the hash
+
+        Otherwise returns the stored paper, or (None, True) when the caller now
+        owns the hash. Callers holding several claims at once use this, as
+        waiting while holding claims could deadlock with another such caller.
+        """
+        with self._lock:
+            if content_hash in self._papers:
+                return self._papers[content_hash], False
+            if content_hash in self._pending:
+                return None, False
+            self._pending[content_hash] = threading.Event()
+            return None, True
+
+    def add(self, record: dict, *hashes: Optional[str]):
+        with self._lock:
+            for content_hash in hashes:
+                if content_hash:
+                    self._papers[content_hash] = record
+            self.version += 1
+        for content_hash in hashes:
+            self.release(content_hash)
+
+    def records(self) -> Dict[str, dict]:
+        """Copy of every stored hash and its paper record, for persisting"""
+        with self._lock:
+            return dict(self._papers)
+
+    def load(self, records: Dict[str, dict]):
+        with self._lock:
+            self._papers.update(records)
+
+    def release(self, content_hash: Optional[str]):
+        with self._lock:
+            event = self._pending.pop(content_hash, None)
+        if event is not None:
+            event.set()
@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from vector_store import Vectors
+
+logger = logging.getLogger(__name__)
+
+
+class Embedder(ABC):
+    """Turns chunk and question texts into vectors for the vector store
+
+    `embed` is used for chunks and may fit the embedder on the first texts it
+    sees; `embed_queries` never fits. `version` changes whenever the same text
+    would embed differently, so vectors from different versions are never mixed.
+    Embedders are pickled into index snapshots.
+    """
+
+    name = "embedder"
+    # Vectors are raw term frequencies that the sparse store weights by IDF
+    idf_weighting = False
+    refittable = False
+
+    @property
+    def fitted(self) -> bool:
+        return True
+
+    @property
+    def version(self) -> str:
+        return self.name
+
+    @property
+    @abstractmethod
+    def dimension(self) -> Optional[int]:
+        """Length of the vectors, or None until the first `embed` fits the embedder"""
+
+    @property
+    def needs_more_chunks(self) -> bool:
+        """Whether a refit on more chunks would fill in a degenerate fit"""
+        return False
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Vectors:
+        """Vectors of chunk texts, one row per text"""
+
+    def embed_queries(self, texts: List[str]) -> Vectors:
+        return self.embed(texts)
+
+    def refit(self, texts: List[str]) -> "Embedder":
+        raise NotImplementedError(f"The {self.name} embedder has nothing to refit")
+
+
+class TfidfEmbedder(Embedder):
+    """Sparse TF-IDF over a vocabulary fitted on the first chunks embedded
+
+    With `lsa_components`, a TruncatedSVD fitted on the same chunks projects
+    the TF-IDF rows onto that many latent dimensions (LSA), giving small dense
+    L2-normalized vectors. Fewer components are fitted if the fitting chunks
+    or the vocabulary cannot support them, and the rest are left zero, so the
+    dimension never depends on the first batch.
+    """
+
+    name = "tfidf"
+    refittable = True
+
+    def __init__(self, max_features: int = 1000, lsa_components: int = 0):
+        self.max_features = max_features
+        self.lsa_components = lsa_components
+        self.vectorizer = TfidfVectorizer(max_features=max_features, stop_words='english')
+        self.svd: Optional[TruncatedSVD] = None
+        self.fit_rows = 0
+        self._fit_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def fitted(self) -> bool:
+        return self._fit_id is not None
+
+    @property
+    def version(self) -> str:
+        if self.lsa_components:
+            return f"tfidf-lsa{self.lsa_components}-{self._fit_id}"
+        return f"tfidf-{self._fit_id}"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        if not self.fitted:
+            return None
+        if self.lsa_components:
+            return self.lsa_components
+        return len(self.vectorizer.vocabulary_)
+
+    @property
+    def needs_more_chunks(self) -> bool:
+        return bool(self.lsa_components) and self.fitted and self.fit_rows <= self.lsa_components
+
+    def embed(self, texts: List[str]) -> Vectors:
+        if not self.fitted:
+            with self._lock:
+                if not self.fitted:
+                    logger.info("Fitting vectorizer for the first time")
+                    embeddings = self._fit(texts)
+                    self._fit_id = uuid.uuid4().hex[:12]
+                    return embeddings
+        return self._transform(texts)
+
+    def embed_queries(self, texts: List[str]) -> Vectors:
+        return self._transform(texts)
+
+    def refit(self, texts: List[str]) -> "TfidfEmbedder":
+        refitted = TfidfEmbedder(self.max_features, self.lsa_components)
+        refitted._fit(texts)
+        refitted._fit_id = uuid.uuid4().hex[:12]
+        return refitted
+
+    def _fit(self, texts: List[str]) -> Vectors:
+        embeddings = self.vectorizer.fit_transform(texts)
+        if not self.lsa_components:
+            return embeddings
+        self.fit_rows = len(texts)
+        # TruncatedSVD needs fewer components than both rows and columns
+        components = min(self.lsa_components, embeddings.shape[0] - 1, embeddings.shape[1] - 1)
+        if components < self.lsa_components:
+            logger.warning(f"Fitting LSA with {max(components, 0)} of {self.lsa_components} components on {len(texts)} chunks")
+        if components < 1:
+            return self._project(np.zeros((embeddings.shape[0], 0)))
+        self.svd = TruncatedSVD(n_components=components, random_state=0)
+        return self._project(self.svd.fit_transform(embeddings))
+
+    def _transform(self, texts: List[str]) -> Vectors:
+        embeddings = self.vectorizer.transform(texts)
+        if not self.lsa_components:
+            return embeddings
+        if self.svd is None:
+            return self._project(np.zeros((embeddings.shape[0], 0)))
+        return self._project(self.svd.transform(embeddings))
+
+    def _project(self, reduced: np.ndarray) -> np.ndarray:
+        """L2-normalized rows, padded with zeros to `lsa_components` columns"""
+        projected = np.zeros((reduced.shape[0], self.lsa_components), dtype=np.float32)
+        if reduced.shape[1]:
+            projected[:, :reduced.shape[1]] = normalize(reduced)
+        return projected
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class HashingEmbedder(Embedder):
+    """Term frequencies hashed into a fixed number of columns, nothing to fit"""
+
+    name = "hashing"
+    idf_weighting = True
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            norm='l2'
+        )
+
+    @property
+    def version(self) -> str:
+        return f"hashing-{self.vectorizer.n_features}"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.vectorizer.n_features
+
+    def embed(self, texts: List[str]) -> Vectors:
+        return self.vectorizer.transform(texts)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Dense, L2-normalized sentence-transformer embeddings from a local model directory
+
+    The model is loaded on first use and never downloaded. Texts are encoded
+    `batch_size` at a time on the CPU, and torch is limited to `threads`
+    intra-op threads so that embedding shares the machine with extraction
+    workers and request handling. Only the model path is pickled.
+    """
+
+    name = "sentence-transformer"
+
+    def __init__(self, model_path: str, batch_size: int = 32, threads: int = 1, device: str = "cpu"):
+        if not os.path.isdir(model_path):
+            raise ValueError(f"Sentence-transformer model directory not found: {model_path}")
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.threads = threads
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return f"sentence-transformer-{os.path.basename(os.path.normpath(self.model_path))}"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    torch.set_num_threads(self.threads)
+                    self._model = SentenceTransformer(self.model_path, device=self.device)
+                    logger.info(f"Loaded sentence-transformer from {self.model_path} with {self.threads} threads")
+        return self._model
+
+    def embed(self, texts: List[str]) -> Vectors:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_model"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
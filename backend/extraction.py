@@ -0,0 +1,125 @@
+import logging
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# (text, error) for a single page; error is set when extraction raised
+PageText = Tuple[Optional[str], Optional[str]]
+
+
+@contextmanager
+def open_pdf(pdf_path: str) -> Iterator[PyPDF2.PdfReader]:
+    """Open a PDF through a read-only memory map
+    
+    PdfReader copies the whole file into a BytesIO when given a path; a memory
+    map lets the OS page the file in on demand instead.
+    """
+    with open(pdf_path, "rb") as pdf_file:
+        if os.fstat(pdf_file.fileno()).st_size == 0:
+            raise PyPDF2.errors.EmptyFileError("Cannot read an empty file")
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PyPDF2.PdfReader(mapped)
+
+
+def iter_page_range(pdf_path: str, start: int, end: int) -> Iterator[PageText]:
+    """Lazily extract text for pages [start, end) of a PDF"""
+    with open_pdf(pdf_path) as reader:
+        for i in range(start, end):
+            try:
+                yield reader.pages[i].extract_text(), None
+            except Exception as e:
+                yield None, str(e)
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[PageText]:
+    """Extract text for pages [start, end) of a PDF; runs inside a worker process"""
+    return list(iter_page_range(pdf_path, start, end))
+
+
+class PageExtractor:
+    """Splits page text extraction across a process pool by page ranges
+
+    Worker processes run at OS nice value `niceness`.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 16, niceness: int = 0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = max(1, pages_per_task)
+        self.niceness = niceness
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=os.nice if self.niceness > 0 else None,
+                initargs=(self.niceness,)
+            )
+        return self._executor
+
+    def page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        # Never make a range smaller than pages_per_task, but spread large
+        # documents over every worker
+        size = max(self.pages_per_task, -(-page_count // (self.max_workers * 4)))
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def iter_pages(
+        self,
+        pdf_path: str,
+        page_count: int,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> Iterator[PageText]:
+        """Yield (text, error) per page, in page order, as extraction completes
+        
+        At most two ranges per worker are in flight, so a slow consumer keeps
+        the number of extracted-but-unconsumed pages bounded.
+        """
+        ranges = self.page_ranges(page_count)
+        done_pages = 0
+
+        # Small documents are not worth the inter-process round trip
+        if self.max_workers == 1 or len(ranges) == 1:
+            for page in iter_page_range(pdf_path, 0, page_count):
+                done_pages += 1
+                if progress:
+                    progress(done_pages)
+                yield page
+            return
+
+        pool = self._pool()
+        remaining = deque(ranges)
+        in_flight = deque()
+        try:
+            while remaining or in_flight:
+                while remaining and len(in_flight) < self.max_workers * 2:
+                    start, end = remaining.popleft()
+                    in_flight.append(pool.submit(extract_page_range, pdf_path, start, end))
+                pages = in_flight.popleft().result()
+                done_pages += len(pages)
+                if progress:
+                    progress(done_pages)
+                yield from pages
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def extract(
+        self,
+        pdf_path: str,
+        page_count: int,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> List[PageText]:
+        """Return (text, error) per page, in page order"""
+        return list(self.iter_pages(pdf_path, page_count, progress))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,109 @@
+from typing import Dict, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from vector_store import Vectors, empty_result
+
+
+def parse_fusion_weights(value: str) -> Dict[str, float]:
+    """Retriever weights from comma-separated name=weight pairs, such as "vector=1,bm25=0.5" """
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = (part.strip() for part in item.partition("="))
+        try:
+            number = float(weight)
+        except ValueError:
+            number = None
+        if not name or number is None or not 0 <= number < float("inf"):
+            raise ValueError(f"Fusion weights must be retriever=weight pairs with non-negative weights, got {item!r}")
+        weights[name] = number
+    return weights
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, dict],
+    n_results: int = 5,
+    k: int = 60,
+    weights: Optional[Dict[str, float]] = None
+) -> dict:
+    """Merge the results of several retrievers into one ranking per query
+
+    `rankings` maps a retriever name to its results in the vector stores'
+    shape, all for the same queries. A chunk scores the sum of
+    weight / (k + rank) over the retrievers that returned it, ranks counting
+    from 1, so chunks several retrievers agree on rise above a single high
+    placement without comparing the retrievers' incompatible scores.
+    Chunks are deduplicated by id.
+
+    The fused results keep the vector stores' shape, plus per chunk its fused
+    `scores` and its `sources`: the rank each retriever gave it. Distances
+    are 1 - the fused score over the highest one possible, that of a chunk
+    every retriever ranked first, so they share one scale whichever
+    retrievers found the chunk.
+    """
+    n_queries = len(next(iter(rankings.values()))["ids"]) if rankings else 0
+    fused_results = {**empty_result(n_queries), "scores": [[] for _ in range(n_queries)], "sources": [[] for _ in range(n_queries)]}
+    retriever_weights = {name: 1.0 if weights is None else weights.get(name, 1.0) for name in rankings}
+    ceiling = sum(retriever_weights.values()) / (k + 1)
+    for q in range(n_queries):
+        fused: Dict[str, dict] = {}
+        for name, results in rankings.items():
+            weight = retriever_weights[name]
+            for rank, (chunk_id, document, metadata) in enumerate(zip(
+                results["ids"][q],
+                results["documents"][q],
+                results["metadatas"][q]
+            ), start=1):
+                hit = fused.get(chunk_id)
+                if hit is None:
+                    hit = fused[chunk_id] = {"document": document, "metadata": metadata, "score": 0.0, "sources": {}}
+                hit["score"] += weight / (k + rank)
+                hit["sources"][name] = rank
+        best = sorted(fused.items(), key=lambda item: -item[1]["score"])[:n_results]
+        fused_results["ids"][q] = [chunk_id for chunk_id, _ in best]
+        fused_results["distances"][q] = [1.0 - hit["score"] / ceiling if ceiling > 0 else 1.0 for _, hit in best]
+        for key, field in (("documents", "document"), ("metadatas", "metadata"), ("scores", "score"), ("sources", "sources")):
+            fused_results[key][q] = [hit[field] for _, hit in best]
+    return fused_results
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: Vectors, k: int = 5, diversity: float = 0.5) -> np.ndarray:
+    """Indices of `k` candidates picked greedily by maximal marginal relevance
+
+    Each pick maximizes (1 - diversity) * relevance - diversity * the highest
+    cosine similarity to a candidate already picked, so near-duplicates of
+    earlier picks (such as overlapping chunks) sink. Pairwise similarities
+    come from one product of the candidate matrix with itself, and every
+    pick updates all candidates' redundancy in one vector operation; the
+    only Python loop is over the k picks. `diversity=0` keeps the order of
+    `relevance`.
+    """
+    k = min(k, len(relevance))
+    if sp.issparse(vectors) and vectors.shape[1] > 4 * vectors.nnz:
+        # Hashed terms spread over far more columns than there are non-zeros
+        similarity = (vectors @ vectors.T).toarray().astype(np.float32)
+    else:
+        # At this size a dense product beats a sparse one
+        vectors = np.asarray(vectors.toarray() if sp.issparse(vectors) else vectors, dtype=np.float32)
+        similarity = vectors @ vectors.T
+    norms = np.sqrt(np.maximum(np.diagonal(similarity), 1e-12))
+    similarity /= norms[:, None]
+    similarity /= norms[None, :]
+
+    relevance = (1.0 - diversity) * np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    picked = np.empty(k, dtype=np.int64)
+    available = np.ones(len(relevance), dtype=bool)
+    for pick in range(k):
+        scores = np.where(available, relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked[pick] = best
+        available[best] = False
+        # Redundancy is the highest similarity to a picked candidate, which
+        # may be negative, so the first pick sets it rather than raising it
+        if pick == 0:
+            redundancy[:] = similarity[best]
+        else:
+            np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
@@ -0,0 +1,295 @@
+"""Bulk ingestion of a directory of PDFs
+
+Walks a directory, extracts and chunks files on a pool of worker processes and
+stores them through the same embedder, vector store and Neo4j logic as /upload.
+File outcomes are appended to a checkpoint file, so an interrupted run picks
+up where it stopped and files that failed are tried again. The index is saved
+to DATA_DIR as the run goes and when it ends, so a server started on the same
+DATA_DIR afterwards serves it; do not run both against the same DATA_DIR at
+once.
+
+Run from the backend directory:
+    python -m ingest /path/to/papers --workers 8
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, Optional, Set
+
+import main
+from extraction import PageExtractor
+from jobs import JobError
+
+logger = logging.getLogger("ingest")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as pdf_file:
+        for block in iter(lambda: pdf_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_pdfs(directory: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name)
+
+
+class Checkpoint:
+    """Append-only JSON-lines record of file outcomes; failed files are retried on the next run"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Set[str] = set()
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                for line in checkpoint_file:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        if entry["status"] != "failed":
+                            self.completed.add(entry["content_hash"])
+        self._file = open(path, "a")
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self.completed
+
+    def record(self, content_hash: str, path: str, status: str, paper_id: Optional[str] = None):
+        self._file.write(json.dumps({
+            "content_hash": content_hash,
+            "path": path,
+            "status": status,
+            "paper_id": paper_id
+        }) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if status != "failed":
+            self.completed.add(content_hash)
+
+    def close(self):
+        self._file.close()
+
+
+# Hashes completed before this run started, set in each worker process
+completed_hashes: Set[str] = set()
+
+
+def init_worker(completed: Set[str]):
+    global completed_hashes
+    completed_hashes = completed
+    # Worker processes extract in-process rather than starting nested pools
+    main.page_extractor = PageExtractor(max_workers=1)
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def prepare_file(path: str) -> dict:
+    """Hash, extract, chunk and describe one PDF; runs inside a worker process"""
+    filename = os.path.basename(path)
+    content_hash = None
+    try:
+        content_hash = hash_file(path)
+        if content_hash in completed_hashes:
+            return {"path": path, "content_hash": content_hash, "skipped": True}
+        document = main.PdfDocument(path)
+        chunks = list(document.chunks(main.MAX_CHUNKS_PER_DOCUMENT))
+        return {
+            "path": path,
+            "filename": filename,
+            "content_hash": content_hash,
+            "text_hash": document.text_hash,
+            "metadata": main.extract_metadata_from_text(document.head, filename),
+            "chunks": chunks,
+            "truncated": document.truncated,
+            "skipped": False,
+            "error": None
+        }
+    except JobError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"Error processing file: {str(e)}"
+    return {"path": path, "filename": filename, "content_hash": content_hash, "skipped": False, "error": error}
+
+
+def store_prepared(prepared: dict) -> dict:
+    """Embed and store a prepared file in the parent process, returning its paper record"""
+    existing = main.content_hashes.lookup(prepared["content_hash"], prepared["text_hash"])
+    if existing:
+        return main.duplicate_result(existing)
+
+    paper_id = str(uuid.uuid4())
+    chunks = prepared["chunks"]
+    try:
+        for start in range(0, len(chunks), main.EMBED_BATCH_SIZE):
+            batch = chunks[start:start + main.EMBED_BATCH_SIZE]
+            indices = range(start, start + len(batch))
+            main.index_chunks(
+                [f"{paper_id}_{i}" for i in indices],
+                batch,
+                [{"paper_id": paper_id, "chunk_index": i} for i in indices],
+                refit_underfitted=False
+            )
+    except Exception:
+        main.delete_paper_chunks(paper_id)
+        raise
+
+    metadata = prepared["metadata"]
+    main.store_papers_in_graph([{
+        "paper_id": paper_id,
+        "title": metadata["title"],
+        "filename": prepared["filename"],
+        "authors": metadata["authors"],
+        "content_hash": prepared["content_hash"],
+        "text_hash": prepared["text_hash"]
+    }])
+
+    record = {
+        "paper_id": paper_id,
+        "title": metadata["title"],
+        "authors": metadata["authors"],
+        "chunks_processed": len(chunks),
+        "truncated": prepared["truncated"],
+        "chunk_budget": main.MAX_CHUNKS_PER_DOCUMENT
+    }
+    main.content_hashes.add(record, prepared["content_hash"], prepared["text_hash"])
+    return record
+
+
+class Progress:
+    """Live files/sec and chunks/sec on a single status line"""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.files = 0
+        self.chunks = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+    def update(self, chunks: int = 0, failed: bool = False, duplicate: bool = False, skipped: bool = False):
+        self.files += 1
+        self.chunks += chunks
+        self.failed += failed
+        self.duplicates += duplicate
+        self.skipped += skipped
+        self.render()
+
+    def render(self, end: str = ""):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        self.stream.write(
+            f"\r{self.files}/{self.total} files  {self.files / elapsed:.2f} files/s  "
+            f"{self.chunks} chunks  {self.chunks / elapsed:.1f} chunks/s  "
+            f"{self.skipped} skipped  {self.duplicates} duplicate  {self.failed} failed" + end
+        )
+        self.stream.flush()
+
+
+def handle_prepared(prepared: dict, checkpoint: Checkpoint, progress: Progress):
+    if prepared["skipped"]:
+        progress.update(skipped=True)
+        return
+    if prepared["error"]:
+        logger.warning(f"\n{prepared['path']}: {prepared['error']}")
+        if prepared["content_hash"]:
+            checkpoint.record(prepared["content_hash"], prepared["path"], "failed")
+        progress.update(failed=True)
+        return
+    try:
+        record = store_prepared(prepared)
+    except Exception as e:
+        # Storage failures are not checkpointed so the file is retried
+        logger.error(f"\n{prepared['path']}: storage failed: {e}")
+        progress.update(failed=True)
+        return
+    duplicate = record.get("duplicate", False)
+    checkpoint.record(
+        prepared["content_hash"],
+        prepared["path"],
+        "duplicate" if duplicate else "processed",
+        record["paper_id"]
+    )
+    progress.update(chunks=0 if duplicate else record["chunks_processed"], duplicate=duplicate)
+
+
+def run(directory: str, workers: int, checkpoint_path: str) -> int:
+    if main.driver is None:
+        logger.error("Neo4j database not available")
+        return 1
+
+    checkpoint = Checkpoint(checkpoint_path)
+    paths = list(find_pdfs(directory))
+    print(f"{len(paths)} files found, {len(checkpoint.completed)} completed per {checkpoint_path}")
+
+    progress = Progress(len(paths))
+    remaining = iter(paths)
+    in_flight = set()
+    last_save = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(set(checkpoint.completed),)) as pool:
+            def submit_next():
+                path = next(remaining, None)
+                if path is not None:
+                    in_flight.add(pool.submit(prepare_file, path))
+
+            # Keep a bounded number of prepared files waiting for storage
+            for _ in range(workers * 2):
+                submit_next()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    submit_next()
+                    handle_prepared(future.result(), checkpoint, progress)
+                if main.PERSIST_INTERVAL_SECONDS > 0 and time.monotonic() - last_save > main.PERSIST_INTERVAL_SECONDS:
+                    main.save_index()
+                    last_save = time.monotonic()
+        # Background refits would outlive the run, so an underfitted LSA is refitted here
+        if main.lsa_underfitted():
+            print("\nRefitting LSA on the ingested chunks")
+            main.refit_vectorizer(main.job_manager.create("refit"), main.StageTimer("refit"))
+    except KeyboardInterrupt:
+        for future in in_flight:
+            future.cancel()
+        progress.render(end="\n")
+        print("Interrupted; rerun with the same checkpoint to resume")
+        return 130
+    finally:
+        checkpoint.close()
+        main.page_extractor.shutdown()
+        main.save_index()
+
+    progress.render(end="\n")
+    return 1 if progress.failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ingest", description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory to walk for .pdf files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of extraction worker processes")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default: <directory>/.ingest-checkpoint.jsonl)")
+    parser.add_argument("--verbose", action="store_true", help="show per-file pipeline logs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    checkpoint_path = args.checkpoint or os.path.join(args.directory, ".ingest-checkpoint.jsonl")
+    sys.exit(run(args.directory, args.workers, checkpoint_path))
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobError(Exception):
+    """Raised by job functions to fail a job with a user-facing message"""
+
+
+class Job:
+    """State of a single background job, updated by the worker running it"""
+
+    def __init__(self, kind: str, filename: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.filename = filename
+        self.status = JOB_QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: Optional[str] = None, progress: Optional[float] = None):
+        """Report the current pipeline stage and overall progress (0..1)"""
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, progress))
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": round(self.progress, 4),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def lower_thread_priority(niceness: int):
+    """Raise the calling thread's nice value (Linux schedules threads individually)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not lower worker thread priority: {e}")
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and keeps their status for polling
+
+    With `niceness`, worker threads run at that OS nice value, so on a busy
+    machine the scheduler favours request handling over background jobs.
+    """
+
+    def __init__(self, max_workers: int = 2, max_retained: int = 1000, niceness: int = 0):
+        self.max_workers = max_workers
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ingest",
+            initializer=lower_thread_priority if niceness > 0 else None,
+            initargs=(niceness,)
+        )
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, kind: str, filename: Optional[str] = None) -> Job:
+        job = Job(kind, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        return job
+
+    def submit(self, job: Job, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Queue `fn(job, *args, **kwargs)`; its return value becomes the job result"""
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self) -> dict:
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_COMPLETED: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logger.info(f"Job {job.id} ({job.kind}) started for {job.filename}")
+        try:
+            result = fn(job, *args, **kwargs)
+            job.result = result
+            job.update(stage="done", progress=1.0)
+            job.status = JOB_COMPLETED
+            logger.info(f"Job {job.id} completed in {time.time() - job.started_at:.2f}s")
+        except JobError as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            logger.warning(f"Job {job.id} failed at stage '{job.stage}': {e}")
+        except Exception as e:
+            job.error = f"Error processing file: {str(e)}"
+            job.status = JOB_FAILED
+            logger.error(f"Job {job.id} crashed at stage '{job.stage}': {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            job.finished_at = time.time()
+
+    def _evict(self):
+        # Drop the oldest finished jobs once the retention limit is reached
+        if len(self._jobs) <= self.max_retained:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
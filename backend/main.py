@@ -1,21 +1,37 @@
 import os
 import re
-from typing import List, Optional, Generator
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Generator, Tuple
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import PyPDF2
-import io
+from pydantic import BaseModel, Field
 import chromadb
 from neo4j import GraphDatabase, Session
 import uuid
 from dotenv import load_dotenv
 import logging
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import traceback
+import hashlib
+import pickle
+import random
+import time
+import tempfile
+import threading
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from jobs import Job, JobError, JobManager
+from extraction import PageExtractor, open_pdf
+from dedup import ContentHashIndex, TextHasher
+from chunking import StreamingChunker, batched
+from admission import AdmissionController, AdmissionRejected, Ticket
+from metrics import StageTimer, registry
+from vector_store import ChromaVectorStore, DenseVectorStore, SparseVectorStore, Vectors, empty_result, merge_rows, stack_rows
+from embeddings import Embedder, HashingEmbedder, SentenceTransformerEmbedder, TfidfEmbedder
+from cache import EmbeddingCache, QueryCache
+from bm25 import BM25Index, tokenize
+from fusion import maximal_marginal_relevance, parse_fusion_weights, reciprocal_rank_fusion
+from persistence import SnapshotDirectory, read_json, read_pickle, write_atomic, write_json
 
 # Load environment variables
 load_dotenv()
@@ -39,14 +55,207 @@ app.add_middleware(
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+MAX_QUEUED_UPLOADS = int(os.getenv("MAX_QUEUED_UPLOADS", "32"))
+INGEST_MEMORY_BUDGET_MB = int(os.getenv("INGEST_MEMORY_BUDGET_MB", "1024"))
+INGEST_BASE_MEMORY_MB = int(os.getenv("INGEST_BASE_MEMORY_MB", "64"))
+INGEST_MEMORY_PER_FILE_BYTE = float(os.getenv("INGEST_MEMORY_PER_FILE_BYTE", "3"))
+MAX_CHUNKS_PER_DOCUMENT = int(os.getenv("MAX_CHUNKS_PER_DOCUMENT", "20000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "5000"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Request-path thread pools: embedding and search, and Neo4j and file I/O
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+INGEST_NICENESS = int(os.getenv("INGEST_NICENESS", "10"))
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "graphrag-spool"))
+# "sparse" (CSR in process), "dense" (float32 or int8 matrix in process) or "chroma"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+DENSE_PRECISION = os.getenv("DENSE_PRECISION", "float32")
+DENSE_RESCORE = int(os.getenv("DENSE_RESCORE", "4"))
+# "tfidf", "hashing" or "sentence-transformer" (VECTORIZER is the older name)
+EMBEDDER = os.getenv("EMBEDDER", os.getenv("VECTORIZER", "tfidf"))
+HASHING_FEATURES = int(os.getenv("HASHING_FEATURES", str(2 ** 18)))
+# LSA dimensions of TF-IDF rows; 0 keeps the sparse rows
+LSA_COMPONENTS = int(os.getenv("LSA_COMPONENTS", "0"))
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", "")
+EMBEDDING_MODEL_BATCH_SIZE = int(os.getenv("EMBEDDING_MODEL_BATCH_SIZE", "32"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", str(max(1, (os.cpu_count() or 1) // 2))))
+REFIT_SAMPLE_SIZE = int(os.getenv("REFIT_SAMPLE_SIZE", "50000"))
+# 0 disables scheduled refits; POST /admin/refit always works
+REFIT_INTERVAL_MINUTES = float(os.getenv("REFIT_INTERVAL_MINUTES", "0"))
+REFIT_BYTES_PER_CHUNK = 4096
+# Snapshots of the index; an empty DATA_DIR keeps everything in memory
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+PERSIST_INTERVAL_SECONDS = float(os.getenv("PERSIST_INTERVAL_SECONDS", "30"))
+EMBEDDING_CACHE_MB = int(os.getenv("EMBEDDING_CACHE_MB", "64"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+BM25_INDEX = os.getenv("BM25_INDEX", "true").lower() == "true"
+# Retriever of /ask requests that name none: "vector", "bm25" or "hybrid"
+DEFAULT_RETRIEVER = os.getenv("DEFAULT_RETRIEVER", "vector")
+FUSION_FETCH_K = int(os.getenv("FUSION_FETCH_K", "20"))
+# Per-question budget of each hybrid retriever, capped for the whole of a batch
+RETRIEVER_TIMEOUT_MS = float(os.getenv("RETRIEVER_TIMEOUT_MS", "500"))
+BATCH_RETRIEVER_TIMEOUT_MS = float(os.getenv("BATCH_RETRIEVER_TIMEOUT_MS", "5000"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+FUSION_WEIGHTS = parse_fusion_weights(os.getenv("FUSION_WEIGHTS", "vector=1,bm25=1,graph=0.5"))
+GRAPH_RETRIEVER_PAPERS = int(os.getenv("GRAPH_RETRIEVER_PAPERS", "10"))
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "1000"))
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))
+
+if EMBEDDER not in ("tfidf", "hashing", "sentence-transformer"):
+    raise ValueError(f"Unknown EMBEDDER: {EMBEDDER}")
+if VECTOR_BACKEND not in ("chroma", "sparse", "dense"):
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+if EMBEDDER == "hashing" and VECTOR_BACKEND != "sparse":
+    raise ValueError("EMBEDDER=hashing needs VECTOR_BACKEND=sparse, which keeps document frequencies")
+if LSA_COMPONENTS and EMBEDDER != "tfidf":
+    raise ValueError("LSA_COMPONENTS only applies to EMBEDDER=tfidf")
+if LSA_COMPONENTS and VECTOR_BACKEND == "sparse":
+    raise ValueError("LSA_COMPONENTS gives dense vectors; use VECTOR_BACKEND=dense or chroma")
+if DEFAULT_RETRIEVER not in ("vector", "bm25", "hybrid"):
+    raise ValueError(f"Unknown DEFAULT_RETRIEVER: {DEFAULT_RETRIEVER}")
+if DEFAULT_RETRIEVER == "bm25" and not BM25_INDEX:
+    raise ValueError("DEFAULT_RETRIEVER=bm25 needs BM25_INDEX=true")
+if BATCH_RETRIEVER_TIMEOUT_MS < RETRIEVER_TIMEOUT_MS:
+    raise ValueError("BATCH_RETRIEVER_TIMEOUT_MS must be at least RETRIEVER_TIMEOUT_MS")
+if not set(FUSION_WEIGHTS) <= {"vector", "bm25", "graph"}:
+    raise ValueError(f"FUSION_WEIGHTS can only weight vector, bm25 and graph, got {', '.join(FUSION_WEIGHTS)}")
+if EMBEDDER == "sentence-transformer" and not EMBEDDING_MODEL_PATH:
+    raise ValueError("EMBEDDER=sentence-transformer needs EMBEDDING_MODEL_PATH, a local model directory")
+
+def new_embedder() -> Embedder:
+    if EMBEDDER == "hashing":
+        return HashingEmbedder(n_features=HASHING_FEATURES)
+    if EMBEDDER == "sentence-transformer":
+        return SentenceTransformerEmbedder(
+            EMBEDDING_MODEL_PATH,
+            batch_size=EMBEDDING_MODEL_BATCH_SIZE,
+            threads=EMBED_THREADS
+        )
+    return TfidfEmbedder(max_features=1000, lsa_components=LSA_COMPONENTS)
+
+def new_vector_store():
+    if VECTOR_BACKEND == "chroma":
+        # Refits build a shadow collection next to the active one
+        name = "research_papers" if vector_store is None else f"research_papers_{uuid.uuid4().hex[:8]}"
+        return ChromaVectorStore(chroma_client, name, batch_size=CHROMA_BATCH_SIZE)
+    if VECTOR_BACKEND == "dense":
+        return DenseVectorStore(precision=DENSE_PRECISION, rescore=DENSE_RESCORE)
+    return SparseVectorStore(idf_weighting=embedder.idf_weighting)
 
 # Initialize models and clients
-vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-chroma_client = chromadb.Client()
-collection = chroma_client.create_collection(name="research_papers")
+if DATA_DIR:
+    chroma_client = chromadb.PersistentClient(path=os.path.join(DATA_DIR, "chroma"))
+    snapshots = SnapshotDirectory(os.path.join(DATA_DIR, "index"))
+    embedding_cache_path = os.path.join(DATA_DIR, "embedding_cache.npz")
+else:
+    chroma_client = chromadb.Client()
+    snapshots = None
+    embedding_cache_path = None
+embedder = new_embedder()
+vector_store = None
+keyword_index: Optional[BM25Index] = None
+
+# Held by writers across embedding and storing a batch, so a refit cannot swap
+# the embedder and store in between; /ask only takes the short swap lock
+index_lock = threading.Lock()
+index_swap_lock = threading.Lock()
+refit_job: Optional[Job] = None
+refit_lock = threading.Lock()
+# Version of the underfitted embedder a refit was last queued for
+underfitted_refit_version: Optional[str] = None
+background_stop = threading.Event()
+# Bumped by every change to the indexed chunks; snapshots record what they saved
+corpus_generation = 0
+saved_versions = (0, 0)
+saved_cache_version = 0
+persist_lock = threading.Lock()
+
+# Background ingestion workers
+os.makedirs(SPOOL_DIR, exist_ok=True)
+job_manager = JobManager(max_workers=UPLOAD_WORKERS, niceness=INGEST_NICENESS)
+admission = AdmissionController(
+    max_concurrent=UPLOAD_WORKERS,
+    max_queued=MAX_QUEUED_UPLOADS,
+    memory_budget_bytes=INGEST_MEMORY_BUDGET_MB * 1024 * 1024,
+    registry=registry
+)
+content_hashes = ContentHashIndex()
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_MB * 1024 * 1024, registry)
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, registry)
+if embedding_cache_path and os.path.exists(embedding_cache_path):
+    try:
+        embedding_cache.load(embedding_cache_path)
+        saved_cache_version = embedding_cache.version
+        logger.info(f"Loaded {embedding_cache.stats()['entries']} cached chunk embeddings")
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable embedding cache {embedding_cache_path}: {e}")
+page_extractor = PageExtractor(
+    max_workers=PDF_EXTRACT_WORKERS,
+    pages_per_task=PDF_PAGES_PER_TASK,
+    niceness=INGEST_NICENESS
+)
+
+# Request-path executors, sized separately from ingestion and from each other
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+async def run_cpu(fn: Callable, *args, **kwargs):
+    """Run CPU-bound request work (embedding, scoring) off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+async def run_io(fn: Callable, *args, **kwargs):
+    """Run a blocking database or file call off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+def load_index() -> bool:
+    """Restore the latest snapshot from DATA_DIR, if there is one"""
+    global embedder, vector_store, keyword_index
+    path = snapshots.latest() if snapshots else None
+    if path is None:
+        return False
+    started = time.perf_counter()
+    state = read_json(os.path.join(path, "state.json"))
+    # Embedders that learn nothing from the corpus only need the same settings;
+    # a fitted vocabulary comes from the snapshot
+    settings = (state["embedder"], state["backend"], state.get("lsa_components", 0))
+    if settings != (EMBEDDER, VECTOR_BACKEND, LSA_COMPONENTS) or (
+        embedder.fitted and embedder.version != state["embedder_version"]
+    ):
+        raise ValueError(
+            f"{DATA_DIR} holds a {state['embedder_version']} embedder, VECTOR_BACKEND={state['backend']} index; "
+            f"use matching settings or another DATA_DIR"
+        )
+    if not embedder.fitted:
+        embedder = read_pickle(os.path.join(path, "embedder.pkl"))
+    if VECTOR_BACKEND == "chroma":
+        vector_store = ChromaVectorStore.load(chroma_client, snapshots.root, path, state["store"], batch_size=CHROMA_BATCH_SIZE)
+    elif VECTOR_BACKEND == "dense":
+        vector_store = DenseVectorStore.load(snapshots.root, path, state["store"])
+    else:
+        vector_store = SparseVectorStore.load(snapshots.root, path, state["store"])
+    if BM25_INDEX and state.get("keyword_index"):
+        keyword_index = BM25Index.load(snapshots.root, path, state["keyword_index"])
+    elif BM25_INDEX:
+        # Snapshots from before the keyword index, or saved with it disabled
+        keyword_index = BM25Index()
+        ids, documents, metadatas = vector_store.items()
+        for start in range(0, len(ids), EMBED_BATCH_SIZE):
+            end = start + EMBED_BATCH_SIZE
+            keyword_index.add(ids[start:end], documents[start:end], metadatas[start:end])
+        logger.info(f"Built the keyword index for {keyword_index.count()} chunks")
+    content_hashes.load(read_json(os.path.join(path, "manifest.json")))
+    logger.info(f"Loaded {vector_store.count()} chunks from {path} in {time.perf_counter() - started:.2f}s")
+    return True
 
-# Track if vectorizer has been fitted
-vectorizer_fitted = False
+if not load_index():
+    vector_store = new_vector_store()
+    keyword_index = BM25Index() if BM25_INDEX else None
 
 # Neo4j driver
 try:
@@ -56,13 +265,33 @@ except Exception as e:
     logger.error(f"Failed to initialize Neo4j driver: {e}")
     driver = None
 
-class QuestionRequest(BaseModel):
+class RetrievalSettings(BaseModel):
+    # "bm25" ranks chunks by keyword match instead of embedding similarity,
+    # "hybrid" fuses both with the graph; None uses DEFAULT_RETRIEVER
+    retriever: Optional[Literal["vector", "bm25", "hybrid"]] = None
+    # Chunks returned per question
+    top_k: int = Field(5, ge=1, le=100)
+    # Candidates retrieved before diversity re-ranking picks top_k of them;
+    # None fetches MMR_FETCH_K when diversity is on, otherwise top_k
+    fetch_k: Optional[int] = Field(None, ge=1, le=1000)
+    # Maximal marginal relevance trade-off: 0 ranks by relevance alone,
+    # higher values push chunks similar to ones already picked down
+    diversity: float = Field(0.0, ge=0.0, le=1.0)
+
+class QuestionRequest(RetrievalSettings):
     question: str
 
+class BatchQuestionRequest(RetrievalSettings):
+    questions: List[str]
+
 class SearchResult(BaseModel):
     text: str
+    # Cosine for vector results; BM25 and fused scores over the highest they could reach
     similarity: float
     paper_id: str
+    # Hybrid retrieval only: the fused score, and the rank each retriever gave the chunk
+    score: Optional[float] = None
+    sources: Optional[Dict[str, int]] = None
 
 class GraphResult(BaseModel):
     type: str
@@ -72,6 +301,7 @@ class AnswerResponse(BaseModel):
     answer: str
     vector_context: List[SearchResult]
     graph_context: List[GraphResult]
+    timings: Optional[Dict[str, float]] = None
 
 def get_neo4j_session() -> Generator[Session, None, None]:
     if driver is None:
@@ -120,249 +350,994 @@ def extract_metadata_from_text(text: str, filename: str) -> dict:
         "source_file": filename
     }
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """Split text into overlapping chunks with memory protection"""
-    chunks = []
-    start = 0
-    text_length = len(text)
-    
-    # For very large texts, use larger chunks to reduce memory usage
-    if text_length > 20000:
-        chunk_size = 1000
-        overlap = 100
-        logger.info(f"Using larger chunks for large text: {chunk_size}/{overlap}")
-    
-    max_chunks = 1000  # Safety limit to prevent memory exhaustion
-    
-    while start < text_length and len(chunks) < max_chunks:
-        end = start + chunk_size
-        if end > text_length:
-            end = text_length
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-        
-        # Safety check to prevent infinite loops
-        if start < 0:
-            start = 0
-        if start >= text_length:
-            break
-    
-    logger.info(f"Created {len(chunks)} chunks from {text_length} characters")
+def new_chunker() -> StreamingChunker:
+    # Texts over 20000 characters use larger chunks to reduce memory usage
+    return StreamingChunker(chunk_size=500, overlap=50, large_text_threshold=20000)
+
+def chunk_text(text: str) -> List[str]:
+    """Split text into overlapping chunks"""
+    chunks = list(new_chunker().chunks([text]))
+    logger.info(f"Created {len(chunks)} chunks from {len(text)} characters")
     return chunks
 
-def is_memory_available():
-    """Simple memory availability check"""
+def remove_spooled_file(pdf_path: str):
     try:
-        import psutil
-        available_memory = psutil.virtual_memory().available / 1024 / 1024
-        return available_memory > 200  # Need at least 200MB free
-    except ImportError:
-        # If psutil is not installed, assume memory is available
-        logger.info("psutil not installed, skipping memory check")
-        return True
-    except Exception as e:
-        logger.warning(f"Memory check failed: {e}")
-        return True
+        os.remove(pdf_path)
+    except OSError as e:
+        logger.warning(f"Failed to remove spooled file {pdf_path}: {e}")
 
-@app.post("/upload")
-async def upload_pdf(
-    file: UploadFile = File(...),
-    session: Session = Depends(get_neo4j_session)
-):
-    """Process uploaded PDF file"""
-    global vectorizer_fitted
+class PdfDocument:
+    """Streams the pages of a spooled PDF through the chunker, keeping only the head and a text hash"""
     
-    try:
-        logger.info(f"Starting upload processing for file: {file.filename}")
-        
-        # Check memory before starting
-        if not is_memory_available():
-            raise HTTPException(status_code=500, detail="Insufficient memory available for processing")
-        
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported")
-        
-        # Read PDF content
-        contents = await file.read()
-        pdf_file = io.BytesIO(contents)
+    head_size = 3000
+    
+    def __init__(
+        self,
+        pdf_path: str,
+        progress: Optional[Callable[[float], None]] = None,
+        timer: Optional[StageTimer] = None
+    ):
+        self.pdf_path = pdf_path
+        self.progress = progress
+        self.timer = timer or StageTimer("document")
+        self.head = ""
+        self.chars = 0
+        self.successful_pages = 0
+        self.truncated = False
+        self._text_hasher = TextHasher()
         
-        logger.info(f"File size: {len(contents)} bytes")
+        logger.info(f"File size: {os.path.getsize(pdf_path)} bytes")
         
         # Try different PDF readers if PyPDF2 fails
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            logger.info(f"PDF has {len(pdf_reader.pages)} pages")
+            with self.timer.span("parse"), open_pdf(pdf_path) as pdf_reader:
+                self.page_count = len(pdf_reader.pages)
+            logger.info(f"PDF has {self.page_count} pages")
         except Exception as e:
             logger.error(f"PyPDF2 failed: {e}")
-            raise HTTPException(status_code=400, detail=f"Invalid PDF file: {str(e)}")
-        
-        # Extract text from all pages
-        text = ""
-        successful_pages = 0
-        for i, page in enumerate(pdf_reader.pages):
-            try:
-                page_text = page.extract_text()
-                if page_text and page_text.strip():
-                    text += page_text + "\n"
-                    successful_pages += 1
-                else:
-                    logger.warning(f"Page {i+1} had no extractable text")
-            except Exception as e:
-                logger.warning(f"Failed to extract text from page {i+1}: {e}")
+            raise JobError(f"Invalid PDF file: {str(e)}")
+    
+    @property
+    def text_hash(self) -> Optional[str]:
+        # A truncated document was only partly read, so its hash would not
+        # identify the full text
+        return None if self.truncated else self._text_hasher.hexdigest()
+    
+    def pages(self) -> Iterator[str]:
+        """Yield the text of every page with extractable text, in order"""
+        # Extract text from all pages, split across the extraction process pool
+        pages = page_extractor.iter_pages(
+            self.pdf_path,
+            self.page_count,
+            progress=(lambda done: self.progress(done / self.page_count)) if self.progress else None
+        )
+        for i, (page_text, error) in enumerate(self.timer.iterate(pages, "extract")):
+            if error is not None:
+                logger.warning(f"Failed to extract text from page {i+1}: {error}")
+            elif page_text and page_text.strip():
+                page_text += "\n"
+                self.successful_pages += 1
+                self.chars += len(page_text)
+                self._text_hasher.update(page_text)
+                if len(self.head) < self.head_size:
+                    self.head = (self.head + page_text)[:self.head_size]
+                yield page_text
+            else:
+                logger.warning(f"Page {i+1} had no extractable text")
         
-        logger.info(f"Successfully extracted text from {successful_pages}/{len(pdf_reader.pages)} pages")
+        logger.info(f"Successfully extracted text from {self.successful_pages}/{self.page_count} pages")
         
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="Could not extract any text from PDF")
+        if not self.successful_pages:
+            raise JobError("Could not extract any text from PDF")
         
-        logger.info(f"Extracted text length: {len(text)} characters")
+        logger.info(f"Extracted text length: {self.chars} characters")
+    
+    def chunks(self, max_chunks: int = 0) -> Iterator[str]:
+        """Yield chunks as pages are extracted, stopping and setting `truncated` past `max_chunks`"""
+        chunks = self.timer.iterate(new_chunker().chunks(self.pages()), "chunk")
+        try:
+            for count, chunk in enumerate(chunks):
+                if max_chunks and count >= max_chunks:
+                    self.truncated = True
+                    logger.warning(f"Document exceeds the budget of {max_chunks} chunks, truncating")
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+def embed_chunks(chunks: List[str]) -> Vectors:
+    """Embed chunks through the embedding cache; TF-IDF fits on the first chunks seen"""
+    try:
+        embeddings = embedding_cache.embed(embedder, chunks)
+        logger.info(f"Successfully created {len(chunks)} embeddings")
+        return embeddings
+    except Exception as e:
+        logger.error(f"Embedding creation failed: {e}")
+        raise JobError(f"Failed to process text: {str(e)}")
+
+def store_papers_in_graph(papers: List[dict]):
+    """Write papers and their authors to Neo4j in a single UNWIND query"""
+    query = """
+    UNWIND $papers AS paper
+    MERGE (p:Paper {id: paper.paper_id, title: paper.title, source_file: paper.filename})
+    SET p.content_hash = paper.content_hash, p.text_hash = paper.text_hash
+    WITH p, paper
+    UNWIND paper.authors AS author_name
+    MERGE (a:Author {name: author_name})
+    MERGE (a)-[:WROTE]->(p)
+    """
+    
+    try:
+        with driver.session() as session:
+            session.run(query, {"papers": papers})
+        logger.info(f"Successfully stored {len(papers)} papers in Neo4j")
+    except Exception as e:
+        logger.error(f"Neo4j storage failed: {e}")
+        # Continue with other processing even if Neo4j fails
+
+def store_chunks(ids: List[str], embeddings: Vectors, chunks: List[str], metadatas: List[dict]):
+    """Add chunks and their embeddings to the vector store"""
+    try:
+        vector_store.add(ids, embeddings, chunks, metadatas)
+        logger.info(f"Successfully stored {len(ids)} chunks in the vector store")
+    except Exception as e:
+        logger.error(f"Vector storage failed: {e}")
+        raise JobError(f"Failed to store embeddings: {str(e)}")
+
+def store_keywords(ids: List[str], chunks: List[str], metadatas: List[dict]):
+    """Add chunks to the keyword index, if there is one"""
+    if keyword_index is None:
+        return
+    try:
+        keyword_index.add(ids, chunks, metadatas)
+    except Exception as e:
+        logger.error(f"Keyword indexing failed: {e}")
+        raise JobError(f"Failed to index keywords: {str(e)}")
+
+def index_chunks(
+    ids: List[str],
+    chunks: List[str],
+    metadatas: List[dict],
+    timer: Optional[StageTimer] = None,
+    refit_underfitted: bool = True
+):
+    """Embed chunks and add them to the vector store and keyword index, with no refit swap in between"""
+    global corpus_generation
+    timer = timer or StageTimer("index")
+    with index_lock:
+        with timer.span("embed"):
+            embeddings = embed_chunks(chunks)
+        with timer.span("store_vectors"):
+            store_chunks(ids, embeddings, chunks, metadatas)
+        with timer.span("keyword_index"):
+            store_keywords(ids, chunks, metadatas)
+        corpus_generation += 1
+    if refit_underfitted:
+        refit_when_underfitted()
+
+def lsa_underfitted() -> bool:
+    """Whether LSA fitted on too few chunks now has twice as many to learn from"""
+    active_embedder, store = current_index()
+    return active_embedder.needs_more_chunks and store.count() >= 2 * active_embedder.fit_rows
+
+def refit_when_underfitted():
+    """Queue one refit per underfitted embedder, unless a refit is already pending"""
+    global underfitted_refit_version
+    if not lsa_underfitted():
+        return
+    version = current_index()[0].version
+    with refit_lock:
+        if underfitted_refit_version == version or (refit_job is not None and not refit_job.finished):
+            return
+        underfitted_refit_version = version
+    try:
+        schedule_refit()
+    except (JobError, AdmissionRejected) as e:
+        logger.info(f"Refit of underfitted LSA skipped: {e}")
+
+def current_index():
+    """The active (embedder, vector store) pair, read consistently during a swap"""
+    with index_swap_lock:
+        return embedder, vector_store
+
+def delete_paper_chunks(paper_id: str):
+    """Best-effort removal of a paper's chunks from the vector store and keyword index"""
+    global corpus_generation
+    try:
+        with index_lock:
+            vector_store.delete(paper_id)
+            if keyword_index is not None:
+                keyword_index.delete(paper_id)
+            corpus_generation += 1
+    except Exception as e:
+        logger.error(f"Failed to remove chunks of paper {paper_id}: {e}")
+
+def duplicate_result(record: dict) -> dict:
+    return {"message": "PDF already processed", "duplicate": True, **record}
+
+def process_pdf(job: Job, pdf_path: str, filename: str, content_hash: str, timer: StageTimer) -> dict:
+    """Run the ingestion pipeline for a spooled PDF on a background worker"""
+    try:
+        # Another upload of the same bytes may have finished while this one was queued
+        with timer.span("dedupe"):
+            existing = content_hashes.claim(content_hash)
+        if existing:
+            logger.info(f"Duplicate upload of {filename}, returning paper {existing['paper_id']}")
+            return duplicate_result(existing)
         
-        # Extract metadata
-        metadata = extract_metadata_from_text(text, file.filename)
-        logger.info(f"Extracted metadata: {metadata}")
+        logger.info(f"Starting upload processing for file: {filename}")
         
         # Generate unique ID for this paper
         paper_id = str(uuid.uuid4())
         
-        # Store in Neo4j
-        query = """
-        MERGE (p:Paper {id: $paper_id, title: $title, source_file: $filename})
-        WITH p
-        UNWIND $authors AS author_name
-        MERGE (a:Author {name: author_name})
-        MERGE (a)-[:WROTE]->(p)
-        RETURN p, collect(a) as authors
-        """
-        
+        # Stream pages into chunks and embed and store them in fixed-size
+        # batches, so memory is bounded by the batch rather than the document
+        job.update(stage="ingesting", progress=0.0)
+        document = PdfDocument(
+            pdf_path,
+            progress=lambda fraction: job.update(progress=0.9 * fraction),
+            timer=timer
+        )
+        chunk_count = 0
         try:
-            result = session.run(query, {
-                "paper_id": paper_id,
-                "title": metadata["title"],
-                "filename": file.filename,
-                "authors": metadata["authors"]
-            })
-            logger.info("Successfully stored data in Neo4j")
-        except Exception as e:
-            logger.error(f"Neo4j storage failed: {e}")
-            # Continue with other processing even if Neo4j fails
-        
-        # Chunk text
-        chunks = chunk_text(text)
-        logger.info(f"Created {len(chunks)} text chunks")
+            for chunks in batched(document.chunks(MAX_CHUNKS_PER_DOCUMENT), EMBED_BATCH_SIZE):
+                indices = range(chunk_count, chunk_count + len(chunks))
+                index_chunks(
+                    [f"{paper_id}_{i}" for i in indices],
+                    chunks,
+                    [{"paper_id": paper_id, "chunk_index": i} for i in indices],
+                    timer
+                )
+                chunk_count += len(chunks)
+        except Exception:
+            delete_paper_chunks(paper_id)
+            raise
+        logger.info(f"Created {chunk_count} text chunks")
         
-        # Limit the number of chunks to process to avoid memory issues
-        max_chunks_to_process = 200
-        if len(chunks) > max_chunks_to_process:
-            logger.warning(f"Too many chunks ({len(chunks)}), limiting to {max_chunks_to_process}")
-            chunks = chunks[:max_chunks_to_process]
+        # Same text under different bytes (re-saved or re-exported PDFs)
+        text_hash = document.text_hash
+        existing = content_hashes.lookup(text_hash)
+        if existing:
+            logger.info(f"Text of {filename} matches paper {existing['paper_id']}, discarding its chunks")
+            delete_paper_chunks(paper_id)
+            content_hashes.add(existing, content_hash)
+            return duplicate_result(existing)
         
-        # Create TF-IDF embeddings
-        try:
-            if not vectorizer_fitted:
-                logger.info("Fitting vectorizer for the first time")
-                embeddings = vectorizer.fit_transform(chunks).toarray()
-                vectorizer_fitted = True
-            else:
-                logger.info("Transforming with existing vectorizer")
-                embeddings = vectorizer.transform(chunks).toarray()
-            
-            logger.info("Successfully created embeddings")
-        except Exception as e:
-            logger.error(f"Embedding creation failed: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to process text: {str(e)}")
+        # Extract metadata
+        job.update(stage="metadata", progress=0.9)
+        with timer.span("metadata"):
+            metadata = extract_metadata_from_text(document.head, filename)
+        logger.info(f"Extracted metadata: {metadata}")
         
-        # Store in ChromaDB
-        try:
-            ids = [f"{paper_id}_{i}" for i in range(len(chunks))]
-            collection.add(
-                ids=ids,
-                embeddings=embeddings.tolist(),
-                documents=chunks,
-                metadatas=[{"paper_id": paper_id, "chunk_index": i} for i in range(len(chunks))]
-            )
-            logger.info("Successfully stored in ChromaDB")
-        except Exception as e:
-            logger.error(f"ChromaDB storage failed: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to store embeddings: {str(e)}")
+        # Store in Neo4j
+        job.update(stage="graph", progress=0.95)
+        with timer.span("graph"):
+            store_papers_in_graph([{
+                "paper_id": paper_id,
+                "title": metadata["title"],
+                "filename": filename,
+                "authors": metadata["authors"],
+                "content_hash": content_hash,
+                "text_hash": text_hash
+            }])
         
-        response = {
-            "message": "PDF processed successfully",
+        record = {
             "paper_id": paper_id,
             "title": metadata["title"],
             "authors": metadata["authors"],
-            "chunks_processed": len(chunks)
+            "chunks_processed": chunk_count,
+            "truncated": document.truncated,
+            "chunk_budget": MAX_CHUNKS_PER_DOCUMENT
         }
+        content_hashes.add(record, content_hash, text_hash)
         
+        response = {"message": "PDF processed successfully", **record}
         logger.info(f"Upload completed successfully: {response}")
         return response
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error processing PDF: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        content_hashes.release(content_hash)
+        remove_spooled_file(pdf_path)
 
-@app.post("/ask", response_model=AnswerResponse)
-async def ask_question(
-    request: QuestionRequest,
-    session: Session = Depends(get_neo4j_session)
-):
-    """Answer question based on research papers"""
-    global vectorizer_fitted
+def process_pdf_batch(job: Job, files: List[dict], timer: StageTimer) -> dict:
+    """Ingest many PDFs with one embedding call, one vector store add and one graph write"""
+    results = [
+        {"filename": entry["filename"], "status": "failed", "error": entry["error"]}
+        for entry in files
+    ]
+    papers = []
+    claimed = []
+    in_flight = []
     
     try:
-        # Check if vectorizer is fitted
-        if not vectorizer_fitted:
-            raise HTTPException(
-                status_code=400, 
-                detail="No documents have been processed yet. Please upload PDF files first."
-            )
-        
-        # Generate embedding for question
-        question_embedding = vectorizer.transform([request.question]).toarray()[0]
-        
-        # Query vector database
-        results = collection.query(
-            query_embeddings=[question_embedding.tolist()],
-            n_results=5
-        )
+        # Stage 1: extract, describe and chunk every file independently
+        job.update(stage="extracting", progress=0.0)
+        pending = [i for i, entry in enumerate(files) if entry["path"]]
+        first_in_batch = {}
+        for done, i in enumerate(pending):
+            pdf_path, filename, content_hash = files[i]["path"], files[i]["filename"], files[i]["content_hash"]
+            try:
+                # Repeats within the batch resolve once the first copy is stored
+                if content_hash in first_in_batch:
+                    results[i] = {"filename": filename, "duplicate_of": first_in_batch[content_hash]}
+                    continue
+                with timer.span("dedupe"):
+                    existing, owned = content_hashes.try_claim(content_hash)
+                if existing:
+                    results[i] = {"filename": filename, "status": "duplicate", **existing}
+                    continue
+                if not owned:
+                    # Another job is ingesting the same bytes; waiting for it
+                    # while holding claims could deadlock, so it is awaited below
+                    in_flight.append(i)
+                    continue
+                claimed.append(content_hash)
+                first_in_batch[content_hash] = i
+                
+                logger.info(f"Starting batch processing for file: {filename}")
+                document = PdfDocument(pdf_path, timer=timer)
+                chunks = list(document.chunks(MAX_CHUNKS_PER_DOCUMENT))
+                text_hash = document.text_hash
+                if text_hash and text_hash in first_in_batch:
+                    results[i] = {"filename": filename, "duplicate_of": first_in_batch[text_hash]}
+                    continue
+                existing = content_hashes.lookup(text_hash)
+                if existing:
+                    content_hashes.add(existing, content_hash)
+                    results[i] = {"filename": filename, "status": "duplicate", **existing}
+                    continue
+                if text_hash:
+                    first_in_batch[text_hash] = i
+                with timer.span("metadata"):
+                    metadata = extract_metadata_from_text(document.head, filename)
+                papers.append({
+                    "index": i,
+                    "paper_id": str(uuid.uuid4()),
+                    "title": metadata["title"],
+                    "filename": filename,
+                    "authors": metadata["authors"],
+                    "content_hash": content_hash,
+                    "text_hash": text_hash,
+                    "chunks": chunks,
+                    "truncated": document.truncated
+                })
+            except JobError as e:
+                results[i]["error"] = str(e)
+            except Exception as e:
+                logger.error(f"Batch extraction failed for {filename}: {e}")
+                results[i]["error"] = f"Error processing file: {str(e)}"
+            finally:
+                remove_spooled_file(pdf_path)
+            job.update(progress=0.6 * (done + 1) / len(pending))
         
-        # Process vector results
-        vector_context = []
-        if results['documents'] and len(results['documents'][0]) > 0:
-            for i, (doc, distance, metadata) in enumerate(zip(
-                results['documents'][0],
-                results['distances'][0],
-                results['metadatas'][0]
-            )):
-                vector_context.append(SearchResult(
-                    text=doc,
-                    similarity=1 - distance,
-                    paper_id=metadata['paper_id']
-                ))
+        if papers:
+            chunks = [chunk for paper in papers for chunk in paper["chunks"]]
+            ids = [f"{paper['paper_id']}_{i}" for paper in papers for i in range(len(paper["chunks"]))]
+            metadatas = [
+                {"paper_id": paper["paper_id"], "chunk_index": i}
+                for paper in papers for i in range(len(paper["chunks"]))
+            ]
+            
+            # Stage 2: vectorize every chunk of the batch in one call and add
+            # them to the vector store in one go
+            job.update(stage="indexing", progress=0.6)
+            try:
+                index_chunks(ids, chunks, metadatas, timer)
+            except Exception as e:
+                # Remove whatever part of the batch was stored, as process_pdf does
+                logger.error(f"Batch indexing failed: {e}")
+                for paper in papers:
+                    delete_paper_chunks(paper["paper_id"])
+                    results[paper["index"]]["error"] = str(e) if isinstance(e, JobError) else f"Error processing file: {str(e)}"
+                papers = []
         
-        # Query knowledge graph for related information
-        graph_context = []
+        if papers:
+            # Stage 3: one UNWIND write for all papers and authors
+            job.update(stage="graph", progress=0.8)
+            with timer.span("graph"):
+                store_papers_in_graph([
+                    {key: paper[key] for key in ("paper_id", "title", "filename", "authors", "content_hash", "text_hash")}
+                    for paper in papers
+                ])
+            
+            for paper in papers:
+                record = {
+                    "paper_id": paper["paper_id"],
+                    "title": paper["title"],
+                    "authors": paper["authors"],
+                    "chunks_processed": len(paper["chunks"]),
+                    "truncated": paper["truncated"],
+                    "chunk_budget": MAX_CHUNKS_PER_DOCUMENT
+                }
+                content_hashes.add(record, paper["content_hash"], paper["text_hash"])
+                results[paper["index"]] = {"filename": paper["filename"], "status": "processed", **record}
         
-        # Query for papers mentioning similar concepts
-        graph_query = """
-        MATCH (p:Paper)
-        WHERE p.title CONTAINS $query OR p.id IN $paper_ids
-        OPTIONAL MATCH (a:Author)-[:WROTE]->(p)
-        OPTIONAL MATCH (p)-[r]->(related)
-        RETURN p, collect(DISTINCT a) as authors, collect(DISTINCT {type: type(r), target: related}) as relationships
-        LIMIT 10
-        """
+        for i, result in enumerate(results):
+            if "duplicate_of" in result:
+                first = results[result["duplicate_of"]]
+                results[i] = {**first, "filename": result["filename"]}
+                if first["status"] == "processed":
+                    results[i]["status"] = "duplicate"
+    finally:
+        for content_hash in claimed:
+            content_hashes.release(content_hash)
+        for entry in files:
+            if entry["path"] and os.path.exists(entry["path"]):
+                remove_spooled_file(entry["path"])
+    
+    # This batch holds no claims any more, so it can wait for the other jobs
+    for i in in_flight:
+        existing = content_hashes.claim(files[i]["content_hash"])
+        if existing:
+            results[i] = {"filename": files[i]["filename"], "status": "duplicate", **existing}
+        else:
+            content_hashes.release(files[i]["content_hash"])
+            results[i]["error"] = "A concurrent upload of the same file failed, please upload it again"
+    
+    processed = sum(1 for result in results if result["status"] == "processed")
+    duplicates = sum(1 for result in results if result["status"] == "duplicate")
+    logger.info(f"Batch completed: {processed}/{len(files)} files processed, {duplicates} duplicates")
+    return {
+        "message": f"Processed {processed} of {len(files)} files",
+        "files_processed": processed,
+        "files_duplicate": duplicates,
+        "files_failed": len(files) - processed - duplicates,
+        "files": results
+    }
+
+def estimate_ingest_memory(file_bytes: int) -> int:
+    """Memory an ingestion is expected to need, from the size of its input"""
+    return int(INGEST_BASE_MEMORY_MB * 1024 * 1024 + INGEST_MEMORY_PER_FILE_BYTE * file_bytes)
+
+def rejected_response(e: AdmissionRejected) -> HTTPException:
+    logger.warning(f"Upload rejected, ingestion queue is full (retry after {e.retry_after}s)")
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def run_admitted(job: Job, ticket: Ticket, timer: StageTimer, pipeline: Callable[..., dict], *args) -> dict:
+    """Wait for an ingestion slot and memory budget, then run the pipeline"""
+    job.update(stage="waiting")
+    try:
+        with admission.admit(ticket):
+            timer.add("queue_wait", time.monotonic() - ticket.enqueued_at)
+            result = pipeline(job, *args, timer)
+    except Exception as e:
+        timer.finish(logger, job_id=job.id, filename=job.filename, status="failed", error=str(e))
+        raise
+    result["timings"] = timer.finish(
+        logger,
+        job_id=job.id,
+        filename=job.filename,
+        status="completed",
+        paper_id=result.get("paper_id")
+    )
+    return result
+
+def refit_vectorizer(job: Job, timer: StageTimer) -> dict:
+    """Re-embed every chunk into a shadow store with a refitted vocabulary and swap it in"""
+    global embedder, vector_store, corpus_generation
+    started = time.perf_counter()
+    
+    job.update(stage="snapshot", progress=0.0)
+    with timer.span("snapshot"):
+        ids, documents, metadatas = vector_store.items()
+    if not ids:
+        raise JobError("No chunks have been stored yet, nothing to refit")
+    
+    job.update(stage="fitting", progress=0.05)
+    with timer.span("fit"):
+        sample = documents if len(documents) <= REFIT_SAMPLE_SIZE else random.sample(documents, REFIT_SAMPLE_SIZE)
+        refitted = embedder.refit(sample)
+    logger.info(f"Refitted vectorizer on {len(sample)} of {len(documents)} chunks")
+    
+    job.update(stage="embedding", progress=0.1)
+    shadow = new_vector_store()
+    try:
+        for start in range(0, len(ids), EMBED_BATCH_SIZE):
+            end = start + EMBED_BATCH_SIZE
+            with timer.span("embed"):
+                embeddings = refitted.embed(documents[start:end])
+            with timer.span("store_vectors"):
+                shadow.add(ids[start:end], embeddings, documents[start:end], metadatas[start:end])
+            job.update(progress=0.1 + 0.85 * min(end, len(ids)) / len(ids))
         
-        paper_ids = list(set([ctx.paper_id for ctx in vector_context]))
-        graph_results = session.run(graph_query, {
-            "query": request.question.lower(),
-            "paper_ids": paper_ids if paper_ids else [""]
+        job.update(stage="swapping", progress=0.95)
+        with index_lock, timer.span("catch_up"):
+            current_ids, current_documents, current_metadatas = vector_store.items()
+            current_papers = {metadata["paper_id"] for metadata in current_metadatas}
+            removed_papers = {metadata["paper_id"] for metadata in metadatas} - current_papers
+            for paper_id in removed_papers:
+                shadow.delete(paper_id)
+            snapshot_ids = set(ids)
+            added = [i for i, chunk_id in enumerate(current_ids) if chunk_id not in snapshot_ids]
+            for batch in batched(added, EMBED_BATCH_SIZE):
+                shadow.add(
+                    [current_ids[i] for i in batch],
+                    refitted.embed([current_documents[i] for i in batch]),
+                    [current_documents[i] for i in batch],
+                    [current_metadatas[i] for i in batch]
+                )
+            with index_swap_lock:
+                previous = vector_store
+                embedder, vector_store = refitted, shadow
+            corpus_generation += 1
+    except Exception:
+        shadow.close()
+        raise
+    # Drop the old store only once no committed snapshot refers to it
+    save_index()
+    previous.close()
+    
+    seconds = time.perf_counter() - started
+    chunks = shadow.count()
+    result = {
+        "message": "Vectorizer refitted",
+        "chunks": chunks,
+        "chunks_added_during_refit": len(added),
+        "papers_removed_during_refit": len(removed_papers),
+        "sample_size": len(sample),
+        "vocabulary_size": len(refitted.vectorizer.vocabulary_),
+        "dimension": refitted.dimension,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 1)
+    }
+    logger.info(f"Refit completed: {result}")
+    return result
+
+def schedule_refit() -> Job:
+    """Queue a refit behind admission control, unless one is already in progress"""
+    global refit_job
+    with refit_lock:
+        if refit_job is not None and not refit_job.finished:
+            raise JobError(f"Refit job {refit_job.id} is already in progress")
+        # The shadow store holds a second copy of every chunk until the swap
+        ticket = admission.enqueue(estimate_ingest_memory(REFIT_BYTES_PER_CHUNK * vector_store.count()))
+        refit_job = job_manager.create("refit")
+        job_manager.submit(refit_job, run_admitted, ticket, StageTimer("refit"), refit_vectorizer)
+        logger.info(f"Queued refit job {refit_job.id}")
+        return refit_job
+
+def refit_periodically(stop: threading.Event):
+    """Refit every REFIT_INTERVAL_MINUTES if chunks were added or removed since the last refit"""
+    refitted_count = 0
+    while not stop.wait(REFIT_INTERVAL_MINUTES * 60):
+        count = vector_store.count()
+        if not embedder.fitted or count == refitted_count:
+            continue
+        try:
+            schedule_refit()
+            refitted_count = count
+        except (JobError, AdmissionRejected) as e:
+            logger.info(f"Scheduled refit skipped: {e}")
+
+def save_index():
+    """Snapshot the embedder, vector store, keyword index and ingestion manifest to DATA_DIR"""
+    global saved_versions, saved_cache_version
+    if snapshots is None:
+        return
+    with persist_lock:
+        cache_version = embedding_cache.version
+        if cache_version != saved_cache_version:
+            embedding_cache.save(embedding_cache_path)
+            saved_cache_version = cache_version
+        versions = (corpus_generation, content_hashes.version)
+        if versions == saved_versions:
+            return
+        started = time.perf_counter()
+        # Read before the store, so every paper it lists has its chunks saved
+        manifest = content_hashes.records()
+        path = snapshots.create()
+        with index_lock:
+            store, active_embedder = vector_store, embedder
+            store_state = store.save(snapshots.root, path)
+            keyword_state = keyword_index.save(snapshots.root, path) if keyword_index is not None else None
+        embedder_state = pickle.dumps(active_embedder, protocol=pickle.HIGHEST_PROTOCOL)
+        write_atomic(os.path.join(path, "embedder.pkl"), embedder_state)
+        write_json(os.path.join(path, "manifest.json"), manifest)
+        write_json(os.path.join(path, "state.json"), {
+            "embedder": EMBEDDER,
+            "embedder_version": active_embedder.version,
+            "backend": VECTOR_BACKEND,
+            "lsa_components": LSA_COMPONENTS,
+            "store": store_state,
+            "keyword_index": keyword_state
         })
+        snapshots.commit(path)
         
-        for record in graph_results:
+        # Column files of stores replaced by a refit or compaction, and
+        # keyword index segments merged away
+        storage_id = store_state.get("storage_id")
+        keyword_files = set(keyword_state["files"]) if keyword_state else set()
+        for name in os.listdir(snapshots.root):
+            column_path = os.path.join(snapshots.root, name)
+            if os.path.isfile(column_path) and not (
+                name.startswith(("CURRENT", f"{storage_id}.")) or name in keyword_files
+            ):
+                os.remove(column_path)
+        saved_versions = versions
+        logger.info(f"Saved {store.count()} chunks to {path} in {time.perf_counter() - started:.2f}s")
+
+def persist_periodically(stop: threading.Event):
+    while not stop.wait(PERSIST_INTERVAL_SECONDS):
+        try:
+            save_index()
+        except Exception as e:
+            logger.error(f"Saving the index failed: {e}")
+
+async def spool_upload(file: UploadFile, pdf_path: str) -> str:
+    """Stream an upload to the spool directory, returning the SHA-256 of its bytes"""
+    max_bytes = MAX_UPLOAD_MB * 1024 * 1024
+    size = 0
+    digest = hashlib.sha256()
+
+    def write_chunk(spool_file, chunk: bytes):
+        digest.update(chunk)
+        spool_file.write(chunk)
+
+    try:
+        with open(pdf_path, "wb") as spool_file:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the maximum upload size of {MAX_UPLOAD_MB} MB"
+                    )
+                await run_io(write_chunk, spool_file, chunk)
+    except HTTPException:
+        remove_spooled_file(pdf_path)
+        raise
+    except Exception as e:
+        logger.error(f"Failed to spool upload {file.filename}: {e}")
+        remove_spooled_file(pdf_path)
+        raise HTTPException(status_code=500, detail=f"Error receiving file: {str(e)}")
+    finally:
+        await file.close()
+    
+    logger.info(f"Spooled {file.filename}: {size} bytes")
+    return digest.hexdigest()
+
+@app.post("/upload", status_code=202)
+async def upload_pdf(file: UploadFile = File(...)):
+    """Accept a PDF upload and queue it for background processing"""
+    if driver is None:
+        raise HTTPException(status_code=500, detail="Neo4j database not available")
+    
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    try:
+        admission.check()
+    except AdmissionRejected as e:
+        raise rejected_response(e)
+    
+    timer = StageTimer("upload")
+    pdf_path = os.path.join(SPOOL_DIR, f"{uuid.uuid4()}.pdf")
+    with timer.span("spool"):
+        content_hash = await spool_upload(file, pdf_path)
+    
+    # Known content is answered straight from the hash index
+    existing = content_hashes.lookup(content_hash)
+    if existing:
+        remove_spooled_file(pdf_path)
+        logger.info(f"Duplicate upload of {file.filename}, returning paper {existing['paper_id']}")
+        return JSONResponse(status_code=200, content={
+            "message": "PDF already processed",
+            "job_id": None,
+            "status": "completed",
+            "filename": file.filename,
+            "result": duplicate_result(existing)
+        })
+    
+    try:
+        ticket = admission.enqueue(estimate_ingest_memory(os.path.getsize(pdf_path)))
+    except AdmissionRejected as e:
+        remove_spooled_file(pdf_path)
+        raise rejected_response(e)
+    
+    job = job_manager.create("upload", file.filename)
+    job_manager.submit(job, run_admitted, ticket, timer, process_pdf, pdf_path, file.filename, content_hash)
+    logger.info(f"Queued job {job.id} for file: {file.filename}")
+    
+    return {
+        "message": "PDF accepted for processing",
+        "job_id": job.id,
+        "status": job.status,
+        "filename": file.filename
+    }
+
+@app.post("/upload/batch", status_code=202)
+async def upload_pdf_batch(files: List[UploadFile] = File(...)):
+    """Accept many PDFs and queue them as one pipelined batch job"""
+    if driver is None:
+        raise HTTPException(status_code=500, detail="Neo4j database not available")
+    
+    try:
+        admission.check()
+    except AdmissionRejected as e:
+        raise rejected_response(e)
+    
+    timer = StageTimer("upload_batch")
+    batch_id = str(uuid.uuid4())
+    spooled = []
+    try:
+        for i, file in enumerate(files):
+            entry = {"path": None, "filename": file.filename, "content_hash": None, "error": None}
+            spooled.append(entry)
+            if not file.filename.endswith('.pdf'):
+                entry["error"] = "Only PDF files are supported"
+                continue
+            pdf_path = os.path.join(SPOOL_DIR, f"{batch_id}_{i}.pdf")
+            try:
+                with timer.span("spool"):
+                    entry["content_hash"] = await spool_upload(file, pdf_path)
+            except HTTPException as e:
+                if e.status_code != 413:
+                    raise
+                entry["error"] = e.detail
+                continue
+            entry["path"] = pdf_path
+    except HTTPException:
+        for entry in spooled:
+            if entry["path"]:
+                remove_spooled_file(entry["path"])
+        raise
+    
+    try:
+        total_bytes = sum(os.path.getsize(entry["path"]) for entry in spooled if entry["path"])
+        ticket = admission.enqueue(estimate_ingest_memory(total_bytes))
+    except AdmissionRejected as e:
+        for entry in spooled:
+            if entry["path"]:
+                remove_spooled_file(entry["path"])
+        raise rejected_response(e)
+    
+    job = job_manager.create("batch", f"{len(files)} files")
+    job_manager.submit(job, run_admitted, ticket, timer, process_pdf_batch, spooled)
+    logger.info(f"Queued batch job {job.id} for {len(files)} files")
+    
+    return {
+        "message": f"{len(files)} files accepted for processing",
+        "job_id": job.id,
+        "status": job.status,
+        "files": [entry["filename"] for entry in spooled]
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report stage, progress and result of a background job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/admin/refit", status_code=202)
+async def refit_index():
+    """Refit the vectorizer on the stored chunks in the background and swap it in"""
+    if not embedder.refittable:
+        raise HTTPException(status_code=400, detail=f"The {embedder.name} embedder has no vocabulary to refit")
+    if not embedder.fitted:
+        raise HTTPException(status_code=400, detail="No documents have been processed yet")
+    try:
+        job = await run_io(schedule_refit)
+    except JobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except AdmissionRejected as e:
+        raise rejected_response(e)
+    return {"job_id": job.id, "status": job.status}
+
+def query_results(results: dict, q: int) -> dict:
+    """The results of query `q` of a multi-query search, as a one-query result"""
+    return {key: [results[key][q]] for key in results}
+
+async def retrieve_vector(questions: List[str], n_results: int, timer: StageTimer) -> Tuple[dict, List[bool]]:
+    """Vector search results for questions, and which came from the query cache"""
+    # Generate embeddings for questions, unless they were asked before; the
+    # generation is read first so results computed across an upload are
+    # stored as already stale
+    generation = corpus_generation
+    with timer.span("embed_query"):
+        active_embedder, active_store = current_index()
+        lookups = [query_cache.lookup(question, n_results, active_embedder.version, generation) for question in questions]
+        missing = [q for q, (_, results) in enumerate(lookups) if results is None]
+        vectors = {q: lookups[q][0] for q in missing if lookups[q][0] is not None}
+        to_embed = [q for q in missing if q not in vectors]
+        if to_embed:
+            embedded = await run_cpu(active_embedder.embed_queries, [questions[q] for q in to_embed])
+            vectors.update({q: embedded[i:i + 1] for i, q in enumerate(to_embed)})
+    
+    # Query vector database
+    with timer.span("vector_search"):
+        results = empty_result(len(questions))
+        for q, (_, cached_results) in enumerate(lookups):
+            if cached_results is not None:
+                for key in results:
+                    results[key][q] = cached_results[key][0]
+        if missing:
+            found = await run_cpu(active_store.query, stack_rows([vectors[q] for q in missing]), n_results=n_results)
+            for i, q in enumerate(missing):
+                for key in results:
+                    results[key][q] = found[key][i]
+                query_cache.store(questions[q], n_results, active_embedder.version, vectors[q], generation, query_results(found, i))
+        return results, [cached_results is not None for _, cached_results in lookups]
+
+async def retrieve_keywords(questions: List[str], n_results: int, timer: StageTimer) -> dict:
+    """BM25 search results for questions"""
+    with timer.span("keyword_search"):
+        return await run_cpu(keyword_index.query, questions, n_results=n_results)
+
+# Per question, papers whose titles contain its terms score the number of
+# terms they contain; papers sharing an author with one of them score half
+GRAPH_RETRIEVER_QUERY = """
+UNWIND $questions AS question
+CALL {
+    WITH question
+    UNWIND question.terms AS term
+    MATCH (p:Paper) WHERE toLower(p.title) CONTAINS term
+    WITH p, count(DISTINCT term) AS matched
+    OPTIONAL MATCH (p)<-[:WROTE]-(:Author)-[:WROTE]->(neighbor:Paper)
+    WITH p, matched, collect(DISTINCT neighbor) AS neighbors
+    UNWIND [{paper: p, score: toFloat(matched)}] + [n IN neighbors | {paper: n, score: matched * 0.5}] AS hit
+    WITH hit.paper.id AS paper_id, max(hit.score) AS score
+    ORDER BY score DESC, paper_id
+    LIMIT $limit
+    RETURN collect(paper_id) AS paper_ids
+}
+RETURN question.index AS index, paper_ids
+"""
+
+def graph_papers(questions: List[str], limit: int) -> List[List[str]]:
+    """Per question, ids of the papers in the graph neighborhood of its terms, best first"""
+    terms = [{"index": q, "terms": sorted(set(tokenize(question)))} for q, question in enumerate(questions)]
+    paper_ids = [[] for _ in questions]
+    terms = [question for question in terms if question["terms"]]
+    if not terms:
+        return paper_ids
+    with driver.session() as session:
+        for record in session.run(GRAPH_RETRIEVER_QUERY, {"questions": terms, "limit": limit}):
+            paper_ids[record["index"]] = record["paper_ids"]
+    return paper_ids
+
+def graph_passages(questions: List[str], paper_ids: List[List[str]], n_results: int) -> dict:
+    """Per question, the best keyword matches among the chunks of its papers"""
+    results = empty_result(len(questions))
+    for q, (question, ids) in enumerate(zip(questions, paper_ids)):
+        if ids:
+            found = keyword_index.query([question], n_results=n_results, paper_ids=ids)
+            for key in results:
+                results[key][q] = found[key][0]
+    return results
+
+async def retrieve_graph(questions: List[str], n_results: int, timer: StageTimer) -> dict:
+    """The best keyword matches among the chunks of each question's graph neighborhood"""
+    with timer.span("graph_search"):
+        paper_ids = await run_io(graph_papers, questions, GRAPH_RETRIEVER_PAPERS)
+    with timer.span("graph_passages"):
+        return await run_cpu(graph_passages, questions, paper_ids, n_results)
+
+def hybrid_retrievers() -> Dict[str, Callable]:
+    """The retrievers hybrid retrieval fuses, by name"""
+    retrievers: Dict[str, Callable] = {"vector": retrieve_vector}
+    if keyword_index is not None:
+        retrievers["bm25"] = retrieve_keywords
+        if driver is not None:
+            retrievers["graph"] = retrieve_graph
+    return retrievers
+
+async def retrieve_hybrid(questions: List[str], n_results: int, timer: StageTimer) -> Tuple[dict, List[bool], Dict[str, str]]:
+    """Fused results of the retrievers run concurrently, which came from the query cache, and each retriever's status"""
+    # As in retrieve_vector, the generation is read before any search
+    generation = corpus_generation
+    version = current_index()[0].version
+    lookups = [query_cache.lookup(question, n_results, version, generation, retriever="hybrid")[1] for question in questions]
+    missing = [q for q, cached_results in enumerate(lookups) if cached_results is None]
+    results = {**empty_result(len(questions)), "scores": [[] for _ in questions], "sources": [[] for _ in questions]}
+    cached = [cached_results is not None for cached_results in lookups]
+    status = {name: "cached" for name in hybrid_retrievers()}
+    for q, cached_results in enumerate(lookups):
+        if cached_results is not None:
+            for key in results:
+                results[key][q] = cached_results[key][0]
+    if not missing:
+        return results, cached, status
+
+    fused, vector_cached, status = await fuse_retrievers([questions[q] for q in missing], n_results, timer)
+    for i, q in enumerate(missing):
+        for key in results:
+            results[key][q] = fused[key][i]
+        cached[q] = vector_cached[i]
+        # Results missing a retriever that timed out or failed are not kept
+        if all(outcome == "ok" for outcome in status.values()):
+            query_cache.store(questions[q], n_results, version, None, generation, query_results(fused, i), retriever="hybrid")
+    return results, cached, status
+
+async def fuse_retrievers(questions: List[str], n_results: int, timer: StageTimer) -> Tuple[dict, List[bool], Dict[str, str]]:
+    """Fused results of the retrievers run concurrently, which questions' vector results were cached, and each retriever's status"""
+    retrievers = hybrid_retrievers()
+    # Concurrent spans cannot share a timer; each retriever gets its own
+    timers = {name: StageTimer(timer.operation, timer.registry) for name in retrievers}
+    timeout = min(RETRIEVER_TIMEOUT_MS * len(questions), BATCH_RETRIEVER_TIMEOUT_MS) / 1000
+    outcomes = await asyncio.gather(*(
+        asyncio.wait_for(retrieve(questions, max(FUSION_FETCH_K, n_results), timers[name]), timeout)
+        for name, retrieve in retrievers.items()
+    ), return_exceptions=True)
+
+    rankings, status, cached = {}, {}, [False] * len(questions)
+    for name, outcome in zip(retrievers, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            status[name] = "timeout"
+            registry.counter(f"ask_{name}_retriever_timeouts_total").inc()
+            logger.warning(f"The {name} retriever took longer than {timeout * 1000:.0f} ms")
+            continue
+        if isinstance(outcome, Exception):
+            status[name] = "error"
+            logger.warning(f"The {name} retriever failed: {outcome}")
+            continue
+        status[name] = "ok"
+        for stage, seconds in timers[name].timings.items():
+            timer.add(stage, seconds)
+        if name == "vector":
+            outcome, cached = outcome
+        rankings[name] = outcome
+    if not rankings:
+        raise HTTPException(status_code=503, detail=f"No retriever answered within {timeout * 1000:.0f} ms")
+
+    with timer.span("fusion"):
+        return reciprocal_rank_fusion(rankings, n_results, k=RRF_K, weights=FUSION_WEIGHTS), cached, status
+
+def search_results(results: dict, q: int) -> List[SearchResult]:
+    """The results of query `q` as response entries, with provenance if fused"""
+    vector_context = []
+    for i, (doc, distance, metadata) in enumerate(zip(
+        results['documents'][q],
+        results['distances'][q],
+        results['metadatas'][q]
+    )):
+        vector_context.append(SearchResult(
+            text=doc,
+            similarity=1 - distance,
+            paper_id=metadata['paper_id'],
+            score=results['scores'][q][i] if 'scores' in results else None,
+            sources=results['sources'][q][i] if 'sources' in results else None
+        ))
+    return vector_context
+
+# Each paper is read once however many questions refer to it; papers are
+# then handed to every question whose results or lowercased text name them
+GRAPH_CONTEXT_QUERY = """
+CALL {
+    UNWIND $paper_ids AS paper_id
+    MATCH (p:Paper {id: paper_id})
+    RETURN p
+    UNION
+    UNWIND $queries AS query
+    MATCH (p:Paper)
+    WHERE p.title CONTAINS query
+    RETURN p
+}
+OPTIONAL MATCH (a:Author)-[:WROTE]->(p)
+OPTIONAL MATCH (p)-[r]->(related)
+RETURN p, collect(DISTINCT a) as authors, collect(DISTINCT {type: type(r), target: related}) as relationships
+"""
+
+def graph_contexts(session: Session, questions: List[str], paper_ids: List[List[str]]) -> List[List[GraphResult]]:
+    """Papers, authors and relationships related to each question, in one Neo4j query"""
+    queries = [question.lower() for question in questions]
+    records = list(session.run(GRAPH_CONTEXT_QUERY, {
+        "paper_ids": sorted({paper_id for ids in paper_ids for paper_id in ids}),
+        "queries": sorted(set(queries))
+    }))
+    
+    contexts = []
+    for query, ids in zip(queries, paper_ids):
+        ids = set(ids)
+        matched = [
+            record for record in records
+            if record["p"].get("id") in ids or query in (record["p"].get("title") or "")
+        ][:10]
+        graph_context = []
+        for record in matched:
             paper = record["p"]
             authors = record["authors"]
             relationships = record["relationships"]
@@ -388,16 +1363,19 @@ async def ask_question(
                                 "to": rel["target"].get("id", str(rel["target"].id)) if hasattr(rel["target"], 'get') else str(rel["target"].id)
                             }
                         ))
-        
-        # Prepare meaningful context from the vector search results
-        top_passages = "\n".join([f"• {ctx.text[:150]}..." for ctx in vector_context[:3]])
+        contexts.append(graph_context)
+    return contexts
+
+def compose_answer(question: str, vector_context: List[SearchResult]) -> str:
+    # Prepare meaningful context from the vector search results
+    top_passages = "\n".join([f"• {ctx.text[:150]}..." for ctx in vector_context[:3]])
 
-        # Get unique paper IDs for display
-        unique_papers = set([ctx.paper_id for ctx in vector_context])
-        paper_count = len(unique_papers)
+    # Get unique paper IDs for display
+    unique_papers = set([ctx.paper_id for ctx in vector_context])
+    paper_count = len(unique_papers)
 
-        # Create much better AI response with actual content
-        ai_answer = f"""## Analysis of: '{request.question}'
+    # Create much better AI response with actual content
+    return f"""## Analysis of: '{question}'
 
 ### 📊 Research Insights:
 Based on analysis of {len(vector_context)} relevant passages from {paper_count} research papers:
@@ -409,13 +1387,105 @@ Based on analysis of {len(vector_context)} relevant passages from {paper_count}
 {', '.join([paper_id[:8] + '...' for paper_id in unique_papers])}
 
 ### 💡 Summary:
-The research discusses {request.question.lower()} with focus on technical approaches and methodologies found across multiple studies in the analyzed papers."""
+The research discusses {question.lower()} with focus on technical approaches and methodologies found across multiple studies in the analyzed papers."""
 
-        return AnswerResponse(
-            answer=ai_answer,
+def diversify(results: dict, top_k: int, diversity: float) -> dict:
+    """Re-rank each question's candidates by maximal marginal relevance over their stored vectors, keeping top_k"""
+    active_embedder, active_store = current_index()
+    documents = [document for question_documents in results["documents"] for document in question_documents]
+    if not documents:
+        return results
+    ids = [chunk_id for question_ids in results["ids"] for chunk_id in question_ids]
+    metadatas = [metadata for question_metadatas in results["metadatas"] for metadata in question_metadatas]
+    vectors, found = active_store.vectors(ids, metadatas)
+    if not found.all():
+        # Chunks deleted since they were retrieved are embedded again
+        missing = embedding_cache.embed(active_embedder, [document for document, stored in zip(documents, found) if not stored])
+        vectors = merge_rows(vectors, found, missing) if found.any() else missing
+    diversified = {key: [[] for _ in results["ids"]] for key in results}
+    first = 0
+    for q, question_documents in enumerate(results["documents"]):
+        last = first + len(question_documents)
+        # Every store's distances are 1 - cosine, and BM25 and fused ones 1 - a score on the same scale
+        relevance = 1.0 - np.asarray(results["distances"][q])
+        picked = maximal_marginal_relevance(relevance, vectors[first:last], top_k, diversity) if question_documents else []
+        for key in results:
+            diversified[key][q] = [results[key][q][i] for i in picked]
+        first = last
+    return diversified
+
+async def answer_questions(
+    questions: List[str],
+    settings: RetrievalSettings,
+    session: Session,
+    timer: StageTimer
+) -> Tuple[List[AnswerResponse], List[bool], Optional[Dict[str, str]]]:
+    """Answers to a batch of questions, which came from the query cache, and each retriever's status"""
+    retriever = settings.retriever or DEFAULT_RETRIEVER
+    top_k, diversity = settings.top_k, settings.diversity
+    fetch_k = max(settings.fetch_k or (MMR_FETCH_K if diversity > 0 else top_k), top_k)
+    if retriever == "bm25" and keyword_index is None:
+        raise HTTPException(status_code=400, detail="The keyword index is disabled (BM25_INDEX=false)")
+    
+    # Check if the embedder has seen any documents
+    if not embedder.fitted or not await run_io(vector_store.count):
+        raise HTTPException(
+            status_code=400, 
+            detail="No documents have been processed yet. Please upload PDF files first."
+        )
+    
+    retrievers = None
+    if retriever == "hybrid":
+        results, cached, retrievers = await retrieve_hybrid(questions, fetch_k, timer)
+    elif retriever == "bm25":
+        # Keyword search, no embedding needed
+        cached = [False] * len(questions)
+        results = await retrieve_keywords(questions, fetch_k, timer)
+    else:
+        results, cached = await retrieve_vector(questions, fetch_k, timer)
+    if diversity > 0:
+        with timer.span("diversify"):
+            results = await run_cpu(diversify, results, top_k, diversity)
+    elif fetch_k > top_k:
+        results = {key: [values[:top_k] for values in results[key]] for key in results}
+    vector_contexts = [search_results(results, q) for q in range(len(questions))]
+    
+    # Query knowledge graph for related information
+    with timer.span("graph_query"):
+        contexts = await run_io(graph_contexts, session, questions, [
+            list(set([ctx.paper_id for ctx in vector_context])) for vector_context in vector_contexts
+        ])
+    
+    answers = [
+        AnswerResponse(
+            answer=compose_answer(question, vector_context),
             vector_context=vector_context,
             graph_context=graph_context
         )
+        for question, vector_context, graph_context in zip(questions, vector_contexts, contexts)
+    ]
+    return answers, cached, retrievers
+
+@app.post("/ask", response_model=AnswerResponse)
+async def ask_question(
+    request: QuestionRequest,
+    session: Session = Depends(get_neo4j_session)
+):
+    """Answer question based on research papers"""
+    timer = StageTimer("ask")
+    
+    try:
+        (answer,), (cached,), retrievers = await answer_questions([request.question], request, session, timer)
+        answer.timings = timer.finish(
+            logger,
+            retriever=request.retriever or DEFAULT_RETRIEVER,
+            diversity=request.diversity,
+            retrievers=retrievers,
+            vector_results=len(answer.vector_context),
+            query_cache_hit=cached,
+            graph_results=len(answer.graph_context)
+        )
+        return answer
         
     except HTTPException:
         raise
@@ -423,6 +1493,38 @@ The research discusses {request.question.lower()} with focus on technical approa
         logger.error(f"Error processing question: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
+@app.post("/ask/batch", response_model=List[AnswerResponse])
+async def ask_batch(
+    request: BatchQuestionRequest,
+    session: Session = Depends(get_neo4j_session)
+):
+    """Answer many questions with one embedding call, one search per retriever and one graph query"""
+    if not request.questions:
+        return []
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch")
+    timer = StageTimer("ask_batch")
+    
+    try:
+        answers, cached, retrievers = await answer_questions(request.questions, request, session, timer)
+        timer.finish(
+            logger,
+            questions=len(answers),
+            retriever=request.retriever or DEFAULT_RETRIEVER,
+            diversity=request.diversity,
+            retrievers=retrievers,
+            vector_results=sum(len(answer.vector_context) for answer in answers),
+            query_cache_hits=sum(cached),
+            graph_results=sum(len(answer.graph_context) for answer in answers)
+        )
+        return answers
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing question batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing question batch: {str(e)}")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -431,32 +1533,63 @@ async def health_check():
         "status": "healthy", 
         "service": "GraphRAG Research Assistant API",
         "neo4j": neo4j_status,
-        "vectorizer_fitted": vectorizer_fitted
+        "vectorizer_fitted": embedder.fitted
     }
 
 @app.get("/stats")
 async def get_stats():
     """Get system statistics"""
+    def count_papers() -> int:
+        with driver.session() as session:
+            return session.run("MATCH (p:Paper) RETURN count(p) AS count").single()["count"]
+
     try:
         # Get paper count from Neo4j
         paper_count = 0
         if driver:
-            with driver.session() as session:
-                result = session.run("MATCH (p:Paper) RETURN count(p) AS count")
-                paper_count = result.single()["count"]
+            paper_count = await run_io(count_papers)
         
-        # Get chunk count from ChromaDB
-        chunk_count = collection.count()
+        # Get chunk count from the vector store
+        chunk_count = await run_io(vector_store.count)
         
         return {
             "papers_processed": paper_count,
             "chunks_processed": chunk_count,
-            "vectorizer_fitted": vectorizer_fitted
+            "vectorizer_fitted": embedder.fitted,
+            "embedder": embedder.version,
+            "embedding_cache": embedding_cache.stats(),
+            "query_cache": query_cache.stats(),
+            "keyword_index": keyword_index.stats() if keyword_index is not None else None,
+            "jobs": job_manager.counts()
         }
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         return {"error": str(e)}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Admission control state and latency histograms"""
+    return {
+        "admission": admission.snapshot(),
+        **registry.snapshot()
+    }
+
+@app.on_event("startup")
+def start_background_threads():
+    if REFIT_INTERVAL_MINUTES > 0 and embedder.refittable:
+        threading.Thread(target=refit_periodically, args=(background_stop,), name="refit-schedule", daemon=True).start()
+    if snapshots and PERSIST_INTERVAL_SECONDS > 0:
+        threading.Thread(target=persist_periodically, args=(background_stop,), name="persist", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    background_stop.set()
+    job_manager.shutdown()
+    page_extractor.shutdown()
+    cpu_executor.shutdown()
+    io_executor.shutdown()
+    save_index()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
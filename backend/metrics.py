@@ -0,0 +1,186 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float("inf")
+)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> int:
+        return self._value
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum, max and bucket-interpolated quantiles"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[min(index, len(self._counts) - 1)] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else 0.0
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if not self._count:
+                return 0.0
+            rank = q * self._count
+            seen = 0
+            for i, count in enumerate(self._counts):
+                if seen + count >= rank and count:
+                    lower = self.buckets[i - 1] if i else 0.0
+                    upper = min(self.buckets[i], self._max)
+                    return lower + (upper - lower) * (rank - seen) / count
+                seen += count
+            return self._max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self._count,
+            "sum": round(self._sum, 6),
+            "mean": round(self.mean, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self._max, 6),
+        }
+
+
+class Registry:
+    """Named counters, histograms and callback gauges, exported by /metrics"""
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            return self._counters.setdefault(name, Counter())
+
+    def histogram(self, name: str, buckets: Optional[List[float]] = None) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(buckets or DEFAULT_BUCKETS)
+            return self._histograms[name]
+
+    def gauge(self, name: str, read: Callable[[], float]):
+        with self._lock:
+            self._gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+        return {
+            "counters": {name: counter.snapshot() for name, counter in sorted(counters.items())},
+            "gauges": {name: read() for name, read in sorted(gauges.items())},
+            "histograms": {name: histogram.snapshot() for name, histogram in sorted(histograms.items())},
+        }
+
+
+registry = Registry()
+
+
+class StageTimer:
+    """Per-request timing spans for the stages of a pipeline
+
+    Spans may nest; time is attributed exclusively to the innermost open span,
+    so stage timings add up to the time spent inside spans. Nothing is recorded
+    globally until `finish`, which feeds the `<operation>_<stage>_seconds`
+    histograms and emits one structured log line.
+    """
+
+    def __init__(self, operation: str, registry: Registry = registry):
+        self.operation = operation
+        self.registry = registry
+        self.timings: Dict[str, float] = defaultdict(float)
+        self._stack: List[list] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.timings[parent[0]] += now - parent[1]
+        self._stack.append([stage, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stage, since = self._stack.pop()
+            self.timings[stage] += now - since
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def iterate(self, iterable: Iterable[T], stage: str) -> Iterator[T]:
+        """Attribute the time spent producing each item of an iterable to `stage`"""
+        iterator = iter(iterable)
+        while True:
+            with self.span(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, stage: str, seconds: float):
+        self.timings[stage] += seconds
+
+    def milliseconds(self) -> Dict[str, float]:
+        timings = {stage: round(seconds * 1000, 3) for stage, seconds in self.timings.items()}
+        timings["total"] = round((time.perf_counter() - self._started) * 1000, 3)
+        return timings
+
+    def finish(self, logger: logging.Logger, **fields) -> Dict[str, float]:
+        """Record stage histograms, log one structured line and return timings in ms"""
+        total = time.perf_counter() - self._started
+        for stage, seconds in self.timings.items():
+            self.registry.histogram(f"{self.operation}_{stage}_seconds").observe(seconds)
+        self.registry.histogram(f"{self.operation}_total_seconds").observe(total)
+        timings = self.milliseconds()
+        logger.info(json.dumps({"event": self.operation, **fields, "timings_ms": timings}, default=str))
+        return timings
@@ -0,0 +1,150 @@
+import json
+import mmap
+import os
+import pickle
+import re
+import shutil
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+
+
+def fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: str, payload: bytes):
+    """Write a file so readers see either the old or the new contents, never a mix"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(payload)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(os.path.dirname(path) or ".")
+
+
+def write_json(path: str, value: Any):
+    write_atomic(path, json.dumps(value).encode("utf-8"))
+
+
+def read_json(path: str) -> Any:
+    with open(path, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def read_pickle(path: str) -> Any:
+    with open(path, "rb") as pickle_file:
+        return pickle.load(pickle_file)
+
+
+def append_at(path: str, offset: int, payload: bytes):
+    """Write `payload` at byte `offset` and cut off anything after it
+
+    Column files only ever grow between snapshots; bytes past the offset a
+    snapshot recorded are leftovers of a save that never committed.
+    """
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as column_file:
+        column_file.seek(offset)
+        column_file.write(payload)
+        column_file.truncate()
+        column_file.flush()
+        os.fsync(column_file.fileno())
+
+
+def map_array(path: str, dtype: np.dtype, length: int) -> np.ndarray:
+    """Copy-on-write memory map of the first `length` items of a column file"""
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="c", shape=(length,))
+
+
+class StringColumn:
+    """Append-only list of strings whose persisted prefix can live in a memory map
+
+    Strings loaded from disk are decoded on access from a UTF-8 blob and an
+    offsets array, so opening a large corpus does not read every document.
+    Strings appended afterwards are kept in a plain list.
+    """
+
+    def __init__(self, blob: Optional[mmap.mmap] = None, offsets: Optional[np.ndarray] = None):
+        self._blob = blob
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._mapped = len(self._offsets) - 1
+        self._tail: List[str] = []
+
+    @classmethod
+    def open(cls, blob_path: str, offsets_path: str, length: int) -> "StringColumn":
+        offsets = map_array(offsets_path, np.int64, length + 1) if length else None
+        if not length or offsets[-1] == 0:
+            return cls(None, offsets)
+        with open(blob_path, "rb") as blob_file:
+            blob = mmap.mmap(blob_file.fileno(), int(offsets[-1]), access=mmap.ACCESS_READ)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return self._mapped + len(self._tail)
+
+    def __getitem__(self, index: int) -> str:
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index >= self._mapped:
+            return self._tail[index - self._mapped]
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._blob[start:end].decode("utf-8") if self._blob is not None else ""
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def extend(self, items: Iterable[str]):
+        self._tail.extend(items)
+
+
+class SnapshotDirectory:
+    """Numbered snapshot directories under `root`, committed through a CURRENT file
+
+    A snapshot is written into a fresh directory and only becomes visible once
+    CURRENT names it, so a crash mid-save leaves the previous snapshot intact.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.root, "CURRENT")
+
+    def latest(self) -> Optional[str]:
+        if not os.path.exists(self.current_path):
+            return None
+        with open(self.current_path, encoding="utf-8") as current_file:
+            name = current_file.read().strip()
+        return os.path.join(self.root, name) if name else None
+
+    def create(self) -> str:
+        numbers = [
+            int(match.group(1))
+            for match in (re.fullmatch(r"snapshot-(\d+)", name) for name in os.listdir(self.root))
+            if match
+        ]
+        path = os.path.join(self.root, f"snapshot-{max(numbers, default=0) + 1:06d}")
+        os.makedirs(path)
+        return path
+
+    def commit(self, path: str):
+        for name in os.listdir(path):
+            with open(os.path.join(path, name), "rb") as written:
+                os.fsync(written.fileno())
+        fsync_directory(path)
+        write_atomic(self.current_path, os.path.basename(path).encode("utf-8"))
+        for name in os.listdir(self.root):
+            stale = os.path.join(self.root, name)
+            if name.startswith("snapshot-") and stale != path:
+                shutil.rmtree(stale, ignore_errors=True)
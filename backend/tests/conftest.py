@@ -0,0 +1,74 @@
+import math
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+# Backend modules import each other by name, as when run from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25 import tokenize
+from vector_store import top_k
+
+
+def corpus(papers: int, chunks_per_paper: int, seed: int = 0, vocabulary: int = 60, skewed: bool = False):
+    """Ids, documents and metadatas of random chunks over `vocabulary` words
+
+    Skewed corpora draw words by a Zipf-like law and vary the chunk length,
+    so posting lists differ in length.
+    """
+    words = [f"word{i}" for i in range(vocabulary)]
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    rng = np.random.default_rng(seed)
+    ids, documents, metadatas = [], [], []
+    for paper in range(papers):
+        for chunk in range(chunks_per_paper):
+            ids.append(f"paper{paper}_{chunk}")
+            if skewed:
+                documents.append(" ".join(rng.choice(words, size=rng.integers(5, 20), p=weights)))
+            else:
+                documents.append(" ".join(rng.choice(words, size=12)))
+            metadatas.append({"paper_id": f"paper{paper}", "chunk_index": chunk})
+    return ids, documents, metadatas
+
+
+def add_papers(target, ids, documents, metadatas, embedder=None, batch_size: int = 7):
+    """Add chunks in batches, embedding them first when `embedder` is given"""
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        if embedder is None:
+            target.add(ids[start:end], documents[start:end], metadatas[start:end])
+        else:
+            target.add(ids[start:end], embedder.embed(documents[start:end]), documents[start:end], metadatas[start:end])
+
+
+def brute_force_cosine(embedder, documents, questions, n_results):
+    """Ids of the best rows by exact cosine, and their distances"""
+    rows = embedder.embed(documents)
+    queries = embedder.embed(questions)
+    if sp.issparse(rows):
+        rows, queries = rows.toarray(), queries.toarray()
+    scores = queries @ rows.T
+    return top_k(scores, n_results), 1.0 - scores
+
+
+def brute_force_bm25(documents, question, n_results, k1=1.2, b=0.75):
+    """Distances of the best documents by BM25, scoring every document in turn"""
+    tokens = [Counter(tokenize(document)) for document in documents]
+    average_length = sum(sum(counts.values()) for counts in tokens) / len(documents)
+    idf = {}
+    for term, count in Counter(tokenize(question)).items():
+        doc_freq = sum(term in counts for counts in tokens)
+        if doc_freq:
+            idf[term] = math.log(1 + (len(documents) - doc_freq + 0.5) / (doc_freq + 0.5)) * count
+    scores = []
+    for counts in tokens:
+        norm = k1 * (1 - b + b * sum(counts.values()) / average_length)
+        score = sum(weight * counts[term] * (k1 + 1) / (counts[term] + norm) for term, weight in idf.items())
+        if score > 0:
+            scores.append(score)
+    ceiling = sum(idf.values()) * (k1 + 1)
+    return [1 - score / ceiling for score in sorted(scores, reverse=True)[:n_results]]
@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from metrics import Registry
+
+
+def test_tickets_beyond_the_queue_are_rejected():
+    admission = AdmissionController(max_concurrent=1, max_queued=2, memory_budget_bytes=100, registry=Registry())
+    admission.enqueue(10)
+    admission.enqueue(10)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.enqueue(10)
+    assert rejected.value.retry_after >= 1
+    with pytest.raises(AdmissionRejected):
+        admission.check()
+
+
+def test_a_ticket_waits_for_memory_but_runs_alone_when_oversized():
+    admission = AdmissionController(max_concurrent=2, max_queued=4, memory_budget_bytes=100, registry=Registry())
+    first, second = admission.enqueue(80), admission.enqueue(500)
+    started, finish = threading.Event(), threading.Event()
+
+    def run_second():
+        with admission.admit(second):
+            started.set()
+            finish.wait(1)
+
+    with admission.admit(first):
+        waiter = threading.Thread(target=run_second)
+        waiter.start()
+        assert not started.wait(0.1)
+        assert admission.snapshot()["queued"] == 1
+    assert started.wait(1)
+    assert admission.running == 1 and admission.memory_reserved == 500
+    finish.set()
+    waiter.join(1)
+    assert admission.running == 0 and admission.memory_reserved == 0
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+from conftest import add_papers, brute_force_bm25, corpus
+
+QUESTIONS = ["word0 word1", "word3 word17 word29", "word39 word38 word2 word0", "word12 word12 word5", "unseen word"]
+
+
+def assert_pruned_matches_exhaustive(index, n_results=5):
+    # Distances rather than ids, as rows with tied scores may come in either order
+    pruned = index.query(QUESTIONS, n_results=n_results)["distances"]
+    exhaustive = index.query(QUESTIONS, n_results=n_results, prune=False)["distances"]
+    for q in range(len(QUESTIONS)):
+        assert len(pruned[q]) == len(exhaustive[q])
+        np.testing.assert_allclose(pruned[q], exhaustive[q], rtol=1e-5, atol=1e-6)
+
+
+def test_exhaustive_query_matches_brute_force():
+    index = BM25Index()
+    ids, documents, metadatas = corpus(4, 10, vocabulary=40, skewed=True)
+    add_papers(index, ids, documents, metadatas)
+    results = index.query(QUESTIONS, n_results=5, prune=False)
+    for q, question in enumerate(QUESTIONS):
+        np.testing.assert_allclose(results["distances"][q], brute_force_bm25(documents, question, 5), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("n_results", [1, 5, 12])
+def test_pruned_matches_exhaustive_across_delete_compaction_and_reload(n_results, tmp_path):
+    index = BM25Index(merge_factor=2)
+    ids, documents, metadatas = corpus(4, 10, vocabulary=40, skewed=True)
+    add_papers(index, ids, documents, metadatas)
+    assert len(index._segments) > 1
+    assert_pruned_matches_exhaustive(index, n_results)
+
+    index.delete("paper0")
+    assert_pruned_matches_exhaustive(index, n_results)
+    (tmp_path / "snapshot-1").mkdir()
+    state = index.save(str(tmp_path), str(tmp_path / "snapshot-1"))
+    index.delete("paper1")
+    # More than a quarter of the rows are deleted, so the index compacted
+    assert index._chunks.rows == 20
+    assert_pruned_matches_exhaustive(index, n_results)
+
+    loaded = BM25Index.load(str(tmp_path), str(tmp_path / "snapshot-1"), state)
+    assert loaded.count() == 30
+    assert_pruned_matches_exhaustive(loaded, n_results)
+
+    (tmp_path / "snapshot-2").mkdir()
+    state = index.save(str(tmp_path), str(tmp_path / "snapshot-2"))
+    loaded = BM25Index.load(str(tmp_path), str(tmp_path / "snapshot-2"), state)
+    assert loaded.query(QUESTIONS, n_results=n_results) == index.query(QUESTIONS, n_results=n_results)
+
+    # Rows added after a reload land in new segments next to the mapped ones
+    more_ids, more_documents, more_metadatas = corpus(6, 10, seed=1, vocabulary=40, skewed=True)
+    add_papers(loaded, more_ids[50:], more_documents[50:], more_metadatas[50:])
+    add_papers(index, more_ids[50:], more_documents[50:], more_metadatas[50:])
+    assert_pruned_matches_exhaustive(loaded, n_results)
+    assert loaded.query(QUESTIONS, n_results=n_results) == index.query(QUESTIONS, n_results=n_results)
+
+
+def test_terms_compacted_away_keep_the_kth_candidate():
+    index = BM25Index()
+    index.add(["gone_0"], ["zebra word0"], [{"paper_id": "gone", "chunk_index": 0}])
+    index.add(
+        ["kept_0", "kept_1"],
+        ["word0 word1", "word0 word2 word3"],
+        [{"paper_id": "kept", "chunk_index": 0}, {"paper_id": "kept", "chunk_index": 1}]
+    )
+    index.delete("gone")
+    # The term is still known, but compaction left it without postings
+    assert index._chunks.rows == 2
+    assert "zebra" in index._term_ids
+
+    pruned = index.query(["zebra word0"], n_results=2)
+    assert sorted(pruned["ids"][0]) == ["kept_0", "kept_1"]
+    assert pruned == index.query(["zebra word0"], n_results=2, prune=False)
+
+
+def test_paper_filter_only_ranks_that_papers_rows():
+    index = BM25Index()
+    ids, documents, metadatas = corpus(3, 5, vocabulary=40, skewed=True)
+    add_papers(index, ids, documents, metadatas)
+    results = index.query(["word0 word1 word2"], n_results=10, paper_ids=["paper1"])
+    assert results["ids"][0]
+    assert all(chunk_id.startswith("paper1_") for chunk_id in results["ids"][0])
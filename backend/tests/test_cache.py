@@ -0,0 +1,87 @@
+import numpy as np
+import scipy.sparse as sp
+
+from benchmarks.fake_embedder import FakeEmbedder
+from cache import EmbeddingCache, QueryCache
+from embeddings import TfidfEmbedder
+from metrics import Registry
+
+
+class CountingEmbedder(FakeEmbedder):
+    def __init__(self):
+        super().__init__(dimension=16)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_only_missing_chunks_reach_the_embedder():
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(1024 * 1024, Registry())
+    first = cache.embed(embedder, ["alpha beta", "gamma", "alpha beta"])
+    assert embedder.embedded == ["alpha beta", "gamma"]
+
+    second = cache.embed(embedder, ["gamma", "delta", "alpha beta"])
+    assert embedder.embedded == ["alpha beta", "gamma", "delta"]
+    assert np.allclose(second[0], first[1])
+    assert np.allclose(second[2], first[0])
+    assert np.allclose(second, embedder.embed(["gamma", "delta", "alpha beta"]))
+    assert cache.stats()["hits"] == 2
+
+
+def test_least_recently_used_rows_are_evicted():
+    embedder = CountingEmbedder()
+    row_bytes = EmbeddingCache.entry_overhead + 16 * 4
+    cache = EmbeddingCache(2 * row_bytes, Registry())
+    cache.embed(embedder, ["a", "b"])
+    cache.embed(embedder, ["a"])
+    cache.embed(embedder, ["c"])
+    embedder.embedded.clear()
+    cache.embed(embedder, ["a", "b", "c"])
+    assert embedder.embedded == ["b"]
+    assert cache.bytes <= cache.budget_bytes
+
+
+def test_sparse_rows_survive_a_reload(tmp_path):
+    embedder = TfidfEmbedder(max_features=50)
+    texts = [f"chunk about topic{i} and topic{i + 1} with shared words" for i in range(20)]
+    cache = EmbeddingCache(1024 * 1024, Registry())
+    embedded = cache.embed(embedder, texts)
+    cache.save(str(tmp_path / "cache.npz"))
+
+    reloaded = EmbeddingCache(1024 * 1024, Registry())
+    reloaded.load(str(tmp_path / "cache.npz"))
+    cached = reloaded.embed(embedder, texts[::-1])
+    assert reloaded.stats()["hits"] == len(texts)
+    assert sp.issparse(cached)
+    assert np.allclose(cached.toarray(), embedded.toarray()[::-1])
+
+
+def test_a_new_embedder_version_misses():
+    cache = EmbeddingCache(1024 * 1024, Registry())
+    cache.embed(FakeEmbedder(dimension=8), ["text"])
+    assert cache.embed(FakeEmbedder(dimension=4), ["text"]).shape == (1, 4)
+
+
+def test_query_results_go_stale_with_the_corpus():
+    cache = QueryCache(2, 600, Registry())
+    vector = np.ones((1, 3))
+    cache.store("What  is BM25?", 5, "v1", vector, 7, {"ids": [["a"]]})
+    assert cache.lookup("what is bm25?", 5, "v1", 7) == (vector, {"ids": [["a"]]})
+    stale_vector, stale_results = cache.lookup("what is bm25?", 5, "v1", 8)
+    assert stale_vector is vector and stale_results is None
+    assert cache.lookup("what is bm25?", 5, "v2", 7) == (None, None)
+    assert cache.lookup("what is bm25?", 10, "v1", 7) == (None, None)
+
+
+def test_fused_results_are_cached_apart_from_vector_results():
+    cache = QueryCache(4, 600, Registry())
+    vector = np.ones((1, 3))
+    cache.store("what is bm25?", 20, "v1", vector, 7, {"ids": [["a"]]})
+    cache.store("what is bm25?", 20, "v1", None, 7, {"ids": [["b"]]}, retriever="hybrid")
+    assert cache.lookup("what is bm25?", 20, "v1", 7) == (vector, {"ids": [["a"]]})
+    assert cache.lookup("what is bm25?", 20, "v1", 7, retriever="hybrid") == (None, {"ids": [["b"]]})
+    assert cache.lookup("what is bm25?", 20, "v1", 8, retriever="hybrid") == (None, None)
+    assert cache.lookup("what is bm25?", 5, "v1", 7, retriever="hybrid") == (None, None)
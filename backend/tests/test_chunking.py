@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from chunking import StreamingChunker, batched
+
+
+def reference_chunks(text: str, chunk_size: int = 500, overlap: int = 50):
+    """The original chunk_text, stopping at the first chunk that reaches the end of the text"""
+    if len(text) > 20000:
+        chunk_size, overlap = 1000, 100
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start = end - overlap
+    return chunks
+
+
+def split_pages(text: str, rng: random.Random):
+    pages, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(0, 3000)
+        pages.append(text[start:end])
+        start = end
+    return pages
+
+
+def new_chunker() -> StreamingChunker:
+    return StreamingChunker(chunk_size=500, overlap=50, large_text_threshold=20000)
+
+
+@pytest.mark.parametrize("length", [0, 1, 450, 500, 501, 950, 951, 5000, 19999, 20000, 20001, 73421])
+def test_streamed_pages_match_chunking_the_joined_text(length):
+    rng = random.Random(length)
+    text = "".join(rng.choice("abcde \n") for _ in range(length))
+    expected = reference_chunks(text)
+    assert list(new_chunker().chunks([text])) == expected
+    assert list(new_chunker().chunks(split_pages(text, rng))) == expected
+
+
+def test_chunks_are_emitted_before_the_text_ends():
+    chunker = StreamingChunker(chunk_size=10, overlap=2)
+    assert list(chunker.feed("a" * 25)) == ["a" * 10, "a" * 10]
+    assert list(chunker.finish()) == ["a" * 9]
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        StreamingChunker(chunk_size=50, overlap=50)
+
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
@@ -0,0 +1,93 @@
+import threading
+
+from dedup import ContentHashIndex, TextHasher, hash_text
+
+
+def test_text_hash_ignores_page_splits_case_and_whitespace():
+    hasher = TextHasher()
+    for page in ["Attention  is\n", "all you", "", "  NEED\n"]:
+        hasher.update(page)
+    assert hasher.hexdigest() == hash_text("attention is all you need")
+
+
+def test_claim_returns_the_stored_paper():
+    index = ContentHashIndex()
+    assert index.claim("bytes") is None
+    index.add({"paper_id": "p1"}, "bytes", "text")
+    assert index.claim("bytes") == {"paper_id": "p1"}
+    assert index.lookup(None, "text") == {"paper_id": "p1"}
+    assert index.version == 1
+
+
+def test_claim_waits_for_the_worker_holding_the_hash():
+    index = ContentHashIndex()
+    assert index.claim("bytes") is None
+    claimed = []
+    waiter = threading.Thread(target=lambda: claimed.append(index.claim("bytes")))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    index.add({"paper_id": "p1"}, "bytes")
+    waiter.join(1)
+    assert claimed == [{"paper_id": "p1"}]
+
+
+def test_release_hands_the_hash_to_the_next_worker():
+    index = ContentHashIndex()
+    assert index.claim("bytes") is None
+    claimed = []
+    waiter = threading.Thread(target=lambda: claimed.append(index.claim("bytes")))
+    waiter.start()
+    index.release("bytes")
+    waiter.join(1)
+    # The first worker failed, so the waiter now owns the hash
+    assert claimed == [None]
+    index.release("bytes")
+
+
+def test_records_round_trip():
+    index = ContentHashIndex()
+    index.add({"paper_id": "p1"}, "a", "b")
+    loaded = ContentHashIndex()
+    loaded.load(index.records())
+    assert loaded.lookup("b") == {"paper_id": "p1"}
+
+
+def test_try_claim_never_waits():
+    index = ContentHashIndex()
+    assert index.try_claim("bytes") == (None, True)
+    assert index.try_claim("bytes") == (None, False)
+    index.add({"paper_id": "p1"}, "bytes")
+    assert index.try_claim("bytes") == ({"paper_id": "p1"}, False)
+
+
+def test_batches_claiming_in_opposite_orders_do_not_deadlock():
+    index = ContentHashIndex()
+    step = threading.Barrier(2, timeout=1)
+    outcomes = {}
+
+    def batch(name, hashes):
+        # Claims are held until the whole batch is stored, as in process_pdf_batch
+        claimed, in_flight = [], []
+        for content_hash in hashes:
+            existing, owned = index.try_claim(content_hash)
+            if owned:
+                claimed.append(content_hash)
+            elif existing is None:
+                in_flight.append(content_hash)
+            step.wait()
+        for content_hash in claimed:
+            index.add({"paper_id": f"{name}-{content_hash}"}, content_hash)
+        outcomes[name] = [index.claim(content_hash) for content_hash in in_flight]
+
+    threads = [
+        threading.Thread(target=batch, args=("a", ["x", "y"]), daemon=True),
+        threading.Thread(target=batch, args=("b", ["y", "x"]), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert not any(thread.is_alive() for thread in threads)
+    assert outcomes == {"a": [{"paper_id": "b-y"}], "b": [{"paper_id": "a-x"}]}
@@ -0,0 +1,65 @@
+import pickle
+
+import numpy as np
+
+from embeddings import TfidfEmbedder
+from vector_store import DenseVectorStore
+
+DOCUMENTS = [
+    "graph neural networks learn node embeddings",
+    "random forests average many decision trees",
+    "attention lets transformer models weigh tokens",
+    "convolutional networks share weights across images",
+    "gradient boosting fits trees to residual errors",
+    "recurrent networks carry state across tokens",
+    "support vector machines maximise the margin",
+    "reinforcement learning agents maximise reward",
+    "knowledge graphs link entities by relations",
+    "topic models describe documents as word mixtures",
+]
+
+
+def test_lsa_fitted_on_one_chunk_keeps_its_dimension():
+    embedder = TfidfEmbedder(lsa_components=4)
+    vectors = embedder.embed(DOCUMENTS[:1])
+    assert vectors.shape == (1, 4)
+    assert embedder.dimension == 4
+    assert embedder.needs_more_chunks
+    assert embedder.embed_queries(["graph networks"]).shape == (1, 4)
+
+
+def test_lsa_fitted_on_few_chunks_pads_the_missing_components():
+    embedder = TfidfEmbedder(lsa_components=8)
+    vectors = embedder.embed(DOCUMENTS[:3])
+    assert vectors.shape == (3, 8)
+    assert embedder.svd.n_components == 2
+    assert not vectors[:, 2:].any()
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+    # Later chunks go into the same store as the first ones
+    store = DenseVectorStore()
+    store.add(["a", "b", "c"], vectors, DOCUMENTS[:3], [{"paper_id": "p", "chunk_index": i} for i in range(3)])
+    store.add(["d"], embedder.embed(DOCUMENTS[3:4]), DOCUMENTS[3:4], [{"paper_id": "p", "chunk_index": 3}])
+    assert store.count() == 4
+
+
+def test_refit_on_enough_chunks_fits_every_component():
+    embedder = TfidfEmbedder(lsa_components=4).refit(DOCUMENTS)
+    assert embedder.svd.n_components == 4
+    assert not embedder.needs_more_chunks
+    assert embedder.embed(DOCUMENTS).shape == (len(DOCUMENTS), 4)
+
+
+def test_sparse_tfidf_never_needs_more_chunks():
+    embedder = TfidfEmbedder()
+    embedder.embed(DOCUMENTS[:1])
+    assert not embedder.needs_more_chunks
+    assert embedder.dimension == len(embedder.vectorizer.vocabulary_)
+
+
+def test_pickled_embedder_embeds_the_same():
+    embedder = TfidfEmbedder(lsa_components=4)
+    embedder.embed(DOCUMENTS)
+    restored = pickle.loads(pickle.dumps(embedder))
+    assert restored.version == embedder.version
+    np.testing.assert_array_equal(restored.embed_queries(DOCUMENTS[:2]), embedder.embed_queries(DOCUMENTS[:2]))
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from fusion import maximal_marginal_relevance, parse_fusion_weights, reciprocal_rank_fusion
+
+
+def ranking(*chunk_ids, distance: float = 0.5):
+    return {
+        "ids": [list(chunk_ids)],
+        "documents": [[f"text of {chunk_id}" for chunk_id in chunk_ids]],
+        "metadatas": [[{"paper_id": chunk_id[0]} for chunk_id in chunk_ids]],
+        "distances": [[distance] * len(chunk_ids)],
+    }
+
+
+def test_chunks_several_retrievers_agree_on_rank_first():
+    fused = reciprocal_rank_fusion({
+        "vector": ranking("a1", "b1", "c1"),
+        "bm25": ranking("c1", "d1", "b1"),
+    }, n_results=3, k=60)
+    assert fused["ids"] == [["c1", "b1", "a1"]]
+    assert fused["sources"][0][0] == {"vector": 3, "bm25": 1}
+    assert fused["scores"][0][0] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused["documents"][0][0] == "text of c1"
+
+
+def test_weights_scale_each_retriever():
+    fused = reciprocal_rank_fusion({
+        "vector": ranking("a1", "b1"),
+        "graph": ranking("b1", "a1"),
+    }, n_results=2, k=60, weights={"vector": 1.0, "graph": 0.5})
+    assert fused["ids"] == [["a1", "b1"]]
+
+
+def test_distances_follow_the_fused_score_not_the_retrievers_scales():
+    fused = reciprocal_rank_fusion({
+        "vector": ranking("a1", "b1", distance=0.6),
+        "bm25": ranking("a1", "c1", distance=0.01),
+    }, n_results=3, k=60)
+    # Ranked first by every retriever is the best fused score possible
+    assert fused["ids"] == [["a1", "b1", "c1"]]
+    assert fused["distances"][0][0] == pytest.approx(0.0)
+    # Second by one retriever scores the same whichever scale it uses
+    assert fused["distances"][0][1] == pytest.approx(fused["distances"][0][2])
+    assert fused["distances"][0][1] == pytest.approx(1 - (1 / 62) / (2 / 61))
+
+
+def test_mmr_without_diversity_keeps_relevance_order():
+    vectors = np.random.default_rng(0).standard_normal((6, 8))
+    relevance = np.array([0.2, 0.9, 0.5, 0.7, 0.1, 0.3])
+    assert maximal_marginal_relevance(relevance, vectors, k=4, diversity=0.0).tolist() == [1, 3, 2, 5]
+
+
+def pairwise_mmr(relevance, vectors, k, diversity):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = []
+    while len(picked) < k:
+        best, best_score = None, -np.inf
+        for i in range(len(relevance)):
+            if i in picked:
+                continue
+            redundancy = max((vectors[i] @ vectors[j] for j in picked), default=0.0)
+            score = (1 - diversity) * relevance[i] - diversity * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+    return picked
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_mmr_matches_a_pairwise_loop(sparse):
+    rng = np.random.default_rng(1)
+    vectors = np.abs(rng.standard_normal((30, 40))) * (rng.random((30, 40)) < 0.2)
+    vectors[:, 0] += 0.01
+    relevance = rng.random(30)
+    given = sp.csr_matrix(vectors) if sparse else vectors
+    assert maximal_marginal_relevance(relevance, given, k=8, diversity=0.6).tolist() == pairwise_mmr(relevance, vectors, 8, 0.6)
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1.0, 0.0], [0.999, 0.01], [0.0, 1.0]])
+    relevance = np.array([1.0, 0.95, 0.6])
+    assert maximal_marginal_relevance(relevance, vectors, k=2, diversity=0.5).tolist() == [0, 2]
+
+
+def test_fusion_weights_are_parsed_and_validated():
+    assert parse_fusion_weights("vector=1, bm25=0.5,graph=0") == {"vector": 1.0, "bm25": 0.5, "graph": 0.0}
+    for value in ["vector", "vector=", "vector=high", "=1", "bm25=-1", "graph=inf", ""]:
+        with pytest.raises(ValueError, match="retriever=weight"):
+            parse_fusion_weights(value)
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from benchmarks.fake_embedder import FakeEmbedder
+from conftest import add_papers, brute_force_cosine, corpus
+from embeddings import HashingEmbedder
+from vector_store import DenseVectorStore, SparseVectorStore, merge_rows, top_k
+
+
+def new_sparse():
+    return SparseVectorStore()
+
+
+def new_dense():
+    return DenseVectorStore()
+
+
+def new_int8():
+    return DenseVectorStore(precision="int8", rescore=4)
+
+
+STORES = {"sparse": new_sparse, "dense": new_dense, "int8": new_int8}
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_query_matches_brute_force(kind):
+    embedder = FakeEmbedder(dimension=32)
+    store = STORES[kind]()
+    ids, documents, metadatas = corpus(4, 10)
+    add_papers(store, ids, documents, metadatas, embedder=embedder)
+    questions = documents[:3] + ["word1 word2 word3"]
+
+    results = store.query(embedder.embed_queries(questions), n_results=5)
+    best, distances = brute_force_cosine(embedder, documents, questions, 5)
+    for q in range(len(questions)):
+        expected = [ids[i] for i in best[q]]
+        assert results["ids"][q][0] == expected[0]
+        assert np.allclose(results["distances"][q], distances[q][best[q]], atol=2e-2 if kind == "int8" else 1e-5)
+        assert results["documents"][q] == [documents[ids.index(chunk_id)] for chunk_id in results["ids"][q]]
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_delete_compact_save_load_round_trip(kind, tmp_path):
+    embedder = FakeEmbedder(dimension=32)
+    store = STORES[kind]()
+    ids, documents, metadatas = corpus(4, 10)
+    add_papers(store, ids, documents, metadatas, embedder=embedder)
+    questions = embedder.embed_queries(["word1 word2", "word7 word9 word11", documents[25]])
+
+    store.delete("paper0")
+    assert store.count() == 30
+    (tmp_path / "snapshot-1").mkdir()
+    state = store.save(str(tmp_path), str(tmp_path / "snapshot-1"))
+    store.delete("paper1")
+    # More than a quarter of the rows are deleted, so the store compacted
+    assert store._chunks.rows == 20
+    assert all(not chunk_id.startswith(("paper0_", "paper1_")) for chunk_id in store.items()[0])
+
+    loaded = type(store).load(str(tmp_path), str(tmp_path / "snapshot-1"), state)
+    assert loaded.count() == 30
+    assert sorted(loaded.items()[0]) == sorted(ids[10:])
+
+    (tmp_path / "snapshot-2").mkdir()
+    state = store.save(str(tmp_path), str(tmp_path / "snapshot-2"))
+    loaded = type(store).load(str(tmp_path), str(tmp_path / "snapshot-2"), state)
+    assert loaded.query(questions, n_results=5) == store.query(questions, n_results=5)
+
+    # Rows added after a reload append to the saved columns
+    more_ids, more_documents, more_metadatas = corpus(6, 10, seed=1)
+    add_papers(loaded, more_ids[50:], more_documents[50:], more_metadatas[50:], embedder=embedder)
+    add_papers(store, more_ids[50:], more_documents[50:], more_metadatas[50:], embedder=embedder)
+    (tmp_path / "snapshot-3").mkdir()
+    state = loaded.save(str(tmp_path), str(tmp_path / "snapshot-3"))
+    reloaded = type(store).load(str(tmp_path), str(tmp_path / "snapshot-3"), state)
+    assert reloaded.count() == 30
+    assert reloaded.query(questions, n_results=5) == store.query(questions, n_results=5)
+
+
+def test_hashing_rows_are_weighted_by_the_live_idf(tmp_path):
+    embedder = HashingEmbedder(n_features=2 ** 12)
+    store = SparseVectorStore(idf_weighting=True)
+    ids, documents, metadatas = corpus(3, 10)
+    add_papers(store, ids, documents, metadatas, embedder=embedder)
+    store.delete("paper2")
+
+    live = documents[:20]
+    tf = embedder.embed(live).toarray()
+    doc_freq = (tf > 0).sum(axis=0)
+    idf = np.log((1 + len(live)) / (1 + doc_freq)) + 1
+    rows = tf * idf
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    query = embedder.embed(["word3 word4 word5"]).toarray() * idf
+    scores = (rows @ (query / np.linalg.norm(query)).T)[:, 0]
+
+    results = store.query(embedder.embed_queries(["word3 word4 word5"]), n_results=3)
+    assert np.allclose(results["distances"][0], 1.0 - np.sort(scores)[::-1][:3], atol=1e-5)
+
+    (tmp_path / "snapshot").mkdir()
+    state = store.save(str(tmp_path), str(tmp_path / "snapshot"))
+    loaded = SparseVectorStore.load(str(tmp_path), str(tmp_path / "snapshot"), state)
+    assert loaded.query(embedder.embed_queries(["word3 word4 word5"]), n_results=3) == results
+
+    # Stored vectors carry the same weighting as the scores
+    vectors, found = store.vectors(ids[:20], metadatas[:20])
+    assert found.all()
+    vectors = vectors.toarray()
+    assert np.allclose(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), rows, atol=1e-5)
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_stored_vectors_are_returned_by_id(kind):
+    embedder = FakeEmbedder(dimension=32)
+    store = STORES[kind]()
+    ids, documents, metadatas = corpus(3, 10)
+    add_papers(store, ids, documents, metadatas, embedder=embedder)
+    store.delete("paper1")
+
+    # Out of order, repeated, and partly deleted
+    wanted = [25, 3, 12, 3, 0]
+    vectors, found = store.vectors([ids[i] for i in wanted], [metadatas[i] for i in wanted])
+    assert found.tolist() == [True, True, False, True, True]
+    expected = embedder.embed([documents[i] for i in wanted if found[wanted.index(i)]])
+    if sp.issparse(vectors):
+        vectors = vectors.toarray()
+    # int8 stores keep the float32 rows for rescoring
+    assert np.allclose(vectors, expected, atol=1e-5)
+
+
+def test_int8_store_without_rescoring_returns_dequantized_vectors():
+    embedder = FakeEmbedder(dimension=32)
+    store = DenseVectorStore(precision="int8")
+    ids, documents, metadatas = corpus(1, 5)
+    add_papers(store, ids, documents, metadatas, embedder=embedder)
+    vectors, found = store.vectors(ids, metadatas)
+    assert found.all()
+    assert np.allclose(vectors, embedder.embed(documents), atol=0.01)
+
+
+def test_merge_rows_interleaves_sparse_and_dense_rows():
+    found = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+    rest = sp.csr_matrix(np.array([[2.0, 2.0]], dtype=np.float32))
+    merged = merge_rows(found, np.array([True, False, True]), rest)
+    assert merged.tolist() == [[1.0, 0.0], [2.0, 2.0], [0.0, 1.0]]
+
+
+def test_dimension_mismatch_is_rejected():
+    store = DenseVectorStore()
+    store.add(["a"], np.ones((1, 4), dtype=np.float32), ["a"], [{"paper_id": "p"}])
+    with pytest.raises(ValueError):
+        store.add(["b"], np.ones((1, 5), dtype=np.float32), ["b"], [{"paper_id": "p"}])
+
+
+def test_top_k_orders_each_row():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [1.0, 0.0, 0.2, 0.3]])
+    assert top_k(scores, 2).tolist() == [[1, 3], [0, 3]]
+    assert top_k(scores, 10).shape == (2, 4)
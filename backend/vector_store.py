@@ -0,0 +1,825 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+from persistence import StringColumn, append_at, map_array
+
+logger = logging.getLogger(__name__)
+
+Vectors = Union[np.ndarray, sp.spmatrix]
+
+
+def empty_result(n_queries: int) -> dict:
+    return {
+        "ids": [[] for _ in range(n_queries)],
+        "documents": [[] for _ in range(n_queries)],
+        "metadatas": [[] for _ in range(n_queries)],
+        "distances": [[] for _ in range(n_queries)],
+    }
+
+
+def stack_rows(rows: List[Vectors]) -> Vectors:
+    """Stack one-row query vectors, sparse or dense, into one matrix"""
+    if sp.issparse(rows[0]):
+        return sp.vstack(rows, format="csr")
+    return np.vstack(rows)
+
+
+def merge_rows(found: Vectors, mask: np.ndarray, rest: Vectors) -> Vectors:
+    """One matrix holding the rows of `found` where `mask` is set and those of `rest` elsewhere"""
+    if sp.issparse(found) != sp.issparse(rest):
+        found, rest = (rows.toarray() if sp.issparse(rows) else rows for rows in (found, rest))
+    order = np.argsort(np.concatenate([np.flatnonzero(mask), np.flatnonzero(~mask)]), kind="stable")
+    return stack_rows([found, rest])[order]
+
+
+def grow(array: np.ndarray, capacity: int, used: int) -> np.ndarray:
+    """Copy the first `used` rows into a new array of `capacity` rows
+
+    A new array is allocated instead of resizing in place, so readers holding
+    a view of the old one are unaffected.
+    """
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+def save_chunk_columns(
+    prefix: str,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[dict],
+    saved_rows: int,
+    rows: int,
+    saved_document_bytes: int,
+    saved_row_bytes: int
+) -> Tuple[int, int]:
+    """Append documents, ids and metadatas of rows `saved_rows:rows` to the column files
+
+    Returns the new sizes of the documents and rows files.
+    """
+    encoded = [documents[i].encode("utf-8") for i in range(saved_rows, rows)]
+    offsets = saved_document_bytes + np.cumsum([0] + [len(document) for document in encoded], dtype=np.int64)
+    append_at(f"{prefix}.documents", saved_document_bytes, b"".join(encoded))
+    append_at(f"{prefix}.offsets", saved_rows * 8, offsets.tobytes())
+
+    row_lines = "".join(
+        json.dumps({"id": ids[i], "metadata": metadatas[i]}) + "\n" for i in range(saved_rows, rows)
+    ).encode("utf-8")
+    append_at(f"{prefix}.rows", saved_row_bytes, row_lines)
+    return int(offsets[-1]), saved_row_bytes + len(row_lines)
+
+
+class ChunkRows:
+    """Ids, documents and metadatas of an index's rows, and which rows are live
+
+    The in-process vector stores and the keyword index keep their own
+    per-row data (vectors, postings) next to one of these. Rows are
+    appended, deleted a paper at a time by masking them out, and dropped
+    by compaction, which the owner applies to its own data through the
+    returned row numbers. Owners serialize writers and read `rows` together
+    with the lists under their own lock; the lists only ever grow, and the
+    live mask is replaced rather than changed in place, so a reader can keep
+    using what it read.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.live = np.zeros(initial_capacity, dtype=bool)
+        self.rows = 0
+        self.deleted = 0
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[dict] = []
+        self.by_paper: Dict[str, List[int]] = {}
+        # Bumped on every append, delete and compaction
+        self.generation = 0
+
+    def count(self) -> int:
+        return self.rows - self.deleted
+
+    def append(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """Add rows whose per-row data the owner has already written"""
+        start, end = self.rows, self.rows + len(ids)
+        if end > len(self.live):
+            self.live = grow(self.live, max(end, 2 * len(self.live)), start)
+        self.live[start:end] = True
+        for offset, metadata in enumerate(metadatas):
+            self.by_paper.setdefault(metadata.get("paper_id"), []).append(start + offset)
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        # Publish the rows only once everything they refer to is in place
+        self.rows = end
+        self.generation += 1
+
+    def delete(self, paper_id: str) -> List[int]:
+        """Mask out a paper's rows and return them, none if the paper has no rows"""
+        rows = self.by_paper.pop(paper_id, [])
+        if rows:
+            live = self.live.copy()
+            live[rows] = False
+            self.live = live
+            self.deleted += len(rows)
+            self.generation += 1
+        return rows
+
+    def needs_compaction(self, ratio: float) -> bool:
+        return self.deleted > ratio * self.rows
+
+    def compacted(self) -> Tuple["ChunkRows", np.ndarray]:
+        """A copy without the deleted rows, and the old numbers of the rows it kept"""
+        keep = np.flatnonzero(self.live[:self.rows])
+        chunks = ChunkRows(initial_capacity=0)
+        chunks.live = grow(np.ones(len(keep), dtype=bool), max(len(keep), 16), len(keep))
+        chunks.ids = [self.ids[i] for i in keep]
+        chunks.documents = [self.documents[i] for i in keep]
+        chunks.metadatas = [self.metadatas[i] for i in keep]
+        for row, metadata in enumerate(chunks.metadatas):
+            chunks.by_paper.setdefault(metadata.get("paper_id"), []).append(row)
+        chunks.rows = len(keep)
+        chunks.generation = self.generation + 1
+        return chunks, keep
+
+    def find(self, ids: List[str], metadatas: List[dict]) -> np.ndarray:
+        """Row numbers of live chunks by id, -1 for those no longer stored
+
+        Only the rows of the chunks' papers are searched, so no index by id is kept.
+        """
+        by_id = {}
+        for paper_id in {metadata.get("paper_id") for metadata in metadatas}:
+            for row in self.by_paper.get(paper_id, []):
+                by_id[self.ids[row]] = row
+        return np.array([by_id.get(chunk_id, -1) for chunk_id in ids], dtype=np.int64)
+
+    def items(self) -> Tuple[List[str], List[str], List[dict]]:
+        """Ids, documents and metadatas of every live row"""
+        rows = np.flatnonzero(self.live[:self.rows])
+        return [self.ids[i] for i in rows], [self.documents[i] for i in rows], [self.metadatas[i] for i in rows]
+
+    @classmethod
+    def load(cls, prefix: str, rows: int, row_bytes: int, live: np.ndarray, deleted: int) -> "ChunkRows":
+        """Ids and metadatas from the column files, with the documents memory-mapped"""
+        chunks = cls(initial_capacity=0)
+        chunks.live = live
+        chunks.documents = StringColumn.open(f"{prefix}.documents", f"{prefix}.offsets", rows)
+        with open(f"{prefix}.rows", "rb") as rows_file:
+            lines = rows_file.read(row_bytes).decode("utf-8").splitlines()
+        for row, line in enumerate(lines):
+            entry = json.loads(line)
+            chunks.ids.append(entry["id"])
+            chunks.metadatas.append(entry["metadata"])
+            if live[row]:
+                chunks.by_paper.setdefault(entry["metadata"].get("paper_id"), []).append(row)
+        chunks.rows = rows
+        chunks.deleted = deleted
+        return chunks
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores in each row of a (queries x rows) matrix, best first
+
+    One argpartition over the whole block selects every query's candidates
+    without a full sort; only the k survivors per query are sorted.
+    """
+    queries, rows = scores.shape
+    k = min(k, rows)
+    if k <= 0:
+        return np.empty((queries, 0), dtype=np.int64)
+    if k < rows:
+        candidates = np.argpartition(scores, rows - k, axis=1)[:, rows - k:]
+    else:
+        candidates = np.broadcast_to(np.arange(rows), (queries, rows))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class ChromaVectorStore:
+    """Dense vectors in a ChromaDB collection
+
+    Chroma only accepts dense lists, so sparse embeddings are densified one
+    batch at a time right before they are handed over. Collections measure
+    squared L2 distance unless created otherwise; as stored rows are
+    L2-normalized, those distances are turned into 1 - cosine similarity,
+    the distances of the other stores.
+    """
+
+    def __init__(self, client, name: str, batch_size: int = 5000):
+        self.client = client
+        self.collection = client.get_or_create_collection(name=name)
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        self.batch_size = batch_size
+
+    def add(self, ids: List[str], embeddings: Vectors, documents: List[str], metadatas: List[dict]):
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            batch = embeddings[start:end]
+            if sp.issparse(batch):
+                batch = batch.toarray()
+            self.collection.add(
+                ids=ids[start:end],
+                embeddings=batch.tolist(),
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def query(self, query_embeddings: Vectors, n_results: int = 5) -> dict:
+        if sp.issparse(query_embeddings):
+            query_embeddings = query_embeddings.toarray()
+        query_embeddings = np.asarray(query_embeddings)
+        count = self.collection.count()
+        if count == 0:
+            return empty_result(len(query_embeddings))
+        results = self.collection.query(
+            query_embeddings=query_embeddings.tolist(),
+            n_results=min(n_results, count)
+        )
+        if self.space == "l2":
+            # For a unit row, |q - row|^2 = |q|^2 + 1 - 2 * cosine
+            squared_norms = np.einsum("ij,ij->i", query_embeddings, query_embeddings)
+            results["distances"] = [
+                [(distance + 1.0 - squared_norm) / 2 for distance in distances]
+                for distances, squared_norm in zip(results["distances"], squared_norms.tolist())
+            ]
+        return results
+
+    def vectors(self, ids: List[str], metadatas: List[dict]) -> Tuple[Vectors, np.ndarray]:
+        """Stored vectors of the chunks still in the collection, and which those are"""
+        stored = self.collection.get(ids=list(dict.fromkeys(ids)), include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        found = np.array([chunk_id in by_id for chunk_id in ids], dtype=bool)
+        rows = [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+        return np.asarray(rows, dtype=np.float32).reshape(len(rows), -1 if rows else 0), found
+
+    def delete(self, paper_id: str):
+        self.collection.delete(where={"paper_id": paper_id})
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def items(self) -> Tuple[List[str], List[str], List[dict]]:
+        """Ids, documents and metadatas of every stored chunk"""
+        stored = self.collection.get(include=["documents", "metadatas"])
+        return stored["ids"], stored["documents"], stored["metadatas"]
+
+    def close(self):
+        """Drop the collection once the store has been replaced"""
+        self.client.delete_collection(self.collection.name)
+
+    def save(self, directory: str, snapshot_path: str) -> dict:
+        # A persistent Chroma client writes through; only the active name is recorded
+        return {"collection": self.collection.name}
+
+    @classmethod
+    def load(cls, client, directory: str, snapshot_path: str, state: dict, batch_size: int = 5000) -> "ChromaVectorStore":
+        return cls(client, state["collection"], batch_size=batch_size)
+
+
+class SparseVectorStore:
+    """L2-normalized sparse rows in a growable CSR matrix, scored in one mat-vec
+
+    TF-IDF rows are mostly zeros, so only their non-zeros are kept: float32
+    values and int32 column indices in arrays that double when full. A query
+    wraps the filled prefix in a csr_matrix without copying and takes the dot
+    product with every chunk at once; distances are 1 - cosine similarity.
+    Deleted rows are masked out of scoring and dropped on the next compaction.
+
+    With `idf_weighting`, rows are plain term frequencies (e.g. from a
+    HashingVectorizer) and IDF is applied at query time instead: the store
+    keeps running per-column document frequencies as rows are added and
+    deleted, and scores by TF-IDF cosine under the current IDF. The IDF
+    weights and per-row norms are recomputed at most once per change to the
+    corpus, so rows never need re-embedding as the vocabulary statistics move.
+
+    `save` appends rows added since the previous save to per-column files that
+    only grow until the next compaction, and `load` memory-maps them back, so
+    neither cost grows with the size of the corpus already on disk.
+    """
+
+    def __init__(self, initial_capacity: int = 1024, compact_ratio: float = 0.25, idf_weighting: bool = False):
+        self.compact_ratio = compact_ratio
+        self.idf_weighting = idf_weighting
+        self.dim: Optional[int] = None
+        self._data = np.empty(initial_capacity * 16, dtype=np.float32)
+        self._indices = np.empty(initial_capacity * 16, dtype=np.int32)
+        self._indptr = np.zeros(initial_capacity + 1, dtype=np.int64)
+        self._chunks = ChunkRows(initial_capacity)
+        self._doc_freq: Optional[np.ndarray] = None
+        # (chunk generation, idf^2 per column, TF-IDF norm per row)
+        self._idf_cache: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        # Column files are named after the storage id, which changes on compaction
+        self._storage_id = uuid.uuid4().hex
+        # (rows, non-zeros, document bytes, row-file bytes) already in the column files
+        self._saved = (0, 0, 0, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def nnz(self) -> int:
+        return int(self._indptr[self._chunks.rows])
+
+    def add(self, ids: List[str], embeddings: Vectors, documents: List[str], metadatas: List[dict]):
+        rows = sp.csr_matrix(embeddings, dtype=np.float32)
+        rows.sort_indices()
+        with self._lock:
+            if self.dim is None:
+                self.dim = rows.shape[1]
+                self._doc_freq = np.zeros(self.dim, dtype=np.int64)
+            elif rows.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {rows.shape[1]} does not match the store's {self.dim}")
+
+            start, nnz = self._chunks.rows, self.nnz
+            self._reserve(start + rows.shape[0], nnz + rows.nnz)
+            self._data[nnz:nnz + rows.nnz] = rows.data
+            self._indices[nnz:nnz + rows.nnz] = rows.indices
+            self._indptr[start + 1:start + rows.shape[0] + 1] = rows.indptr[1:] + nnz
+            if self.idf_weighting:
+                self._doc_freq += np.bincount(rows.indices[rows.data != 0], minlength=self.dim)
+            self._chunks.append(ids, documents, metadatas)
+
+    def query(self, query_embeddings: Vectors, n_results: int = 5) -> dict:
+        queries = sp.csr_matrix(query_embeddings, dtype=np.float32)
+        with self._lock:
+            chunks = self._chunks
+            rows, nnz = chunks.rows, self.nnz
+            matrix = self._matrix(rows, nnz, self.dim or queries.shape[1])
+            live = chunks.live[:rows]
+            available = chunks.count()
+            ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+            generation = chunks.generation
+            idf_cache = self._idf_cache
+            doc_freq = None
+            if self.idf_weighting and available > 0 and (idf_cache is None or idf_cache[0] != generation):
+                doc_freq = self._doc_freq.copy()
+        if available <= 0:
+            return empty_result(queries.shape[0])
+
+        if self.idf_weighting:
+            if doc_freq is not None:
+                idf_cache = self._compute_idf(matrix, doc_freq, available, generation)
+            _, idf_squared, row_norms = idf_cache
+            query_norms = np.sqrt(queries.multiply(queries) @ idf_squared)
+            queries = sp.csr_matrix(queries.multiply(idf_squared))
+
+        results = empty_result(queries.shape[0])
+        # Bound the dense copy of the query block to a few million floats
+        block = max(1, 2 ** 22 // matrix.shape[1])
+        for first in range(0, queries.shape[0], block):
+            # (chunks x dim) @ (dim x queries): one sparse-times-dense product for
+            # every query; a sparse right-hand side would take the far slower
+            # sparse-sparse path
+            scores = np.ascontiguousarray((matrix @ queries[first:first + block].T.toarray()).T)
+            if self.idf_weighting:
+                scores /= row_norms
+                scores /= np.maximum(query_norms[first:first + block], 1e-12)[:, None]
+            if available < rows:
+                scores[:, ~live] = -np.inf
+            best = top_k(scores, min(n_results, available))
+            distances = 1.0 - np.take_along_axis(scores, best, axis=1)
+            for q, (best_rows, best_distances) in enumerate(zip(best, distances), start=first):
+                results["ids"][q] = [ids[i] for i in best_rows]
+                results["documents"][q] = [documents[i] for i in best_rows]
+                results["metadatas"][q] = [metadatas[i] for i in best_rows]
+                results["distances"][q] = best_distances.tolist()
+        return results
+
+    def vectors(self, ids: List[str], metadatas: List[dict]) -> Tuple[Vectors, np.ndarray]:
+        """Stored rows of the chunks still in the store, IDF-weighted if so scored, and which those are"""
+        with self._lock:
+            chunks = self._chunks
+            rows = chunks.find(ids, metadatas)
+            matrix = self._matrix(chunks.rows, self.nnz, self.dim or 0)
+            available, generation, idf_cache = chunks.count(), chunks.generation, self._idf_cache
+            doc_freq = None
+            if self.idf_weighting and available > 0 and (idf_cache is None or idf_cache[0] != generation):
+                doc_freq = self._doc_freq.copy()
+        found = rows >= 0
+        vectors = matrix[rows[found]]
+        if self.idf_weighting and found.any():
+            if doc_freq is not None:
+                idf_cache = self._compute_idf(matrix, doc_freq, available, generation)
+            vectors = sp.csr_matrix(vectors.multiply(np.sqrt(idf_cache[1])))
+        return vectors, found
+
+    def delete(self, paper_id: str):
+        with self._lock:
+            rows = self._chunks.delete(paper_id)
+            if not rows:
+                return
+            if self.idf_weighting:
+                removed = self._matrix(self._chunks.rows, self.nnz, self.dim)[rows]
+                self._doc_freq -= np.bincount(removed.indices[removed.data != 0], minlength=self.dim)
+            if self._chunks.needs_compaction(self.compact_ratio):
+                self._compact()
+
+    def count(self) -> int:
+        return self._chunks.count()
+
+    def items(self) -> Tuple[List[str], List[str], List[dict]]:
+        """Ids, documents and metadatas of every live row"""
+        with self._lock:
+            return self._chunks.items()
+
+    def close(self):
+        pass
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the vector arrays, excluding documents and metadata"""
+        return self._data.nbytes + self._indices.nbytes + self._indptr.nbytes + self._chunks.live.nbytes
+
+    def save(self, directory: str, snapshot_path: str) -> dict:
+        """Append unsaved rows to the column files and write the mutable state
+
+        Column files go to `directory`; the live mask and document frequencies,
+        which change in place, go to `snapshot_path`. Returns the state that
+        `load` needs alongside them.
+        """
+        with self._lock:
+            chunks = self._chunks
+            rows, nnz, dim, deleted = chunks.rows, self.nnz, self.dim, chunks.deleted
+            data, indices, indptr = self._data, self._indices, self._indptr
+            ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+            live = chunks.live[:rows].copy()
+            doc_freq = None if self._doc_freq is None else self._doc_freq.copy()
+            storage_id = self._storage_id
+            saved_rows, saved_nnz, saved_document_bytes, saved_row_bytes = self._saved
+
+        prefix = os.path.join(directory, storage_id)
+        append_at(f"{prefix}.data", saved_nnz * 4, data[saved_nnz:nnz].tobytes())
+        append_at(f"{prefix}.indices", saved_nnz * 4, indices[saved_nnz:nnz].tobytes())
+        append_at(f"{prefix}.indptr", saved_rows * 8, indptr[saved_rows:rows + 1].tobytes())
+
+        document_bytes, row_bytes = save_chunk_columns(
+            prefix, ids, documents, metadatas, saved_rows, rows, saved_document_bytes, saved_row_bytes
+        )
+
+        np.save(os.path.join(snapshot_path, "live.npy"), live)
+        if doc_freq is not None:
+            np.save(os.path.join(snapshot_path, "doc_freq.npy"), doc_freq)
+
+        saved = (rows, nnz, document_bytes, row_bytes)
+        with self._lock:
+            if self._storage_id == storage_id:
+                self._saved = saved
+        return {
+            "storage_id": storage_id,
+            "rows": rows,
+            "nnz": nnz,
+            "dim": dim,
+            "deleted": deleted,
+            "document_bytes": saved[2],
+            "row_bytes": saved[3],
+            "idf_weighting": self.idf_weighting
+        }
+
+    @classmethod
+    def load(cls, directory: str, snapshot_path: str, state: dict) -> "SparseVectorStore":
+        """Open a saved store, memory-mapping its vectors and documents"""
+        store = cls(idf_weighting=state["idf_weighting"])
+        prefix = os.path.join(directory, state["storage_id"])
+        rows, nnz = state["rows"], state["nnz"]
+        store.dim = state["dim"]
+        store._data = map_array(f"{prefix}.data", np.float32, nnz)
+        store._indices = map_array(f"{prefix}.indices", np.int32, nnz)
+        store._indptr = map_array(f"{prefix}.indptr", np.int64, rows + 1)
+        if store.idf_weighting and store.dim is not None:
+            store._doc_freq = np.load(os.path.join(snapshot_path, "doc_freq.npy"))
+        live = np.load(os.path.join(snapshot_path, "live.npy"))
+        store._chunks = ChunkRows.load(prefix, rows, state["row_bytes"], live, state["deleted"])
+        store._storage_id = state["storage_id"]
+        store._saved = (rows, nnz, state["document_bytes"], state["row_bytes"])
+        return store
+
+    def _compute_idf(self, matrix: sp.csr_matrix, doc_freq: np.ndarray, n_docs: int, generation: int):
+        # Smoothed IDF, as TfidfVectorizer computes it
+        idf_squared = (np.log((1 + n_docs) / (1 + doc_freq)) + 1) ** 2
+        squared = sp.csr_matrix((matrix.data ** 2, matrix.indices, matrix.indptr), shape=matrix.shape)
+        row_norms = np.sqrt(squared @ idf_squared)
+        # Empty rows score 0 rather than NaN
+        row_norms[row_norms == 0] = 1.0
+        idf_cache = (generation, idf_squared, row_norms)
+        with self._lock:
+            if self._chunks.generation == generation:
+                self._idf_cache = idf_cache
+        return idf_cache
+
+    def _matrix(self, rows: int, nnz: int, dim: int) -> sp.csr_matrix:
+        # Wraps the filled prefix of the arrays without copying them
+        return sp.csr_matrix(
+            (self._data[:nnz], self._indices[:nnz], self._indptr[:rows + 1]),
+            shape=(rows, dim),
+            copy=False
+        )
+
+    def _reserve(self, rows: int, nnz: int):
+        if rows + 1 > len(self._indptr):
+            self._indptr = grow(self._indptr, max(rows, 2 * (len(self._indptr) - 1)) + 1, self._chunks.rows + 1)
+        if nnz > len(self._data):
+            capacity = max(nnz, 2 * len(self._data))
+            self._data = grow(self._data, capacity, self.nnz)
+            self._indices = grow(self._indices, capacity, self.nnz)
+
+    def _compact(self):
+        chunks, keep = self._chunks.compacted()
+        matrix = self._matrix(self._chunks.rows, self.nnz, self.dim)[keep]
+        self._data = grow(matrix.data, max(len(matrix.data), 16), len(matrix.data))
+        self._indices = grow(matrix.indices.astype(np.int32), max(len(matrix.data), 16), len(matrix.data))
+        self._indptr = grow(matrix.indptr.astype(np.int64), len(keep) + 1, len(keep) + 1)
+        self._chunks = chunks
+        self._storage_id = uuid.uuid4().hex
+        self._saved = (0, 0, 0, 0)
+        logger.info(f"Compacted sparse vector store to {chunks.rows} rows")
+
+
+class MappedRows:
+    """Append-only 2-D rows whose saved prefix stays memory-mapped
+
+    Rows loaded from disk are read through the map; rows appended afterwards
+    go to a growable in-memory tail. For data that is only read a few rows at
+    a time, a reloaded store never pages the whole prefix in, even as it grows.
+    """
+
+    def __init__(self, dim: int, dtype: np.dtype, mapped: Optional[np.ndarray] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self.mapped = mapped if mapped is not None else np.empty((0, dim), dtype=dtype)
+        self._tail = np.empty((initial_capacity, dim), dtype=dtype)
+        self._tail_rows = 0
+
+    def __len__(self) -> int:
+        return len(self.mapped) + self._tail_rows
+
+    def append(self, rows: np.ndarray):
+        used = self._tail_rows
+        if used + len(rows) > len(self._tail):
+            self._tail = grow(self._tail, max(used + len(rows), 2 * len(self._tail)), used)
+        self._tail[used:used + len(rows)] = rows
+        self._tail_rows = used + len(rows)
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64)
+        mapped_rows, tail = len(self.mapped), self._tail
+        taken = np.empty((len(indices), self.dim), dtype=tail.dtype)
+        in_map = indices < mapped_rows
+        taken[in_map] = self.mapped[indices[in_map]]
+        taken[~in_map] = tail[indices[~in_map] - mapped_rows]
+        return taken
+
+    def memory_bytes(self) -> int:
+        return self._tail.nbytes
+
+
+class DenseVectorStore:
+    """Dense rows in a growable float32 or int8 matrix, scored with one matrix product
+
+    Rows are packed into one contiguous matrix, 4 bytes per dimension as
+    float32 instead of the float64 lists handed to Chroma. With
+    `precision="int8"` every row is scalar-quantized with its own scale
+    (max |x| / 127), another 4x smaller; the float32 query is multiplied with
+    the int8 rows a block at a time and rescaled per row. Scores are dot
+    products, distances 1 - score, so rows are expected to be L2-normalized.
+
+    With `rescore` > 0 an int8 store also keeps the float32 rows, in a
+    MappedRows column that stays memory-mapped after a reload, and re-ranks
+    the best `rescore * n_results` quantized candidates by their exact score.
+    Deletes, compaction and persistence work as in SparseVectorStore.
+    """
+
+    def __init__(self, precision: str = "float32", rescore: int = 0, initial_capacity: int = 1024, compact_ratio: float = 0.25):
+        if precision not in ("float32", "int8"):
+            raise ValueError(f"Unknown precision: {precision}")
+        self.precision = precision
+        self.rescore = rescore if precision == "int8" else 0
+        self.compact_ratio = compact_ratio
+        self.dim: Optional[int] = None
+        self._initial_capacity = initial_capacity
+        self._vectors: Optional[np.ndarray] = None
+        self._scales = np.ones(initial_capacity, dtype=np.float32) if precision == "int8" else None
+        self._originals: Optional[MappedRows] = None
+        self._chunks = ChunkRows(initial_capacity)
+        self._storage_id = uuid.uuid4().hex
+        # (rows, document bytes, row-file bytes) already in the column files
+        self._saved = (0, 0, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.int8 if self.precision == "int8" else np.float32)
+
+    def add(self, ids: List[str], embeddings: Vectors, documents: List[str], metadatas: List[dict]):
+        if sp.issparse(embeddings):
+            embeddings = embeddings.toarray()
+        rows = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = rows.shape[1]
+                self._vectors = np.zeros((self._initial_capacity, self.dim), dtype=self.dtype)
+                if self.rescore:
+                    self._originals = MappedRows(self.dim, np.float32, initial_capacity=self._initial_capacity)
+            elif rows.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {rows.shape[1]} does not match the store's {self.dim}")
+
+            start, end = self._chunks.rows, self._chunks.rows + len(rows)
+            self._reserve(end)
+            if self.precision == "int8":
+                quantized, scales = self.quantize(rows)
+                self._vectors[start:end] = quantized
+                self._scales[start:end] = scales
+                if self._originals is not None:
+                    self._originals.append(rows)
+            else:
+                self._vectors[start:end] = rows
+            self._chunks.append(ids, documents, metadatas)
+
+    @staticmethod
+    def quantize(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Symmetric int8 quantization with one scale per row"""
+        scales = np.abs(rows).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(rows / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+
+    def query(self, query_embeddings: Vectors, n_results: int = 5) -> dict:
+        if sp.issparse(query_embeddings):
+            query_embeddings = query_embeddings.toarray()
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            chunks = self._chunks
+            rows = chunks.rows
+            vectors = self._vectors[:rows] if rows else None
+            scales = self._scales[:rows] if self._scales is not None else None
+            originals = self._originals
+            live = chunks.live[:rows]
+            available = chunks.count()
+            ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+        if available <= 0:
+            return empty_result(len(queries))
+
+        results = empty_result(len(queries))
+        k = min(n_results, available)
+        candidates = min(available, k * self.rescore) if originals is not None else k
+        # Bound the score matrix of a query block to a few million floats
+        block = max(1, 2 ** 22 // rows)
+        for first in range(0, len(queries), block):
+            block_queries = queries[first:first + block]
+            scores = self._scores(block_queries, vectors, scales)
+            if available < rows:
+                scores[:, ~live] = -np.inf
+            best = top_k(scores, candidates)
+            if originals is not None:
+                # Every query's candidates are gathered and re-scored in one product
+                gathered = originals.take(best.ravel()).reshape(best.shape + (self.dim,))
+                exact = np.matmul(gathered, block_queries[:, :, None])[:, :, 0]
+                order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+                best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(exact, order, axis=1)
+            else:
+                best_scores = np.take_along_axis(scores, best, axis=1)
+            for q, (best_rows, row_scores) in enumerate(zip(best, best_scores), start=first):
+                results["ids"][q] = [ids[i] for i in best_rows]
+                results["documents"][q] = [documents[i] for i in best_rows]
+                results["metadatas"][q] = [metadatas[i] for i in best_rows]
+                results["distances"][q] = (1.0 - row_scores).tolist()
+        return results
+
+    def _scores(self, queries: np.ndarray, vectors: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        if self.precision == "float32":
+            return queries @ vectors.T
+        # int8 rows are widened to float32 a block at a time into one reused,
+        # cache-sized buffer, never all at once
+        scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        block = max(1, 2 ** 18 // self.dim)
+        buffer = np.empty((block, self.dim), dtype=np.float32)
+        for first in range(0, len(vectors), block):
+            rows = vectors[first:first + block]
+            widened = buffer[:len(rows)]
+            np.copyto(widened, rows, casting="unsafe")
+            scores[:, first:first + block] = (queries @ widened.T) * scales[first:first + block]
+        return scores
+
+    def vectors(self, ids: List[str], metadatas: List[dict]) -> Tuple[Vectors, np.ndarray]:
+        """Stored float32 rows of the chunks still in the store, and which those are
+
+        An int8 store returns its kept float32 rows if it has them, else dequantized rows.
+        """
+        with self._lock:
+            rows = self._chunks.find(ids, metadatas)
+            vectors, scales, originals = self._vectors, self._scales, self._originals
+        found = rows >= 0
+        taken = rows[found]
+        if vectors is None:
+            return np.zeros((0, 0), dtype=np.float32), found
+        if originals is not None:
+            return originals.take(taken), found
+        if self.precision == "int8":
+            return vectors[taken].astype(np.float32) * scales[taken][:, None], found
+        return vectors[taken], found
+
+    def delete(self, paper_id: str):
+        with self._lock:
+            if self._chunks.delete(paper_id) and self._chunks.needs_compaction(self.compact_ratio):
+                self._compact()
+
+    def count(self) -> int:
+        return self._chunks.count()
+
+    def items(self) -> Tuple[List[str], List[str], List[dict]]:
+        """Ids, documents and metadatas of every live row"""
+        with self._lock:
+            return self._chunks.items()
+
+    def close(self):
+        pass
+
+    def memory_bytes(self) -> int:
+        """Bytes of vector data held in memory, excluding documents and metadata"""
+        total = self._chunks.live.nbytes + (self._vectors.nbytes if self._vectors is not None else 0)
+        if self._scales is not None:
+            total += self._scales.nbytes
+        if self._originals is not None:
+            total += self._originals.memory_bytes()
+        return total
+
+    def save(self, directory: str, snapshot_path: str) -> dict:
+        """Append unsaved rows to the column files and write the live mask"""
+        with self._lock:
+            chunks = self._chunks
+            rows, dim, deleted = chunks.rows, self.dim, chunks.deleted
+            vectors, scales, originals = self._vectors, self._scales, self._originals
+            ids, documents, metadatas = chunks.ids, chunks.documents, chunks.metadatas
+            live = chunks.live[:rows].copy()
+            storage_id = self._storage_id
+            saved_rows, saved_document_bytes, saved_row_bytes = self._saved
+
+        prefix = os.path.join(directory, storage_id)
+        if dim is not None:
+            vector_row_bytes = dim * self.dtype.itemsize
+            append_at(f"{prefix}.vectors", saved_rows * vector_row_bytes, vectors[saved_rows:rows].tobytes())
+            if self.precision == "int8":
+                append_at(f"{prefix}.scales", saved_rows * 4, scales[saved_rows:rows].tobytes())
+            if originals is not None:
+                append_at(f"{prefix}.originals", saved_rows * dim * 4, originals.take(np.arange(saved_rows, rows)).tobytes())
+        document_bytes, row_bytes = save_chunk_columns(
+            prefix, ids, documents, metadatas, saved_rows, rows, saved_document_bytes, saved_row_bytes
+        )
+        np.save(os.path.join(snapshot_path, "live.npy"), live)
+
+        saved = (rows, document_bytes, row_bytes)
+        with self._lock:
+            if self._storage_id == storage_id:
+                self._saved = saved
+        return {
+            "storage_id": storage_id,
+            "rows": rows,
+            "dim": dim,
+            "deleted": deleted,
+            "document_bytes": document_bytes,
+            "row_bytes": row_bytes,
+            "precision": self.precision,
+            "rescore": self.rescore
+        }
+
+    @classmethod
+    def load(cls, directory: str, snapshot_path: str, state: dict) -> "DenseVectorStore":
+        """Open a saved store; vectors are read into memory, float32 originals stay mapped"""
+        store = cls(precision=state["precision"], rescore=state["rescore"])
+        prefix = os.path.join(directory, state["storage_id"])
+        rows, dim = state["rows"], state["dim"]
+        if dim is not None:
+            store.dim = dim
+            # Scored in full on every query, so worth holding in memory
+            store._vectors = np.array(map_array(f"{prefix}.vectors", store.dtype, rows * dim).reshape(rows, dim))
+            if store.precision == "int8":
+                store._scales = np.array(map_array(f"{prefix}.scales", np.float32, rows))
+            if store.rescore:
+                mapped = map_array(f"{prefix}.originals", np.float32, rows * dim).reshape(rows, dim)
+                store._originals = MappedRows(dim, np.float32, mapped=mapped, initial_capacity=0)
+        live = np.load(os.path.join(snapshot_path, "live.npy"))
+        store._chunks = ChunkRows.load(prefix, rows, state["row_bytes"], live, state["deleted"])
+        store._storage_id = state["storage_id"]
+        store._saved = (rows, state["document_bytes"], state["row_bytes"])
+        return store
+
+    def _reserve(self, rows: int):
+        if rows > len(self._vectors):
+            capacity = max(rows, 2 * len(self._vectors))
+            self._vectors = grow(self._vectors, capacity, self._chunks.rows)
+            if self._scales is not None:
+                self._scales = grow(self._scales, capacity, self._chunks.rows)
+
+    def _compact(self):
+        chunks, keep = self._chunks.compacted()
+        capacity = max(len(keep), 16)
+        self._vectors = grow(self._vectors[keep], capacity, len(keep))
+        if self._scales is not None:
+            self._scales = grow(self._scales[keep], capacity, len(keep))
+        if self._originals is not None:
+            originals = MappedRows(self.dim, np.float32, initial_capacity=capacity)
+            originals.append(self._originals.take(keep))
+            self._originals = originals
+        self._chunks = chunks
+        self._storage_id = uuid.uuid4().hex
+        self._saved = (0, 0, 0)
+        logger.info(f"Compacted dense vector store to {chunks.rows} rows")
@@ -6,25 +6,48 @@ const FileUpload = ({ onUploadStatus, onStatsUpdate }) => {
   const [isDragging, setIsDragging] = useState(false);
   const [isUploading, setIsUploading] = useState(false);
 
+  const waitForJob = async (jobId) => {
+    // Poll the background ingestion job until it finishes
+    while (true) {
+      const { data: job } = await axios.get(`http://localhost:8000/jobs/${jobId}`);
+      if (job.status === 'completed') {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed');
+      }
+      onUploadStatus({
+        type: 'loading',
+        message: `Processing PDF (${job.stage})...`,
+        details: `${Math.round(job.progress * 100)}% complete`
+      });
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileUpload = async (file) => {
     const formData = new FormData();
     formData.append('file', file);
 
     try {
       setIsUploading(true);
-      onUploadStatus({ type: 'loading', message: 'Uploading and processing PDF...' });
+      onUploadStatus({ type: 'loading', message: 'Uploading PDF...' });
       
       const response = await axios.post('http://localhost:8000/upload', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
-        timeout: 120000, // 2 minutes timeout
       });
 
+      // Duplicate uploads are answered immediately with the existing paper
+      const result = response.data.status === 'completed'
+        ? response.data.result
+        : await waitForJob(response.data.job_id);
+
       onUploadStatus({ 
         type: 'success', 
-        message: `Processed: ${response.data.title}`,
-        details: `${response.data.chunks_processed} chunks • ${response.data.authors.join(', ')}`
+        message: `Processed: ${result.title}`,
+        details: `${result.chunks_processed} chunks${result.truncated ? ' (truncated)' : ''} • ${result.authors.join(', ')}`
       });
 
       // Fetch updated stats
@@ -39,7 +62,7 @@ const FileUpload = ({ onUploadStatus, onStatsUpdate }) => {
       console.error('Upload error:', error);
       onUploadStatus({ 
         type: 'error', 
-        message: error.response?.data?.detail || 'Upload failed. Please try again.',
+        message: error.response?.data?.detail || error.message || 'Upload failed. Please try again.',
         details: error.response?.status ? `Status: ${error.response.status}` : ''
       });
     } finally {